@@ -50,6 +50,26 @@ class Conf(_config.ConfigNamespace):
     PYNRC_PATH = _config.ConfigItem(path, 'Directory path to data files \
                                     required for pynrc calculations.')
 
+    coeff_store_max_size = _config.ConfigItem(50., 'Maximum size (GB) of saved PSF \
+                                              coefficient files before least recently \
+                                              used files are removed. Set <=0 for no limit.')
+
+    coeff_file_format = _config.ConfigItem(['fits', 'mmap'], 
+        "File format of saved PSF coefficients. 'mmap' saves native-endian, \
+        memory-mappable bundles that are shared between processes.")
+
+    coeff_cache_max_size = _config.ConfigItem(2., 'Memory budget (GB) for PSF coefficient \
+                                              files cached in memory. Set <=0 for no limit.')
+
+    poly_fit_mem_budget = _config.ConfigItem(2., 'Memory budget (GB) for temporary arrays \
+        in jl_poly_fit. Larger fits are solved in blocks of pixels. Set <=0 for no limit.')
+    poly_fit_nthreads = _config.ConfigItem(1, 'Number of threads used by jl_poly_fit \
+        to solve blocks of pixels concurrently.')
+
+    calibrate_resources = _config.ConfigItem(True, 'Measure memory and runtime of \
+        multiprocessing tasks on first use (saved per host in PYNRC_PATH). If False, \
+        default estimates are used to set the number of processes.')
+
     logging_level = _config.ConfigItem(
         ['INFO', 'DEBUG', 'WARN', 'WARNING', 'ERROR', 'CRITICAL', 'NONE'],
         'Desired logging level for pyNRC.'
@@ -74,11 +94,15 @@ setup_logging(conf.default_logging_level, verbose=False)
 from .nrc_utils import (read_filter, pix_noise, bp_2mass, bp_wise, \
                         stellar_spectrum, source_spectrum, planets_sb12)
 
-from .pynrc_core import (DetectorOps, NIRCam)
+from .pynrc_core import (DetectorOps, NIRCam, sensitivity_table)
+
+from .coeff_store import (coeff_store_list, coeff_store_prune, get_coeff_store, coeff_cache)
+
+from .resources import get_scheduler
 
 from .obs_nircam import (obs_hci, nrc_hci)
 
-from .detops import (multiaccum, det_timing, nrc_header)
+from .detops import (multiaccum, det_timing, ramp_timing, nrc_header)
 
 #from .ngNRC import slope_to_ramp, nproc_use_ng
 
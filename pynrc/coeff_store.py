@@ -0,0 +1,647 @@
+"""On-disk store for PSF coefficient products
+
+PSF coefficients (and the WFE drift, field-dependent, and wedge
+residuals derived from them) are expensive to compute. Files are
+named with a hash of every input that affects the result, so that
+changes to the bandpass, OPD, pupil, or WebbPSF version never
+silently reuse a stale cube. Each storage directory keeps a
+``manifest.json`` index recording the provenance of each file,
+and the total size is capped by evicting least-recently used entries.
+
+Writes are performed to a temporary file in the same directory and
+then atomically moved into place, so concurrent workers racing to
+produce the same coefficient file never leave a partial file behind.
+
+Coefficients can optionally be stored as native-endian ``.coeff`` bundles
+(see :func:`write_bundle`) rather than FITS files. These are opened as
+read-only memory maps, so the coefficient pages are shared between all
+processes through the page cache and never byte-swapped or copied.
+
+Files that have been loaded are also kept in a process-wide, size-limited
+in-memory cache (:data:`coeff_cache`), so that switching between
+filters and masks does not repeatedly re-read the same files.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os, json, time, hashlib, socket, threading, shutil
+from collections import OrderedDict
+
+import numpy as np
+from astropy.io import fits
+
+import logging
+_log = logging.getLogger('pynrc')
+
+from . import conf
+
+# File locking is only available on POSIX systems
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_manifest_name = 'manifest.json'
+_lock_name = '.manifest.lock'
+_bundle_ext = '.coeff'
+_store_exts = ('.fits', '.npz', '.npy', _bundle_ext)
+
+
+def coeff_store_dir():
+    """Default directory path of the PSF coefficient store."""
+    return conf.PYNRC_PATH + 'psf_coeffs/'
+
+
+def coeff_file_ext(product=''):
+    """File extension for a coefficient product
+
+    Chooses the file extension given the current setting of
+    ``conf.coeff_file_format``. If 'fits', then PSF coefficients are
+    saved as FITS files (``product=''``) and the drift, field, and wedge
+    residuals as numpy files. If 'mmap', then all are saved as
+    memory-mappable ``.coeff`` bundles.
+
+    Parameters
+    ----------
+    product : str
+        One of '' (PSF coefficients), 'wfedrift', 'cffields', or 'wedge'.
+    """
+    if conf.coeff_file_format == 'mmap':
+        return _bundle_ext
+    ext_dict = {'': '.fits', 'wfedrift': '.npz', 'cffields': '.npz', 'wedge': '.npy'}
+    return ext_dict[product]
+
+
+def write_bundle(fname, data, aux=None, header=None):
+    """Write memory-mappable coefficient bundle
+
+    A bundle is a directory holding the main array as a native-endian 
+    ``data.npy`` file, which can be memory-mapped directly, along with 
+    any small auxiliary arrays and a FITS header.
+
+    Parameters
+    ----------
+    fname : str
+        Directory name of the bundle.
+    data : ndarray
+        Main coefficient array.
+    aux : list or None
+        Additional (small) arrays to store, such as `lxmap` or V2/V3 grids.
+    header : :class:`astropy.io.fits.Header` or None
+        FITS header to save.
+    """
+    os.makedirs(fname)
+    data = np.asarray(data)
+    if not data.dtype.isnative:
+        data = data.astype(data.dtype.newbyteorder('='))
+    # The .npy format aligns the data after a header padded to 64 bytes
+    np.save(os.path.join(fname, 'data.npy'), np.ascontiguousarray(data))
+    if (aux is not None) and (len(aux)>0):
+        np.savez(os.path.join(fname, 'aux.npz'), *aux)
+    if header is not None:
+        with open(os.path.join(fname, 'header.txt'), 'w') as f:
+            f.write(header.tostring(sep='\n'))
+
+def read_bundle(fname, mmap_mode='r'):
+    """Read coefficient bundle
+
+    Parameters
+    ----------
+    fname : str
+        Directory name of the bundle.
+    mmap_mode : str or None
+        Memory-map mode of the main array (see :func:`numpy.load`).
+        Set to None to read the full array into memory.
+
+    Returns
+    -------
+    tuple
+        (data, aux, header), where aux is a (possibly empty) tuple
+        of arrays and header is None if none was saved.
+    """
+    data = np.load(os.path.join(fname, 'data.npy'), mmap_mode=mmap_mode)
+
+    aux_file = os.path.join(fname, 'aux.npz')
+    if os.path.exists(aux_file):
+        with np.load(aux_file) as out:
+            aux = tuple(out['arr_{}'.format(i)] for i in range(len(out.files)))
+    else:
+        aux = ()
+
+    hdr_file = os.path.join(fname, 'header.txt')
+    if os.path.exists(hdr_file):
+        with open(hdr_file, 'r') as f:
+            header = fits.Header.fromstring(f.read(), sep='\n')
+    else:
+        header = None
+
+    return data, aux, header
+
+
+def _path_size(fname):
+    """Size in bytes of a file or directory."""
+    if os.path.isdir(fname):
+        return int(np.sum([os.path.getsize(os.path.join(fname, f)) for f in os.listdir(fname)]))
+    return os.path.getsize(fname)
+
+def _remove_path(fname):
+    """Remove a file or directory."""
+    if os.path.isdir(fname):
+        shutil.rmtree(fname, ignore_errors=True)
+    elif os.path.exists(fname):
+        os.remove(fname)
+
+
+def hash_inputs(*args, **kwargs):
+    """Hash of coefficient inputs
+
+    Create a hex digest from an arbitrary set of inputs. Arrays are
+    hashed by content (including dtype and shape), FITS HDULists by
+    their image data, and dictionaries in sorted key order. Other
+    objects, such as an OTE linear model, are hashed by type and
+    their OPD and name attributes, if they exist.
+    """
+    h = hashlib.sha1()
+    _hash_update(h, args)
+    _hash_update(h, kwargs)
+    return h.hexdigest()
+
+def _hash_update(h, obj):
+    """Recursively add `obj` to hashlib object `h`."""
+
+    if obj is None:
+        h.update(b'None;')
+    elif isinstance(obj, np.ndarray):
+        h.update('{}{};'.format(obj.dtype.str, obj.shape).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, fits.HDUList):
+        h.update(b'HDUList[')
+        for hdu in obj:
+            _hash_update(h, hdu.data)
+        h.update(b']')
+    elif isinstance(obj, (fits.PrimaryHDU, fits.ImageHDU)):
+        _hash_update(h, obj.data)
+    elif isinstance(obj, dict):
+        h.update(b'{')
+        for k in sorted(obj.keys(), key=str):
+            _hash_update(h, k)
+            _hash_update(h, obj[k])
+        h.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'(')
+        for o in obj:
+            _hash_update(h, o)
+        h.update(b')')
+    elif isinstance(obj, (bool, int, float, str, bytes, np.generic)):
+        h.update('{};'.format(repr(obj)).encode())
+    else:
+        # Generic objects (e.g., OTE linear models)
+        h.update('<{}>'.format(type(obj).__name__).encode())
+        for attr in ['name', 'opd', 'amplitude']:
+            val = getattr(obj, attr, None)
+            if val is not None:
+                _hash_update(h, val)
+
+
+class CoeffStore(object):
+    """PSF coefficient file store
+
+    Keeps track of coefficient files within a single directory
+    using a JSON manifest. Use :func:`get_coeff_store` to obtain
+    the shared instance associated with a directory.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the coefficient files.
+    max_size : float or None
+        Maximum total size of tracked files in GB. Least recently
+        used files are removed once exceeded. Values <=0 disable
+        eviction. Defaults to ``conf.coeff_store_max_size``.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = os.path.join(os.path.abspath(path), '')
+        self._max_size = max_size
+
+    @property
+    def max_size(self):
+        """Maximum size of tracked files (GB)."""
+        if self._max_size is None:
+            return conf.coeff_store_max_size
+        return self._max_size
+    @max_size.setter
+    def max_size(self, value):
+        self._max_size = value
+
+    @property
+    def manifest_file(self):
+        return os.path.join(self.path, _manifest_name)
+
+    def _makedirs(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+    def _lock(self):
+        """Exclusive lock on the manifest (no-op without fcntl)."""
+        self._makedirs()
+        fh = open(os.path.join(self.path, _lock_name), 'a')
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    def _unlock(self, fh):
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            manifest = {}
+        manifest.setdefault('entries', {})
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp = self._tmp_name(self.manifest_file)
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_file)
+
+    def _tmp_name(self, fname):
+        """Temporary file name in the same directory, keeping the extension."""
+        dirname, basename = os.path.split(fname)
+        base, ext = os.path.splitext(basename)
+        if ext == '.gz':
+            base, ext0 = os.path.splitext(base)
+            ext = ext0 + ext
+        tmp = '.{}.{}.{}.tmp{}'.format(base, socket.gethostname(), os.getpid(), ext)
+        return os.path.join(dirname, tmp)
+
+    def write(self, fname, write_func, key=None, provenance=None):
+        """Atomically write and register a file
+
+        Parameters
+        ----------
+        fname : str
+            Final file name. Relative names are placed in the store directory.
+        write_func : func
+            Function accepting a single file name that writes the data.
+            The file name it receives has the same extension as `fname`.
+            May create either a file or a directory (e.g., a bundle).
+        key : str or None
+            Hash of the inputs used to create the data.
+        provenance : dict or None
+            Additional information to record in the manifest.
+        """
+        self._makedirs()
+        fname = os.path.join(self.path, fname)
+        tmp = self._tmp_name(fname)
+        _remove_path(tmp)
+        try:
+            write_func(tmp)
+            if os.path.isdir(tmp):
+                # Directories cannot be atomically replaced. File names are
+                # content-addressed, so if another worker already moved an 
+                # equivalent bundle into place, keep that one and discard ours.
+                try:
+                    os.rename(tmp, fname)
+                except OSError:
+                    if not os.path.isdir(fname):
+                        raise
+                    _log.debug('Keeping existing bundle {}'.format(fname))
+            else:
+                os.replace(tmp, fname)
+        finally:
+            _remove_path(tmp)
+
+        self.register(fname, key=key, provenance=provenance)
+        self.evict(keep=[fname])
+        return fname
+
+    def save_fits(self, fname, hdu, **kwargs):
+        """Atomically save HDU or HDUList to FITS file and register in manifest."""
+        return self.write(fname, lambda f: hdu.writeto(f, overwrite=True), **kwargs)
+
+    def save_npz(self, fname, *args, **kwargs):
+        """Atomically save arrays to ``.npz`` file and register in manifest."""
+        return self.write(fname, lambda f: np.savez(f, *args), **kwargs)
+
+    def save_npy(self, fname, arr, **kwargs):
+        """Atomically save array to ``.npy`` file and register in manifest."""
+        return self.write(fname, lambda f: np.save(f, arr), **kwargs)
+
+    def save_bundle(self, fname, data, aux=None, header=None, **kwargs):
+        """Atomically save memory-mappable bundle and register in manifest."""
+        func = lambda f: write_bundle(f, data, aux=aux, header=header)
+        return self.write(fname, func, **kwargs)
+
+    def register(self, fname, key=None, provenance=None):
+        """Add or update a manifest entry for an existing file."""
+        from .version import __version__
+
+        fname = os.path.join(self.path, fname)
+        entry = {
+            'key': key,
+            'size': _path_size(fname),
+            'created': time.time(),
+            'host': socket.gethostname(),
+            'pynrc': __version__,
+        }
+        if provenance is not None:
+            entry['provenance'] = {k: _json_value(v) for k, v in provenance.items()}
+
+        fh = self._lock()
+        try:
+            manifest = self._read_manifest()
+            manifest['entries'][os.path.basename(fname)] = entry
+            self._write_manifest(manifest)
+        finally:
+            self._unlock(fh)
+
+    def touch(self, fname):
+        """Mark a file as recently used (updates its access time)."""
+        fname = os.path.join(self.path, fname)
+        try:
+            st = os.stat(fname)
+            os.utime(fname, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def entries(self, include_untracked=False):
+        """List of files in the store
+
+        Returns a list of dictionaries with the file name, size (bytes),
+        last access time, and manifest information, sorted from least
+        to most recently used.
+
+        Parameters
+        ----------
+        include_untracked : bool
+            Also return coefficient files in the directory that are
+            not listed in the manifest (e.g., from older pyNRC versions).
+        """
+        manifest = self._read_manifest()['entries']
+        if include_untracked and os.path.isdir(self.path):
+            names = [f for f in os.listdir(self.path)
+                     if f.endswith(_store_exts) and not f.startswith('.')]
+            names = set(names) | set(manifest.keys())
+        else:
+            names = manifest.keys()
+
+        out = []
+        for name in names:
+            fname = os.path.join(self.path, name)
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue
+            size = _path_size(fname)
+            d = {'name': name, 'size': size, 'atime': st.st_atime,
+                 'tracked': name in manifest}
+            d.update(manifest.get(name, {}))
+            d['size'] = size
+            out.append(d)
+
+        return sorted(out, key=lambda d: d['atime'])
+
+    def size(self):
+        """Total size of tracked files in bytes."""
+        return int(np.sum([d['size'] for d in self.entries()]))
+
+    def prune(self, max_size=None, older_than=None, include_untracked=False, keep=None):
+        """Remove files from the store
+
+        Parameters
+        ----------
+        max_size : float or None
+            Remove least recently used files until the total size
+            is below this value (GB).
+        older_than : float or None
+            Remove files that have not been accessed in this many days.
+        include_untracked : bool
+            Also consider files not listed in the manifest.
+        keep : list or None
+            File names that should never be removed.
+
+        Returns
+        -------
+        list
+            Names of removed files.
+        """
+        keep = [] if keep is None else [os.path.basename(k) for k in keep]
+        entries = self.entries(include_untracked=include_untracked)
+
+        remove = []
+        if older_than is not None:
+            tcut = time.time() - older_than*24*3600
+            remove += [d['name'] for d in entries if d['atime'] < tcut]
+        if (max_size is not None) and (max_size > 0):
+            max_bytes = max_size * 1024**3
+            total = np.sum([d['size'] for d in entries if d['name'] not in remove])
+            for d in entries:
+                if total <= max_bytes:
+                    break
+                if (d['name'] in remove) or (d['name'] in keep):
+                    continue
+                remove.append(d['name'])
+                total -= d['size']
+        remove = [name for name in remove if name not in keep]
+        if len(remove)==0:
+            return remove
+
+        fh = self._lock()
+        try:
+            manifest = self._read_manifest()
+            for name in remove:
+                _log.info('Removing {} from PSF coefficient store'.format(name))
+                try:
+                    _remove_path(os.path.join(self.path, name))
+                except OSError:
+                    pass
+                manifest['entries'].pop(name, None)
+            self._write_manifest(manifest)
+        finally:
+            self._unlock(fh)
+
+        return remove
+
+    def evict(self, keep=None):
+        """Apply size-capped LRU eviction using :attr:`max_size`."""
+        return self.prune(max_size=self.max_size, keep=keep)
+
+
+def _json_value(val):
+    """Convert value to something JSON serializable."""
+    if isinstance(val, (bool, int, float, str)) or val is None:
+        return val
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (list, tuple)):
+        return [_json_value(v) for v in val]
+    return str(val)
+
+
+_stores = {}
+def get_coeff_store(path=None):
+    """Shared :class:`CoeffStore` instance for a directory.
+
+    If `path` is None, then the default directory
+    ``conf.PYNRC_PATH + 'psf_coeffs/'`` is used.
+    """
+    path = coeff_store_dir() if path is None else path
+    path = os.path.join(os.path.abspath(path), '')
+    if path not in _stores:
+        _stores[path] = CoeffStore(path)
+    return _stores[path]
+
+def coeff_store_list(path=None, include_untracked=False):
+    """List PSF coefficient store entries as an astropy Table."""
+    from astropy.table import Table
+
+    entries = get_coeff_store(path).entries(include_untracked=include_untracked)
+    names = ['name', 'size', 'atime', 'created', 'key', 'tracked']
+    defaults = {'created': np.nan, 'key': ''}
+    rows = [[d.get(k) if d.get(k) is not None else defaults.get(k) for k in names]
+            for d in entries]
+    tbl = Table(rows=rows, names=names) if len(rows)>0 else Table(names=names)
+    tbl['size'].unit = 'byte'
+    return tbl
+
+def coeff_store_prune(path=None, max_size=None, older_than=None, include_untracked=False):
+    """Remove PSF coefficient store entries.
+
+    See :meth:`CoeffStore.prune` for a description of the parameters.
+    """
+    store = get_coeff_store(path)
+    return store.prune(max_size=max_size, older_than=older_than,
+                       include_untracked=include_untracked)
+
+
+class CoeffCache(object):
+    """In-memory LRU cache of loaded coefficient files
+
+    Entries are keyed on the absolute file path along with its
+    modification time and size, so a rewritten file is never served
+    from a stale cache entry. Cached arrays are set to read-only
+    since they are shared between all instruments in the process.
+
+    Parameters
+    ----------
+    max_size : float or None
+        Memory budget in GB. Least recently used entries are dropped
+        once exceeded. Defaults to ``conf.coeff_cache_max_size``.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._data = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self):
+        """Memory budget (GB)."""
+        if self._max_size is None:
+            return conf.coeff_cache_max_size
+        return self._max_size
+    @max_size.setter
+    def max_size(self, value):
+        self._max_size = value
+        with self._lock:
+            self._evict()
+
+    @property
+    def nbytes(self):
+        """Total number of bytes held in the cache."""
+        return self._nbytes
+
+    @property
+    def stats(self):
+        """Dictionary of cache statistics."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'nentries': len(self._data), 'nbytes': self._nbytes, 
+                'max_size': self.max_size}
+
+    def _key(self, fname):
+        st = os.stat(fname)
+        return (os.path.abspath(fname), st.st_mtime_ns, st.st_size)
+
+    def load(self, fname, loader):
+        """Return cached contents of `fname`, calling ``loader(fname)`` on a miss."""
+        key = self._key(fname)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+
+        value = loader(fname)
+        self.put(fname, value, key=key)
+        return value
+
+    def put(self, fname, value, key=None):
+        """Add the contents of a file to the cache."""
+        key = self._key(fname) if key is None else key
+        nbytes = _array_nbytes(value)
+        # Don't bother with entries that exceed the full budget
+        if (self.max_size > 0) and (nbytes > self.max_size * 1024**3):
+            return
+        _set_readonly(value)
+
+        with self._lock:
+            # Remove any older versions of this file
+            for k in [k for k in self._data.keys() if k[0]==key[0]]:
+                self._nbytes -= self._data.pop(k)[1]
+            self._data[key] = (value, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        if self.max_size <= 0:
+            return
+        max_bytes = self.max_size * 1024**3
+        while (self._nbytes > max_bytes) and (len(self._data) > 0):
+            _, (_, nbytes) = self._data.popitem(last=False)
+            self._nbytes -= nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+def _array_nbytes(value):
+    """Total bytes of any arrays in `value`.
+
+    Memory-mapped arrays are backed by the page cache rather than
+    process memory, so do not count against the budget.
+    """
+    if isinstance(value, np.memmap):
+        return 0
+    elif isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, (list, tuple)):
+        return int(np.sum([_array_nbytes(v) for v in value]))
+    return 0
+
+def _set_readonly(value):
+    """Set any arrays in `value` to read-only and return `value`."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _set_readonly(v)
+    return value
+
+# Process-wide cache shared by all instrument instances
+coeff_cache = CoeffCache()
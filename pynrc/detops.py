@@ -343,6 +343,10 @@ class det_timing(object):
         
         self.multiaccum = multiaccum(**kwargs)
 
+        # Cached ramp_timing snapshot and the settings it was built from
+        self._timing = None
+        self._timing_state = None
+
     @property
     def y0(self):
         return int(self._y0)
@@ -678,13 +682,22 @@ class det_timing(object):
 
     def times_to_dict(self, verbose=False):
         """Export ramp times as dictionary with option to print output to terminal."""
+        return self.timing.to_dict(verbose)
 
-        times = [('t_frame', self.time_frame), ('t_group', self.time_group), 
-                 ('t_int',   self.time_int),   ('t_exp',   self.time_exp), 
-                 ('t_acq',   self.time_total), 
-                 ('t_int_tot1', self.time_total_int1), 
-                 ('t_int_tot2', self.time_total_int2)]
-        return tuples_to_dict(times, verbose)
+    @property
+    def timing(self):
+        """Snapshot of ramp timings for the current settings.
+        
+        Returns a cached :class:`ramp_timing`, which is only rebuilt 
+        after the detector window or MULTIACCUM settings change.
+        """
+        ma = self.multiaccum
+        state = (self._opmode, self.wind_mode, self._xpix, self._ypix, self._nff) + \
+                tuple(getattr(ma, k) for k in ramp_timing._params)
+        if (getattr(self, '_timing', None) is None) or (self._timing_state != state):
+            self._timing = ramp_timing(self)
+            self._timing_state = state
+        return self._timing
 
     def int_times_table(self, date_start, time_start, offset_seconds=None):
         """Create and populate the INT_TIMES table, which is saved as a
@@ -936,6 +949,189 @@ class det_timing(object):
             return data.squeeze()
         
         
+class ramp_timing(object):
+    """Immutable snapshot of ramp timings
+    
+    Holds the MULTIACCUM settings of a detector configuration along with
+    all exposure timings, which are computed once on creation. Since the
+    frame time of a detector window does not depend on the ramp settings,
+    snapshots with modified MULTIACCUM parameters can be derived with 
+    :meth:`replace` without building new :class:`det_timing` objects.
+
+    Use :meth:`from_arrays` to compute timings for many ramp settings 
+    at once, in which case all attributes are arrays.
+
+    Parameters
+    ----------
+    det : :class:`det_timing`
+        Detector configuration providing frame timing and ramp settings.
+
+    Attributes
+    ----------
+    t_frame : Time of a single frame.
+    t_group : Time of a single group (read frames + drop frames).
+    t_int : Photon collection time for a single ramp/integration.
+    t_int_eff : Effective ramp time for slope fit.
+    t_int_tot1 : Total time for all frames (reset+read+drop) in a first ramp.
+    t_int_tot2 : Total time for all frames (reset+read+drop) in a subsequent ramp.
+    t_exp : Total photon collection time for all ramps.
+    t_acq : Total acquisition time to complete exposure with all overheads.
+
+    Examples
+    --------
+    >>> d = det_timing(read_mode='MEDIUM8', ngroup=5)
+    >>> t = d.timing
+    >>> t10 = t.replace(ngroup=10, nint=3)
+    >>> print(t.t_int, t10.t_acq)
+
+    Timings of all NGROUP and NINT settings of a readout pattern:
+
+    >>> ng, nint = np.meshgrid(np.arange(1,11), np.arange(1,101))
+    >>> ta = ramp_timing.from_arrays(d, read_mode='DEEP8', ngroup=ng, nint=nint)
+    >>> ta.t_acq.shape
+    (100, 10)
+    """
+
+    _params = ('read_mode', 'nint', 'ngroup', 'nf', 'nd1', 'nd2', 'nd3', 'nr1', 'nr2')
+    _times  = ('t_frame', 't_group', 't_int', 't_exp', 't_acq', 't_int_tot1', 't_int_tot2')
+    __slots__ = _params + _times + ('t_int_eff', '_frame', '_patterns')
+
+    def __init__(self, det):
+        ma = det.multiaccum
+        # Timing of the detector window that is independent of ramp settings
+        frame = (det.time_frame, det.time_row_reset, det._exp_delay, det._pixel_rate)
+        params = dict((k, getattr(ma, k)) for k in self._params)
+        self._build(frame, ma._pattern_settings, params)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ramp_timing is immutable; use replace() instead.')
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            object.__setattr__(self, k, v)
+
+    def __repr__(self):
+        p = ', '.join('{}={}'.format(k, getattr(self, k)) for k in self._params)
+        return '{}({})'.format(type(self).__name__, p)
+
+    def _build(self, frame, patterns, params):
+        """Validate ramp settings and compute all timings."""
+        setattr = object.__setattr__
+        setattr(self, '_frame', frame)
+        setattr(self, '_patterns', patterns)
+
+        # Pre-defined readout patterns override nf, nd1, nd2, and nd3
+        read_mode = np.asarray(params['read_mode'])
+        for mode in np.unique(read_mode):
+            if mode == 'CUSTOM': continue
+            _check_list(mode, list(patterns.keys()) + ['CUSTOM'], 'read_mode')
+            nf, nd2, _ = patterns[mode]
+            ind = (read_mode == mode)
+            for k, v in (('nf', nf), ('nd1', 0), ('nd2', nd2), ('nd3', 0)):
+                params[k] = np.where(ind, v, params[k])
+
+        scalar = True
+        minvals = {'nint':1, 'ngroup':1, 'nf':1}
+        for k in self._params:
+            v = np.asarray(params[k])
+            scalar = scalar and (v.ndim == 0)
+            if k != 'read_mode':
+                minval = minvals.get(k, 0)
+                if not (np.all(np.mod(v, 1) == 0) and np.all(v >= minval)):
+                    raise ValueError("{}={} must be an integer >={}.".format(k, v, minval))
+                v = v.astype('int')
+            params[k] = v
+        if not scalar:
+            vals = np.broadcast_arrays(*[params[k] for k in self._params])
+            params = dict(zip(self._params, vals))
+
+        tf, t_row_reset, exp_delay, pixel_rate = frame
+        def fix_precision(t):
+            # See det_timing._fix_precision
+            return np.floor(t * pixel_rate + 0.5) / pixel_rate
+
+        nint, ngroup = params['nint'], params['ngroup']
+        nf, nd1, nd2, nd3 = params['nf'], params['nd1'], params['nd2'], params['nd3']
+
+        # Read and drop frames in a ramp (excluding nd3)
+        nframes = nd1 + ngroup*nf + (ngroup-1)*nd2
+
+        times = {'t_frame': np.full(np.shape(nframes), tf), 't_group': tf * (nf + nd2)}
+        times['t_int'] = fix_precision(nframes * tf)
+        times['t_int_eff'] = fix_precision(np.where(ngroup<=1, tf * (nd1 + (nf + 1) / 2),
+                                                    times['t_group'] * (ngroup - 1)))
+        times['t_exp'] = fix_precision(nint * times['t_int'])
+        times['t_int_tot1'] = fix_precision((params['nr1'] + nframes + nd3) * tf + t_row_reset)
+        t_int_tot2 = fix_precision((params['nr2'] + nframes + nd3) * tf + t_row_reset)
+        times['t_int_tot2'] = np.where(nint<=1, 0., t_int_tot2)
+        times['t_acq'] = fix_precision(times['t_int_tot1'] + times['t_int_tot2']*(nint-1) + exp_delay)
+
+        # Plain Python values for a single ramp setting
+        if scalar:
+            params = dict((k, v.item()) for k, v in params.items())
+            times = dict((k, float(v)) for k, v in times.items())
+
+        for k, v in params.items():
+            setattr(self, k, v)
+        for k, v in times.items():
+            setattr(self, k, v)
+
+    def replace(self, **kwargs):
+        """New snapshot with modified MULTIACCUM settings.
+
+        Keyword Args
+        ------------
+        read_mode : str
+            NIRCam Ramp Readout mode such as 'RAPID', 'BRIGHT1', etc.
+        nint : int
+            Number of integrations (ramps).
+        ngroup : int
+            Number of groups in a integration.
+        nf, nd1, nd2, nd3 : int
+            Frames per group and drop frames. Only used if read_mode='CUSTOM'.
+        nr1, nr2 : int
+            Number of reset frames in first and subsequent integrations.
+        """
+        for k in kwargs.keys():
+            _check_list(k, list(self._params), 'ramp')
+        params = dict((k, getattr(self, k)) for k in self._params)
+        params.update(kwargs)
+
+        new = object.__new__(type(self))
+        new._build(self._frame, self._patterns, params)
+        return new
+
+    @classmethod
+    def from_arrays(cls, det, **kwargs):
+        """Ramp timings for many MULTIACCUM settings at once.
+
+        Parameters
+        ----------
+        det : :class:`det_timing` or :class:`ramp_timing`
+            Detector configuration. Settings not specified are taken from it.
+
+        Keyword Args
+        ------------
+        read_mode, nint, ngroup, nf, nd1, nd2, nd3, nr1, nr2 
+            Scalars or arrays of ramp settings, which get broadcast together
+            (see :meth:`replace`). All attributes of the returned snapshot
+            are arrays of the broadcast shape.
+        """
+        timing = det if isinstance(det, ramp_timing) else det.timing
+        kwargs = dict((k, np.atleast_1d(v)) for k, v in kwargs.items())
+        if len(kwargs)==0:
+            kwargs['nint'] = np.atleast_1d(timing.nint)
+        return timing.replace(**kwargs)
+
+    def to_dict(self, verbose=False):
+        """Export ramp times as dictionary (see :meth:`det_timing.times_to_dict`)."""
+        times = [(k, getattr(self, k)) for k in self._times]
+        return tuples_to_dict(times, verbose and (np.ndim(self.t_int)==0))
+
+
 def _check_list(value, temp_list, var_name=None):
     """
     Helper function to test if a value exists within a list. 
@@ -1,12 +1,215 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib, threading
+from collections import OrderedDict
+
 import numpy as np
 from numpy.polynomial import legendre
 
+from .. import conf
+
 #import logging
 #_log = logging.getLogger('pynrc')
 
-def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, **kwargs):
+# Keyed caches of design matrices and fit plans
+_cache_max = 32
+_cache_max_nx = 100000
+_basis_cache = OrderedDict()
+_plan_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_key(xvals, deg, use_legendre, lxmap):
+    """Key on x-value content, degree, basis type, and Legendre mapping."""
+    xvals = np.ascontiguousarray(xvals, dtype='float')
+    if xvals.size > _cache_max_nx:
+        return None
+    xhash = hashlib.sha1(xvals.tobytes()).hexdigest()
+    lxkey = None if (lxmap is None) or (not use_legendre) else tuple(float(v) for v in lxmap)
+    return (xhash, xvals.shape, int(deg), bool(use_legendre), lxkey)
+
+def _cache_get(cache, key, func):
+    """Return ``cache[key]``, calling ``func()`` on a miss (LRU eviction)."""
+    if key is None:
+        return func()
+    with _cache_lock:
+        val = cache.pop(key, None)
+    if val is None:
+        val = func()
+    with _cache_lock:
+        cache[key] = val
+        while len(cache) > _cache_max:
+            cache.popitem(last=False)
+    return val
+
+def clear_poly_cache():
+    """Clear cached polynomial design matrices and fit plans."""
+    _basis_cache.clear()
+    _plan_cache.clear()
+
+
+def jl_poly_basis(xvals, deg, use_legendre=False, lxmap=None):
+    """Polynomial basis matrix
+
+    Evaluate each polynomial component (1, x, x^2, ... or the
+    equivalent Legendre polynomials) at a set of xvals. This is
+    the design matrix shared by :func:`jl_poly` and :func:`jl_poly_fit`.
+
+    Parameters
+    ----------
+    xvals : ndarray
+        1D array of x-values.
+    deg : int
+        Polynomial degree.
+
+    Keyword Args
+    ------------
+    use_legendre : bool
+        Evaluate Legendre polynomials rather than simple powers of x.
+    lxmap : ndarray or None
+        Legendre polynomials are normaly mapped to xvals of [-1,+1].
+        `lxmap` gives the option to supply the values for xval that
+        should get mapped to [-1,+1]. If set to None, then assumes 
+        [xvals.min(),xvals.max()].
+
+    Returns
+    -------
+    ndarray
+        Read-only array of shape (deg+1, nx). Results are cached, so 
+        repeated calls with the same inputs reuse the same matrix.
+    """
+
+    key = _cache_key(xvals, deg, use_legendre, lxmap)
+    return _cache_get(_basis_cache, key, lambda: _poly_basis(xvals, deg, use_legendre, lxmap))
+
+def _poly_basis(xvals, deg, use_legendre=False, lxmap=None):
+    """Uncached version of :func:`jl_poly_basis`."""
+
+    xvals = np.asarray(xvals, dtype='float')
+    if xvals.ndim == 0:
+        xvals = xvals.reshape([1])
+
+    if use_legendre:
+        # Values to map to [-1,+1]
+        if lxmap is None:
+            lxmap = [np.min(xvals), np.max(xvals)]
+
+        # Remap xvals -> lxvals
+        dx = lxmap[1] - lxmap[0]
+        lxvals = 2 * (xvals - (lxmap[0] + dx/2)) / dx
+
+        # Use Identity matrix to evaluate each polynomial component
+        xfan = legendre.legval(lxvals, np.identity(deg+1))
+    else:
+        # Create an array of exponent values
+        parr = np.arange(deg+1, dtype='float')
+        xfan = xvals**parr.reshape((-1,1)) # Array broadcasting
+
+    xfan.flags.writeable = False
+    return xfan
+
+
+class FitPlan(object):
+    """Precomputed least-squares solver for :func:`jl_poly_fit`
+
+    Holds the design matrix of a set of x-values along with its QR
+    factors and the resulting solver matrix, so that fitting any number 
+    of data arrays sampled at the same x-values reduces to a single
+    matrix product. Create with :func:`fit_plan`, which caches plans.
+
+    Parameters
+    ----------
+    x : ndarray
+        X-values of the data arrays (1D).
+    deg : int
+        Degree of polynomial.
+
+    Keyword Args
+    ------------
+    QR : bool
+        Use QR decomposition (default) rather than a direct least-squares
+        solution of the design matrix.
+    use_legendre : bool
+        Fit with Legendre polynomials, an orthonormal basis set.
+    lxmap : ndarray or None
+        Values of x that get mapped to [-1,+1] for Legendre polynomials.
+    """
+
+    def __init__(self, x, deg, QR=True, use_legendre=False, lxmap=None):
+        self.x = np.array(x, dtype='float')
+        self.deg = int(deg)
+        self.QR = QR
+        self.use_legendre = use_legendre
+        self.lxmap = lxmap
+
+        # Design matrix (deg+1, nx)
+        self.basis = jl_poly_basis(self.x, self.deg, use_legendre=use_legendre, lxmap=lxmap)
+        a = self.basis
+        if QR:
+            # Perform QR decomposition of the A matrix
+            self.q, self.r = np.linalg.qr(a.T, 'reduced')
+            # Solving R*x = Q^T*b for all b at once
+            self.solver = np.linalg.lstsq(self.r, self.q.T, rcond=None)[0]
+        else:
+            self.q = self.r = None
+            self.solver = np.linalg.lstsq(a.T, np.identity(a.shape[1]), rcond=None)[0]
+        for arr in [self.solver, self.q, self.r]:
+            if arr is not None:
+                arr.flags.writeable = False
+
+    @property
+    def nx(self):
+        """Number of x-values."""
+        return self.x.size
+
+    def solve(self, b):
+        """Coefficients (deg+1, npix) for data `b` of shape (nx, npix)."""
+        return np.dot(self.solver, b)
+
+    def evaluate(self, coeff):
+        """Evaluate coefficients (deg+1, npix) at the plan's x-values."""
+        return np.dot(self.basis.T, coeff)
+
+
+def fit_plan(x, deg=1, QR=True, use_legendre=False, lxmap=None):
+    """Cached :class:`FitPlan` for a set of x-values
+
+    Plans are keyed on the content of `x`, degree, basis type, and Legendre
+    mapping, so calibration loops fitting many ramps at identical times
+    factor the design matrix only once. A plan may also be created up front
+    and passed to :func:`jl_poly_fit` through the `plan` keyword.
+
+    >>> plan = fit_plan(tarr, deg=1)
+    >>> for cube in cube_list:
+    >>>     bias, slope = jl_poly_fit(tarr, cube, plan=plan)
+    """
+    key = _cache_key(x, deg, use_legendre, lxmap)
+    key = None if key is None else key + (bool(QR),)
+    return _cache_get(_plan_cache, key, 
+                      lambda: FitPlan(x, deg, QR=QR, use_legendre=use_legendre, lxmap=lxmap))
+
+
+def _result_dtype(coeff):
+    """Float32 coefficients are evaluated in float32, otherwise float64."""
+    return np.float32 if coeff.dtype == np.float32 else np.float64
+
+
+def _support_index(support, shape):
+    """Flat pixel indices of a support region.
+
+    `support` is either a boolean mask with the same shape as the
+    trailing (spatial) dimensions `shape`, or an array of flat indices.
+    """
+    support = np.asarray(support)
+    if support.dtype == bool:
+        if support.shape != tuple(shape[-support.ndim:]):
+            raise ValueError('support mask shape {} does not match coefficient shape {}.'.\
+                             format(support.shape, tuple(shape)))
+        return np.flatnonzero(support), int(np.prod(support.shape))
+    else:
+        return support.ravel(), int(np.prod(shape[-2:])) if len(shape)>1 else int(shape[-1])
+
+
+def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, support=None, **kwargs):
     """Evaluate polynomial
     
     Replacement for `np.polynomial.polynomial.polyval(wgood, coeff)`
@@ -37,6 +240,11 @@ def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, **k
         `lxmap` gives the option to supply the values for xval that
         should get mapped to [-1,+1]. If set to None, then assumes 
         [xvals.min(),xvals.max()].
+    support : ndarray or None
+        Boolean mask (ny,nx) or flat pixel indices of the region where
+        the coefficients are non-zero (see `support_tol` in 
+        :func:`~pynrc.psfs.gen_psf_coeff`). Only these pixels are evaluated,
+        and all others are set to 0 in the output. Requires 3D coefficients.
                        
     Returns
     -------
@@ -46,6 +254,8 @@ def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, **k
         dimension equal to the number of xvals, and the final dimensions
         correspond to coeff's latter dimensions. The result is flattened 
         if there is either only one xval or one set of coeff (or both).
+        Single precision (float32) coefficients produce single precision
+        results, otherwise float64 is returned.
     """
 
     # How many xvals?
@@ -71,25 +281,27 @@ def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, **k
         raise ValueError('coefficient can only have 1, 2, or 3 dimensions. \
                           Found {} dimensions.'.format(ndim))
 
-    if use_legendre:
-        # Values to map to [-1,+1]
-        if lxmap is None:
-            lxmap = [np.min(xvals), np.max(xvals)]
-
-        # Remap xvals -> lxvals
-        dx = lxmap[1] - lxmap[0]
-        lxvals = 2 * (xvals - (lxmap[0] + dx/2)) / dx
-
-        # Use Identity matrix to evaluate each polynomial component
-        xfan = legendre.legval(lxvals, np.identity(dim[0]))
-    else:
-        # Create an array of exponent values
-        parr = np.arange(dim[0], dtype='float')
-        # If 3D, this reshapes xfan to 2D
-        xfan = xvals**parr.reshape((-1,1)) # Array broadcasting
+    # Polynomial components evaluated at each xval (deg+1, nz)
+    xfan = jl_poly_basis(xvals, dim[0]-1, use_legendre=use_legendre, lxmap=lxmap)
+    # Keep single precision coefficients in single precision
+    xfan = xfan.astype(_result_dtype(coeff), copy=False)
 
     # Reshape coeffs to 2D array
     cf = coeff.reshape(dim[0],-1)
+    if support is not None:
+        if ndim!=3:
+            raise ValueError('support requires 3D coefficients (deg+1,ny,nx).')
+        ind, npix = _support_index(support, dim[1:])
+        if dim_reorder:
+            yfit = np.zeros((npix,n), dtype=xfan.dtype)
+            yfit[ind] = np.dot(cf[:,ind].T, xfan)
+            yfit = yfit.reshape((dim[1],dim[2],n))
+        else:
+            yfit = np.zeros((n,npix), dtype=xfan.dtype)
+            yfit[:,ind] = np.dot(xfan.T, cf[:,ind])
+            yfit = yfit.reshape((n,dim[1],dim[2]))
+        return yfit
+
     if dim_reorder:
         # Coefficients are assumed (deg+1,nx,ny)
         # xvals have length nz
@@ -111,7 +323,8 @@ def jl_poly(xvals, coeff, dim_reorder=False, use_legendre=False, lxmap=None, **k
     return yfit
 
 
-def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legendre=False, lxmap=None, **kwargs):
+def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legendre=False, lxmap=None, 
+                plan=None, mem_budget=None, nthreads=None, **kwargs):
     """Fast polynomial fitting
     
     Fit a polynomial to a function using linear least-squares.
@@ -155,6 +368,17 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
         `lxmap` gives the option to supply the values for xval that
         should get mapped to [-1,+1]. If set to None, then assumes 
         [xvals.min(),xvals.max()].
+    plan : :class:`FitPlan` or None
+        Precomputed solver from :func:`fit_plan`. Overrides `deg`, `QR`,
+        `use_legendre`, and `lxmap`. If None, a cached plan is used.
+    mem_budget : float or None
+        Approximate memory budget (GB) for temporary arrays. Larger problems
+        are split into blocks of pixels that are solved independently. Results
+        do not depend on the block size. Defaults to 
+        ``conf.poly_fit_mem_budget``; <=0 solves all pixels at once.
+    nthreads : int or None
+        Number of threads that solve pixel blocks concurrently.
+        Defaults to ``conf.poly_fit_nthreads``.
     
     Example
     -------
@@ -167,8 +391,6 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
     >>> slope = coeff[1] # Slope image (DN/sec)
     """
     
-    from pynrc.maths.robust import medabsdev
-    
 #     nz = 1000
 #     tarr = (np.arange(nz) + 1) * 10.737
 # 
@@ -194,6 +416,13 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
 #     yvals = z_noise_outlier
 
 
+    if plan is None:
+        plan = fit_plan(x, deg=deg, QR=QR, use_legendre=use_legendre, lxmap=lxmap)
+    elif plan.nx != np.size(x):
+        raise ValueError('FitPlan was created for {} x-values, but {} were given.'.format(plan.nx, np.size(x)))
+    deg = plan.deg
+    x = plan.x
+
     orig_shape = yvals.shape
     ndim = len(orig_shape)
     
@@ -205,35 +434,56 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
     else:
         assert len(x)==orig_shape[0], 'X and Y.shape[0] must have the same length'
 
-    # Get different components to fit
-    if use_legendre:
-        # Values to map to [-1,+1]
-        if lxmap is None:
-            lxmap = [np.min(x), np.max(x)]
-
-        # Remap xvals -> lxvals
-        dx = lxmap[1] - lxmap[0]
-        lx = 2 * (x - (lxmap[0] + dx/2)) / dx
-
-        # Use Identity matrix to evaluate each polynomial component
-        a = legendre.legval(lx, np.identity(deg+1))
-    else:
-        a = np.array([x**num for num in range(deg+1)], dtype='float')
     b = yvals.reshape([orig_shape[0],-1])
 
     # Fast method, but numerically unstable for overdetermined systems
     #cov = np.linalg.pinv(np.dot(a,a.T))
     #coeff_all = np.dot(cov,np.dot(a,b))
     
-    if QR:
-        # Perform QR decomposition of the A matrix
-        q, r = np.linalg.qr(a.T, 'reduced')
-        # computing Q^T*b (project b onto the range of A)
-        qTb = np.dot(q.T, b)
-        # solving R*x = Q^T*b
-        coeff_all = np.linalg.lstsq(r, qTb, rcond=None)[0]
+    npix = b.shape[1]
+    if mem_budget is None: 
+        mem_budget = conf.poly_fit_mem_budget
+    if nthreads is None:
+        nthreads = conf.poly_fit_nthreads
+    nthreads = int(np.max([nthreads, 1]))
+
+    # Bytes of double precision temporaries per pixel column
+    col_bytes = orig_shape[0] * 8 * (6 if robust_fit else 2)
+    if (mem_budget is not None) and (mem_budget > 0):
+        ncol = int(mem_budget * 1024**3 / (col_bytes * nthreads))
+    else:
+        ncol = int(np.ceil(npix / nthreads))
+    ncol = int(np.clip(ncol, 1, npix))
+
+    if ncol >= npix:
+        coeff_all = _fit_block(plan, b, robust_fit=robust_fit, niter=niter)
     else:
-        coeff_all = np.linalg.lstsq(a.T, b, rcond=None)[0]
+        # Stream pixel blocks through the precomputed solve
+        coeff_all = np.empty([plan.deg+1, npix])
+        def fit_chunk(i0):
+            bsub = np.array(b[:,i0:i0+ncol], dtype='float')
+            coeff_all[:,i0:i0+ncol] = _fit_block(plan, bsub, robust_fit=robust_fit, niter=niter)
+
+        istart = range(0, npix, ncol)
+        if nthreads > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                list(executor.map(fit_chunk, istart))
+        else:
+            for i0 in istart:
+                fit_chunk(i0)
+
+    return coeff_all.reshape(cf_shape)
+
+
+def _fit_block(plan, b, robust_fit=False, niter=25):
+    """Coefficients for a block of pixel columns `b` (nx, npix)."""
+
+    from pynrc.maths.robust import medabsdev
+
+    # QR (or direct least-squares) solution of the design matrix is
+    # precomputed in the plan, so the fit is a single matrix product.
+    coeff_all = plan.solve(b)
         
     if robust_fit:
         # Normally, we would weight both the x and y (ie., a and b) values
@@ -246,12 +496,17 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
         # the new data that we refit. 
 
         close_factor = 0.03
-        close_enough = np.max([close_factor * np.sqrt(0.5/(x.size-1)), 1e-20])
-        err = 0
+        close_enough = np.max([close_factor * np.sqrt(0.5/(plan.nx-1)), 1e-20])
+
+        # Convergence is tracked for each pixel column, so the results 
+        # do not depend on how pixels are split into blocks.
+        active = np.arange(b.shape[1])
+        err = np.zeros(b.shape[1])
         for i in range(niter):
             # compute absolute value of residuals (fit minus data)
-            yvals_mod = jl_poly(x, coeff_all, use_legendre=use_legendre)
-            abs_resid = np.abs(yvals_mod - b)
+            bsub = b[:,active]
+            yvals_mod = plan.evaluate(coeff_all[:,active])
+            abs_resid = np.abs(yvals_mod - bsub)
 
             # compute the scaling factor for the standardization of residuals
             # using the median absolute deviation of the residuals
@@ -259,30 +514,103 @@ def jl_poly_fit(x, yvals, deg=1, QR=True, robust_fit=False, niter=25, use_legend
             abs_res_scale = 6.9460 * np.median(abs_resid, axis=0)
 
             # standardize residuals
-            w = abs_resid / abs_res_scale.reshape([1,-1])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                w = abs_resid / abs_res_scale.reshape([1,-1])
 
             # exclude outliers
             outliers = w>1
-            
-            # Create a version with outliers fixed
-            # Se
-            yvals_fix = b.copy()
-            yvals_fix[outliers] = yvals_mod[outliers]
-            
-            # Ignore fits with no outliers
+
+            # Fits without outliers have converged
             ind_fit = outliers.sum(axis=0) > 0
             if ind_fit[ind_fit].size == 0: break
-            if QR:
-                qTb = np.dot(q.T, yvals_fix[:,ind_fit])
-                coeff_all[:,ind_fit] = np.linalg.lstsq(r, qTb, rcond=None)[0]
-            else:
-                coeff_all[:,ind_fit] = np.linalg.lstsq(a.T, yvals_fix[:,ind_fit], rcond=None)[0]
-
-            prev_err = medabsdev(abs_resid, axis=0) if i==0 else err
-            err = medabsdev(abs_resid, axis=0)
-            
-            diff = np.abs((prev_err - err)/err)
-            #print(coeff_all.mean(axis=1), coeff_all.std(axis=1), np.nanmax(diff), ind_fit[ind_fit].size)
-            if 0 < np.nanmax(diff) < close_enough: break
+
+            # Create a version with outliers fixed
+            yvals_fix = bsub[:,ind_fit]
+            yvals_mod = yvals_mod[:,ind_fit]
+            outliers = outliers[:,ind_fit]
+            yvals_fix[outliers] = yvals_mod[outliers]
+            coeff_all[:,active[ind_fit]] = plan.solve(yvals_fix)
+
+            prev_err = err[active]
+            err[active] = medabsdev(abs_resid, axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                diff = np.abs((prev_err - err[active])/err[active])
+
+            # Keep iterating columns whose residual scatter is still changing
+            done = (~ind_fit) | (diff < close_enough) if i>0 else ~ind_fit
+            active = active[~done]
+            if active.size == 0: break
     
-    return coeff_all.reshape(cf_shape)
+    return coeff_all
+
+
+def jl_poly_weighted_sum(xvals, coeff, weights, use_legendre=False, lxmap=None, 
+                         support=None, **kwargs):
+    """Weighted sum of polynomial evaluations
+
+    Equivalent to ``(jl_poly(xvals, coeff) * weights.reshape([-1,1,1])).sum(axis=0)``,
+    but the weights are first contracted with the polynomial basis to
+    produce a (deg+1) vector, which is then applied to the coefficient
+    planes. The intermediate (nz,ny,nx) cube is never created, so the cost
+    scales with the polynomial degree rather than the number of xvals.
+
+    Parameters
+    ----------
+    xvals : ndarray
+        1D array of x-values (e.g., wavelengths).
+    coeff : ndarray
+        1D, 2D, or 3D array of coefficients from a polynomial fit,
+        where the first dimension is the polynomial degree + 1.
+    weights : ndarray
+        Weights for each xval. Either 1D with the same length as `xvals`,
+        or 2D (nspec, nz) to evaluate multiple weightings at once.
+
+    Keyword Args
+    ------------
+    use_legendre : bool
+        Coefficients correspond to Legendre polynomials.
+    lxmap : ndarray or None
+        Legendre polynomials are normaly mapped to xvals of [-1,+1].
+        `lxmap` gives the option to supply the values for xval that
+        should get mapped to [-1,+1]. If set to None, then assumes 
+        [xvals.min(),xvals.max()].
+    support : ndarray or None
+        Boolean mask matching the trailing (spatial) dimensions of `coeff`,
+        or flat pixel indices into them. Only these pixels are evaluated,
+        and all others are set to 0 in the output.
+
+    Returns
+    -------
+    ndarray
+        Weighted sum with shape `coeff.shape[1:]`. If `weights` is 2D,
+        then an additional leading dimension of size nspec is included.
+    """
+
+    dim = coeff.shape
+    xfan = jl_poly_basis(xvals, dim[0]-1, use_legendre=use_legendre, lxmap=lxmap)
+
+    weights = np.asarray(weights)
+    if weights.shape[-1] != xfan.shape[1]:
+        raise ValueError('weights must have a final dimension equal to the number of xvals \
+                          ({} != {}).'.format(weights.shape[-1], xfan.shape[1]))
+
+    # Contract weights with polynomial basis: (nspec, deg+1)
+    # Performed in double precision, then cast to match coefficients
+    wcoeff = np.dot(weights, xfan.T)
+    wcoeff = wcoeff.astype(_result_dtype(coeff), copy=False)
+
+    # Single matrix product against the coefficient planes
+    if support is None:
+        cf = coeff.reshape(dim[0],-1)
+        res = np.dot(wcoeff, cf)
+    else:
+        # Evaluate only the supported pixels of each (stacked) image
+        ind, npix = _support_index(support, dim[1:])
+        cf = coeff.reshape(dim[0],-1,npix)
+        res = np.zeros(wcoeff.shape[:-1] + cf.shape[1:], dtype=wcoeff.dtype)
+        res[...,ind] = np.tensordot(wcoeff, cf[...,ind], axes=1)
+
+    if weights.ndim==1:
+        return res.reshape(dim[1:])
+    else:
+        return res.reshape((weights.shape[0],) + dim[1:])
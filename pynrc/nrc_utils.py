@@ -29,7 +29,6 @@ if not on_rtd:
 
 import datetime, time
 import sys, platform
-import multiprocessing as mp
 import traceback
 
 from astropy.io import fits, ascii
@@ -57,6 +56,9 @@ from .maths.coords import *
 # OPD info
 from .opds import opd_default, OPDFile_to_HDUList
 
+# Worker scheduling
+from .resources import get_scheduler, task_unit
+
 ###########################################################################
 #
 #    Logging info
@@ -679,36 +681,61 @@ def get_SNR(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=None,
         coeff=coeff, coeff_hdr=None, fov_pix=fov_pix, oversample=oversample, \
         quiet=quiet, forwardSNR=True, **kwargs)
 
-def _mlim_helper(sub_im, mag_norm=10, mag_arr=np.arange(5,35,1),
-    nsig=5, nint=1, snr_fact=1, forwardSNR=False, **kwargs):
-    """Helper function for determining grism sensitivities"""
+def _ramp_axis(ndim, **kwargs):
+    """Reshape array-valued ramp settings to broadcast against images
 
-    sub_im_sum = sub_im.sum()
+    Ramp settings (ngroup, nf, nd2, nint) given as 1D arrays describe
+    multiple readout configurations. These get ``ndim`` trailing axes so
+    that noise images of all configurations are computed in a single
+    :func:`pix_noise` call along a leading axis. Scalars are unchanged.
+    """
+    shape = (-1,) + (1,)*ndim
+    return {k: (np.reshape(v, shape) if np.ndim(v)>0 else v) for k, v in kwargs.items()}
 
-    # Just return the SNR for the input sub image
-    if forwardSNR:
-        im_var = pix_noise(fsrc=sub_im, **kwargs)**2
-        ns_sum = np.sqrt(np.sum(im_var) / nint)
-        return snr_fact * sub_im_sum / ns_sum
+def _noise_var(fsrc, **kwargs):
+    """Noise variance split into background and source terms
 
-    fact_arr = 10**((mag_arr-mag_norm)/2.5)
-    snr_arr = []
+    The MULTIACCUM noise variance of :func:`pix_noise` is linear in the 
+    source flux, so the variance for a source scaled by a factor ``a`` is 
+    ``var0 + a*var1``. Returns (var0, var1) in (e-/sec)^2 for source 
+    image `fsrc`. Exact unless ``ff_noise=True``, where the flat field 
+    term adds a small non-linearity.
+    """
+    var0 = pix_noise(fsrc=0*fsrc, **kwargs)**2
+    var1 = pix_noise(fsrc=fsrc, **kwargs)**2 - var0
+    return var0, var1
 
-    for f in fact_arr:
-        im = sub_im / f
-        im_var = pix_noise(fsrc=im, **kwargs)**2
-        im_sum = sub_im_sum / f
-        ns_sum = np.sqrt(np.sum(im_var) / nint)
+def _mlim_solve(flux, var0, var1, nsig=5, nint=1, snr_fact=1):
+    """Flux scale factor of a source that is detected at nsig
 
-        snr_arr.append(im_sum / ns_sum)
-    snr_arr = snr_fact*np.asarray(snr_arr)
-    return np.interp(nsig, snr_arr[::-1], mag_arr[::-1])
+    Solves ``snr_fact * a*flux / sqrt((var0 + a*var1) / nint) = nsig``
+    for the positive root ``a``, which is a quadratic equation in ``a``.
+    All inputs broadcast, so many pixels, apertures, spectral bins, and
+    ramp settings are solved at once.
+    """
+    qa = nint * (snr_fact * flux)**2
+    qb = nsig**2 * var1
+    qc = nsig**2 * var0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (qb + np.sqrt(qb**2 + 4*qa*qc)) / (2*qa)
+
+def _mag_scale(val, dmag, units):
+    """Scale flux values in `units` by a magnitude offset
+
+    Magnitude units get shifted by dmag, while all other (flux) units
+    scale by 10**(-dmag/2.5). Equivalent to renormalizing the spectrum 
+    by dmag magnitudes before converting to `units`.
+    """
+    if 'mag' in units.lower():
+        return val + dmag
+    else:
+        return val * 10**(-dmag/2.5)
 
 def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=None,
     sp=None, units=None, nsig=10, tf=10.737, ngroup=2, nf=1, nd2=0, nint=1,
     coeff=None, coeff_hdr=None, fov_pix=11, oversample=4, quiet=True, forwardSNR=False,
     offset_r=0, offset_theta=0, return_image=False, image=None,
-    cr_noise=True, dw_bin=None, ap_spec=None, rad_EE=None, **kwargs):
+    cr_noise=True, dw_bin=None, ap_spec=None, rad_EE=None, sp_zodi=None, **kwargs):
     """Sensitivity Estimates
 
     Estimates the sensitivity for a set of instrument parameters.
@@ -769,6 +796,12 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
     offset_r     : Radial offset of the target from center.
     offset_theta : Position angle for that offset, in degrees CCW (+Y).
 
+    The ramp settings (ngroup, nf, nd2, nint) may also be 1D arrays of 
+    equal size, in which case the SNR or sensitivities of all readout
+    configurations are returned as arrays in a single pass. Since the
+    noise variance is linear in the source flux, sensitivity limits are
+    solved analytically rather than searched over a magnitude grid.
+
     Misc.
     -------------------
     image        : Explicitly pass image data rather than calculating from coeff.
@@ -779,6 +812,8 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
     ap_spec      : Instead of dw_bin, specify the spectral extraction aperture in pixels.
                    Takes priority over dw_bin. Value will get rounded up to nearest int.
     cr_noise     : Include noise from cosmic ray hits?
+    sp_zodi      : Pre-computed zodiacal light spectrum (see :func:`zodi_spec`).
+                   Skips the zodiacal keyword arguments below if set.
 
     Keyword Args
     -------------------
@@ -822,7 +857,8 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
         sp_norm.name = sp.name
 
     # Zodiacal Light Stuff
-    sp_zodi = zodi_spec(**kwargs)
+    if sp_zodi is None:
+        sp_zodi = zodi_spec(**kwargs)
     obs_zodi = S.Observation(sp_zodi, bp, binset=waveset)
     fzodi_pix = obs_zodi.countrate() * (pix_scale/206265.0)**2  # e-/sec/pixel
     # Collecting area gets reduced for coronagraphic observations
@@ -852,6 +888,10 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
 
     # Cosmic Ray Loss (JWST-STScI-001721)
     # SNR with cosmic ray events depends directly on ramp integration time
+    ngroup, nf, nd2 = (np.asarray(v) for v in (ngroup, nf, nd2))
+    # Scalar ramp settings, or multiple settings along a leading axis?
+    ramp_scalar = np.broadcast(ngroup, nf, nd2, nint).shape == ()
+
     if cr_noise:
         tint = (ngroup*nf + (ngroup-1)*nd2) * tf
         snr_fact = 1.0 - tint*6.7781e-5
@@ -916,37 +956,37 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
         ispec1 = np.asarray(ind_wave) - ap_spec // 2
         ispec2 = ispec1 + ap_spec
 
-        # At each wavelength, grab a sub image and find the limiting magnitude
-        bglim_arr = []
+        # Flux and noise variances within the extraction aperture of each
+        # spectral bin, for all ramp settings along the last axis.
+        ramp = _ramp_axis(spec.ndim, ngroup=ngroup, nf=nf, nd2=nd2)
+        var0, var1 = _noise_var(spec, tf=tf, fzodi=fzodi_pix, **ramp, **kwargs)
+        var0 = var0.reshape((-1,) + spec.shape)
+        var1 = var1.reshape((-1,) + spec.shape)
+        flux_sum, var0_sum, var1_sum = [], [], []
         for i in np.arange(wsen_arr.size):
-            sub_im = spec[ispat1[i]:ispat2[i],ispec1[i]:ispec2[i]]
+            ind = (Ellipsis, slice(ispat1[i],ispat2[i]), slice(ispec1[i],ispec2[i]))
+            flux_sum.append(spec[ind].sum())
+            var0_sum.append(var0[ind].sum(axis=(-2,-1)))
+            var1_sum.append(var1[ind].sum(axis=(-2,-1)))
+        flux_sum = np.array(flux_sum).reshape([-1,1])
+        var0_sum = np.array(var0_sum)
+        var1_sum = np.array(var1_sum)
+
+        if forwardSNR:
+            bglim_arr = snr_fact * flux_sum / np.sqrt((var0_sum + var1_sum) / nint)
+        else:
+            # Flux scale factor of the spectrum at the nsig limit
+            scale = _mlim_solve(flux_sum, var0_sum, var1_sum, nsig=nsig, nint=nint, 
+                                snr_fact=snr_fact)
+            mag_lim = mag_norm - 2.5*np.log10(scale)
 
-            if forwardSNR:
-                snr = _mlim_helper(sub_im, nint=nint, forwardSNR=forwardSNR,
-                    ngroup=ngroup, nf=nf, nd2=nd2, tf=tf, fzodi=fzodi_pix,
-                    snr_fact=snr_fact, **kwargs)
-                bglim_arr.append(snr)
+            # Sensitivities in desired units at each wavelength
+            sp_norm.convert(units)
+            fvals = np.interp(wsen_arr, sp_norm.wave/1e4, sp_norm.flux)
+            bglim_arr = _mag_scale(fvals.reshape([-1,1]), mag_lim - mag_norm, units)
 
-            else:
-                # Interpolate over a coarse magnitude grid
-                mag_arr=np.arange(5,35,1)
-                mag_lim = _mlim_helper(sub_im, mag_norm, mag_arr, nsig=nsig, nint=nint,
-                    ngroup=ngroup, nf=nf, nd2=nd2, tf=tf, fzodi=fzodi_pix,
-                    snr_fact=snr_fact, **kwargs)
-
-                # Zoom in and interoplate over finer grid
-                mag_arr = np.arange(mag_lim-1,mag_lim+1,0.05)
-                mag_lim = _mlim_helper(sub_im, mag_norm, mag_arr, nsig=nsig, nint=nint,
-                    ngroup=ngroup, nf=nf, nd2=nd2, tf=tf, fzodi=fzodi_pix,
-                    snr_fact=snr_fact, **kwargs)
-
-                # Renormalize spectrum to magnitude limit and convert to desired units
-                sp_norm2 = sp.renorm(mag_lim, 'vegamag', bp)
-                sp_norm2.convert(units)
-                bglim = np.interp(wsen_arr[i],sp_norm2.wave/1e4, sp_norm2.flux)
-                bglim_arr.append(bglim)
-
-        bglim_arr = np.asarray(bglim_arr)
+        if ramp_scalar:
+            bglim_arr = bglim_arr[:,0]
 
         # Return sensitivity list along with corresponding wavelengths to dictionary
         if forwardSNR:
@@ -955,7 +995,7 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
             out = {'wave':wsen_arr.tolist(), 'snr':bglim_arr.tolist(),
                    'flux_units':units, 'flux':fvals.tolist(), 'Spectrum':sp.name}
 
-            if quiet == False:
+            if (quiet == False) and ramp_scalar:
                 print('{0} SNR for {1} source'.format(bp.name,sp.name))
                 names = ('Wave','SNR','Flux ({})'.format(units))
                 tbl = Table([wsen_arr,bglim_arr, fvals], names=names)
@@ -967,7 +1007,7 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
             out = {'wave':wsen_arr.tolist(), 'sensitivity':bglim_arr.tolist(),
                    'units':units, 'nsig':nsig, 'Spectrum':sp.name}
 
-            if quiet == False:
+            if (quiet == False) and ramp_scalar:
                 print('{} Background Sensitivity ({}-sigma) for {} source'.\
                     format(bp.name,nsig,sp.name))
 
@@ -1015,16 +1055,20 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
         #print(image_ext)
 
         if forwardSNR:
-            im_var = pix_noise(ngroup=ngroup, nf=nf, nd2=nd2, tf=tf,
-                fzodi=fzodi_pix, fsrc=image, **kwargs)**2
+            ramp = _ramp_axis(image.ndim, ngroup=ngroup, nf=nf, nd2=nd2)
+            im_var = pix_noise(tf=tf, fzodi=fzodi_pix, fsrc=image, **ramp, **kwargs)**2
+            im_var = im_var.reshape((-1,) + image.shape)
 
             # root squared sum of noise within each radius
-            sums = binned_statistic(igroups, im_var, func=np.sum)
-            EE_var = np.cumsum(sums)
-            EE_sig = np.sqrt(EE_var / nint)
-
-            EE_snr = snr_fact * EE_flux / EE_sig
-            snr_rad = np.interp(rad_EE, rad_pix, EE_snr)
+            sums = np.array([binned_statistic(igroups, v, func=np.sum) for v in im_var])
+            EE_var = np.cumsum(sums, axis=-1)
+            ramp = _ramp_axis(1, nint=nint, snr_fact=snr_fact)
+            EE_sig = np.sqrt(EE_var / ramp['nint'])
+
+            EE_snr = ramp['snr_fact'] * EE_flux / EE_sig
+            snr_rad = np.array([np.interp(rad_EE, rad_pix, v) for v in EE_snr])
+            if ramp_scalar:
+                snr_rad = snr_rad[0]
             flux_val = obs.effstim(units)
             out1 = {'type':'Point Source', 'snr':snr_rad, 'Spectrum':sp.name,
                 'flux':flux_val, 'flux_units':units}
@@ -1039,83 +1083,56 @@ def bg_sensitivity(filter_or_bp, pupil=None, mask=None, module='A', pix_scale=No
             out2 = {'type':'Surface Brightness', 'snr':snr2, 'Spectrum':sp.name,
                 'flux':flux_val, 'flux_units':units+'/arcsec^2'}
 
-            if quiet == False:
+            if (quiet == False) and ramp_scalar:
                 for out in [out1,out2]:
                     print('{} SNR ({:.2f} {}): {:.2f} sigma'.\
                         format(out['type'], out['flux'], out['flux_units'], out['snr']))
 
         else:
-            # Interpolate over a coarse magnitude grid to get SNR
-            # Then again over a finer grid
-            for ii in np.arange(2):
-                if ii==0: mag_arr = np.arange(5,35,1)
-                else: mag_arr = np.arange(mag_lim-1,mag_lim+1,0.05)
-
-                fact_arr = 10**((mag_arr-mag_norm)/2.5)
-                snr_arr = []
-                for f in fact_arr:
-                    #im_var = image/f/tint + var_const
-
-                    im_var = pix_noise(ngroup=ngroup, nf=nf, nd2=nd2, tf=tf,
-                        fzodi=fzodi_pix, fsrc=image/f, **kwargs)**2
-
-                    # root squared sum of noise within each radius
-                    sums = binned_statistic(igroups, im_var, func=np.sum)
-                    EE_var = np.cumsum(sums)
-                    EE_sig = np.sqrt(EE_var / nint)
-
-                    EE_snr = snr_fact * (EE_flux/f) / EE_sig
-                    snr_rad = np.interp(rad_EE, rad_pix, EE_snr)
-                    snr_arr.append(snr_rad)
-
-                snr_arr = np.asarray(snr_arr)
-                mag_lim = np.interp(nsig, snr_arr[::-1], mag_arr[::-1])
-
-                _log.debug('Mag Limits [{0:.2f},{1:.2f}]; {2:.0f}-sig: {3:.2f}'.\
-                    format(mag_arr.min(),mag_arr.max(),nsig,mag_lim))
-
-            # Renormalize spectrum at given magnitude limit
-            sp_norm2 = sp.renorm(mag_lim, 'vegamag', bp)
-            # Determine effective stimulus
-            obs2 = S.Observation(sp_norm2, bp, binset=waveset)
-            bglim = obs2.effstim(units)
+            # Noise variance within each radius at a flux scale a of the 
+            # fiducial source is EE_var0 + a*EE_var1
+            ramp = _ramp_axis(image.ndim, ngroup=ngroup, nf=nf, nd2=nd2)
+            var0, var1 = _noise_var(image, tf=tf, fzodi=fzodi_pix, **ramp, **kwargs)
+            EE_var = []
+            for var in (var0, var1):
+                var = var.reshape((-1,) + image.shape)
+                sums = np.array([binned_statistic(igroups, v, func=np.sum) for v in var])
+                EE_var.append(np.cumsum(sums, axis=-1))
+
+            # Flux and variances within extraction aperture
+            flux_rad = np.interp(rad_EE, rad_pix, EE_flux)
+            var0_rad, var1_rad = [np.array([np.interp(rad_EE, rad_pix, v) for v in var]) 
+                                  for var in EE_var]
+
+            scale = _mlim_solve(flux_rad, var0_rad, var1_rad, nsig=nsig, nint=nint, 
+                                snr_fact=snr_fact)
+            mag_lim = mag_norm - 2.5*np.log10(scale)
+            if ramp_scalar:
+                mag_lim = mag_lim[0]
+            _log.debug('{0:.0f}-sig Mag Limits: {1}'.format(nsig,mag_lim))
+
+            # Effective stimulus at given magnitude limit
+            stim = obs.effstim(units)
+            bglim = _mag_scale(stim, mag_lim - mag_norm, units)
 
             out1 = {'sensitivity':bglim, 'units':units, 'nsig':nsig, 'Spectrum':sp.name}
 
             # Same thing as above, but for surface brightness
-            for ii in np.arange(2):
-                if ii==0: mag_arr = np.arange(5,35,1)
-                else: mag_arr = np.arange(mag_lim-1,mag_lim+1,0.05)
-
-                fact_arr = 10**((mag_arr-mag_norm)/2.5)
-                snr_arr = []
-                for f in fact_arr:
-                    im_var = pix_noise(ngroup=ngroup, nf=nf, nd2=nd2, tf=tf,
-                        fzodi=fzodi_pix, fsrc=image_ext/f, **kwargs)**2
-
-                    im_sig = np.sqrt(im_var*npix_EE / nint)
-                    fsum2 = image_ext * npix_EE / f
-                    snr2 = snr_fact * fsum2 / im_sig
-                    #print('{:.5f} {:.5f} {:.2f}'.format(fsum2,im_sig,snr2))
-
-                    snr_arr.append(snr2)
-
-                snr_arr = np.asarray(snr_arr)
-                mag_lim = np.interp(nsig, snr_arr[::-1], mag_arr[::-1])
-
-                _log.debug('Mag Limits (mag/asec^2) [{0:.2f},{1:.2f}]; {2:.0f}-sig: {3:.2f}'.\
-                    format(mag_arr.min(),mag_arr.max(),nsig,mag_lim))
-
+            var0, var1 = _noise_var(image_ext, ngroup=ngroup, nf=nf, nd2=nd2, tf=tf,
+                                    fzodi=fzodi_pix, **kwargs)
+            scale = _mlim_solve(image_ext*npix_EE, var0*npix_EE, var1*npix_EE, 
+                                nsig=nsig, nint=nint, snr_fact=snr_fact)
             # mag_lim is in terms of mag/arcsec^2 (same as mag_norm)
-            sp_norm2 = sp.renorm(mag_lim, 'vegamag', bp)
-            obs2 = S.Observation(sp_norm2, bp, binset=waveset)
-            bglim2 = obs2.effstim(units) # units/arcsec**2
+            mag_lim = mag_norm - 2.5*np.log10(scale)
+            _log.debug('{0:.0f}-sig Mag Limits (mag/asec^2): {1}'.format(nsig,mag_lim))
+
+            bglim2 = _mag_scale(stim, mag_lim - mag_norm, units) # units/arcsec**2
 
             out2 = out1.copy()
             out2['sensitivity'] = bglim2
             out2['units'] = units+'/arcsec^2'
 
-            if quiet == False:
+            if (quiet == False) and ramp_scalar:
                 print('{} Sensitivity ({}-sigma): {:.2f} {}'.\
                        format('Point Source', nsig, bglim, out1['units']))
                 print('{} Sensitivity ({}-sigma): {:.2f} {}'.\
@@ -1271,12 +1288,11 @@ def sat_limit_webbpsf(filter_or_bp, pupil=None, mask=None, module='A', pix_scale
             l1 = w-wdel/4
             l2 = w+wdel/4
             ind = ((wspec > l1) & (wspec <= l2))
-            msat = sat_mag[fov_pix//2-1:fov_pix//2+2,ind].max()
-            sp_temp = sp.renorm(msat, 'vegamag', bp_lim)
-            obs_temp = S.Observation(sp_temp, bp_lim, binset=bp_lim.wave)
-            msat_arr.append(obs_temp.effstim(units))
+            msat_arr.append(sat_mag[fov_pix//2-1:fov_pix//2+2,ind].max())
 
-        msat_arr = np.array(msat_arr)
+        # Convert to desired unit
+        obs_lim = S.Observation(sp_norm, bp_lim, binset=bp_lim.wave)
+        msat_arr = _mag_scale(obs_lim.effstim(units), np.array(msat_arr) - mag_norm, units)
 
         # Print verbose information
         if not quiet:
@@ -1317,9 +1333,9 @@ def sat_limit_webbpsf(filter_or_bp, pupil=None, mask=None, module='A', pix_scale
         sat_mag = mag_norm + 2.5*np.log10(ratio)
 
         # Convert to desired unit
-        sp_temp = sp.renorm(sat_mag, 'vegamag', bp_lim)
-        obs_temp = S.Observation(sp_temp, bp_lim, binset=bp_lim.wave)
-        res1 = obs_temp.effstim(units)
+        obs_lim = S.Observation(sp_norm, bp_lim, binset=bp_lim.wave)
+        stim_lim = obs_lim.effstim(units)
+        res1 = _mag_scale(stim_lim, sat_mag - mag_norm, units)
         
         out1 = {'satlim':res1, 'units':units, 'bp_lim':bp_lim.name, 'Spectrum':sp_norm.name}
 
@@ -1338,9 +1354,7 @@ def sat_limit_webbpsf(filter_or_bp, pupil=None, mask=None, module='A', pix_scale
         sat_mag_ext = mag_norm + 2.5*np.log10(ratio)
 
         # Convert to desired unit
-        sp_temp = sp.renorm(sat_mag_ext, 'vegamag', bp_lim)
-        obs_temp = S.Observation(sp_temp, bp_lim, binset=bp_lim.wave)
-        res2 = obs_temp.effstim(units)
+        res2 = _mag_scale(stim_lim, sat_mag_ext - mag_norm, units)
 
         out2 = out1.copy()
         out2['satlim'] = res2
@@ -3811,7 +3825,8 @@ def nproc_use_convolve(fov_pix, oversample, npsf=None):
     parallel without swapping to disk, with a mixture of empiricism and conservatism.
     One really does not want to end up swapping to disk with huge arrays.
 
-    NOTE: Requires psutil package. Otherwise defaults to mp.cpu_count() / 2
+    Worker counts come from :class:`~pynrc.resources.ResourceScheduler`,
+    which measures per-process memory usage on first use.
 
     Parameters
     -----------
@@ -3823,48 +3838,15 @@ def nproc_use_convolve(fov_pix, oversample, npsf=None):
         Number of PSFs. Sets maximum # of processes.
     """
 
-    try:
-        import psutil
-    except ImportError:
-        nproc = int(mp.cpu_count() // 2)
-        if nproc < 1: nproc = 1
-
-        _log.info("No psutil package available, cannot estimate optimal nprocesses.")
-        _log.info("Returning nproc=ncpu/2={}.".format(nproc))
-        return nproc
-
-    mem = psutil.virtual_memory()
-    avail_GB = mem.available / (1024**3) - 1.0 # Leave 1 GB
-
-    fov_pix_over = fov_pix * oversample
-
     # Memory formulas are based on fits to memory usage stats for:
     #   fov_arr = np.array([16,32,128,160,256,320,512,640,1024,2048])
     #   os_arr = np.array([1,2,4,8])
-    # In MBytes
-    mem_total = 300*(fov_pix_over)**2 * 8 / (1024**2)
-
-    # Convert to GB
-    mem_total /= 1024
-
-    # How many processors to split into?
-    nproc = avail_GB // mem_total
-    nproc = np.min([nproc, mp.cpu_count(), poppy.conf.n_processes])
-    if npsf is not None:
-        nproc = np.min([nproc, npsf])
-        # Resource optimization:
-        # Split iterations evenly over processors to free up minimally used processors.
-        # For example, if there are 5 processes only doing 1 iteration, but a single
-        #   processor doing 2 iterations, those 5 processors (and their memory) will not
-        #   get freed until the final processor is finished. So, to minimize the number
-        #   of idle resources, take the total iterations and divide by two (round up),
-        #   and that should be the final number of processors to use.
-        np_max = np.ceil(npsf / nproc)
-        nproc = int(np.ceil(npsf / np_max))
-
-    if nproc < 1: nproc = 1
-
-    return int(nproc)
+    # Scale factors and fixed overheads are measured on each host.
+    unit_GB = task_unit('convolve', fov_pix * oversample)
+
+    # Leave 1 GB
+    return get_scheduler().nworkers('convolve', unit_GB, ntask=npsf, reserve_GB=1.0,
+                                    max_workers=poppy.conf.n_processes)
 
 
 ###########################################################################
@@ -39,6 +39,13 @@ class nrc_hci(NIRCam):
 
     """
 
+    # Cached PSFs and mask images are also deferred in lazy mode
+    _lazy_loaders = NIRCam._lazy_loaders + (
+        ('_gen_cached_psfs', ('psf_center_over', 'psf_offaxis_over', 
+                              'psf_center_offsets', '_psf_bar_interp')),
+        ('_gen_cmask', ('mask_images',)),
+    )
+
     def __init__(self, wind_mode='WINDOW', xpix=320, ypix=320, wfe_drift=True, verbose=False, **kwargs):
 
         if 'FULL'   in wind_mode: xpix = ypix = 2048
@@ -70,14 +77,20 @@ class nrc_hci(NIRCam):
         # -----------
         # Generate cached PSFs for quick retrieval.
         # A PSF centered on the mask and one fully off-axis.
-        if verbose: 
-            print("Generating cached PSFs...")
-        self._gen_cached_psfs()
+        if self.lazy:
+            self._lazy_defer('_gen_cached_psfs')
+        else:
+            if verbose: 
+                print("Generating cached PSFs...")
+            self._gen_cached_psfs()
 
         # Set locations based on detector
         self._set_xypos()
         # Create mask throughput images seen by each detector
-        self._gen_cmask()
+        if self.lazy:
+            self._lazy_defer('_gen_cmask')
+        else:
+            self._gen_cmask()
 
 
     # @property
@@ -124,10 +137,13 @@ class nrc_hci(NIRCam):
 
         Parameters
         ----------
-        offset_r : float
+        offset_r : float or ndarray
             Radial offset of the target from center in arcsec.
-        offset_theta : float
+        offset_theta : float or ndarray
             Position angle for that offset, in degrees CCW (+Y).
+            If either offset is an array, then a (noff, ny, nx) array of
+            PSFs is returned. For bar masks with a spectrum, the occulted
+            PSFs at all positions are generated in a single batch.
 
         Keyword Args
         ------------
@@ -139,6 +155,29 @@ class nrc_hci(NIRCam):
 
         """
 
+        if (np.ndim(offset_r) > 0) or (np.ndim(offset_theta) > 0):
+            offset_r, offset_theta = np.broadcast_arrays(offset_r, offset_theta)
+            offset_r, offset_theta = (offset_r.ravel(), offset_theta.ravel())
+
+            kw = {'sp': sp, 'return_oversample': return_oversample, 'wfe_drift': wfe_drift}
+            if (sp is None) or (self.mask is None) or (self.mask[-1]!='B'):
+                # Cached PSFs or position-independent spectral PSFs
+                psfs = [self.gen_offset_psf(r, th, **kw) for r, th in zip(offset_r, offset_theta)]
+                return np.array(psfs)
+
+            # Bar masks: occulted PSFs along the bar in one contraction
+            offx_asec, _ = rtheta_to_xy(offset_r, offset_theta)
+            _, psf_center = self.gen_psf(sp, return_oversample=True, use_bg_psf=False, 
+                                         bar_offset=np.atleast_1d(offx_asec))
+            _, psf_offaxis = self.gen_psf(sp, return_oversample=True, use_bg_psf=True,
+                                          wfe_drift=wfe_drift)
+            psfs = [self._psf_lin_comb(r, th, psf_cen, psf_offaxis) 
+                    for r, th, psf_cen in zip(offset_r, offset_theta, psf_center)]
+            if not return_oversample:
+                fov_pix = self.psf_info['fov_pix']
+                psfs = [krebin(psf, (fov_pix,fov_pix)) for psf in psfs]
+            return np.array(psfs)
+
         if sp is None:
             # No spectral information, so use cached PSFs
             # Let _psf_lin_comb() handle things
@@ -230,10 +269,7 @@ class nrc_hci(NIRCam):
 
             # Get center PSF
             if psf_center is None:
-                vals = self.psf_center_offsets
-                arr = np.array(self.psf_center_over)
-                func = interp1d(vals, arr, axis=0, kind='linear')
-                psf_center = func(offx_asec)
+                psf_center = self.psf_center_bar(offx_asec)
 
             # Oversampled image mask
             im_mask = coron_trans(self.mask, fov=fov_asec, pixscale=pixscale_over, nd_squares=False)
@@ -279,20 +315,42 @@ class nrc_hci(NIRCam):
         # baroff_orig = self.bar_offset
         # self._bar_wfe_val = baroff_orig
 
-        # Loop through offset locations and save PSFs
-        psf_list = []
-        for offset in offset_vals:
-            #print(offset)
-            # self.bar_offset = offset
-            _, psf = self.gen_psf(return_oversample=True, use_bg_psf=False, bar_offset=offset)
-            psf_list.append(psf)
+        # All offset locations are evaluated in a single batched contraction
+        _, psf_arr = self.gen_psf(return_oversample=True, use_bg_psf=False, bar_offset=offset_vals)
 
         # Return to original bar offset position
         # self.bar_offset = baroff_orig
         # self._bar_wfe_val = None
 
         self.psf_center_offsets = offset_vals
-        self.psf_center_over = psf_list
+        self.psf_center_over = psf_arr
+        # Interpolator is built on first use
+        self._psf_bar_interp = None
+
+    def psf_center_bar(self, offx_asec):
+        """Occulted PSF at given position(s) along the bar mask
+
+        Linearly interpolates the cached family of oversampled PSFs
+        generated along the center of the wedge (:attr:`psf_center_over`).
+        The interpolator is created once and reused until the PSFs are
+        regenerated.
+
+        Parameters
+        ----------
+        offx_asec : float or ndarray
+            Offset(s) along the bar (arcsec).
+
+        Returns
+        -------
+        Oversampled PSF, or (noff, ny, nx) array if `offx_asec` is an array.
+        """
+        func = getattr(self, '_psf_bar_interp', None)
+        if func is None:
+            vals = self.psf_center_offsets
+            arr = np.asarray(self.psf_center_over)
+            func = interp1d(vals, arr, axis=0, kind='linear', assume_sorted=True)
+            self._psf_bar_interp = func
+        return func(offx_asec)
 
     def _set_xypos(self, xy=None):
         """
@@ -665,12 +723,12 @@ class obs_hci(nrc_hci):
             psf = self.gen_offset_psf(0, 0)
             self.psf_list = [psf]
         elif self.mask[-1]=='R': # Round masks
-            self.psf_list = [self.gen_offset_psf(offset, 0) for offset in self.offset_list]
+            self.psf_list = list(self.gen_offset_psf(np.asarray(self.offset_list), 0))
         elif self.mask[-1]=='B': # Bar masks
             # Set bar offset to 0, for this part, then return to original value
             # baroff_orig = self.bar_offset
             # self.bar_offset = 0
-            self.psf_list = [self.gen_offset_psf(offset, 0) for offset in self.offset_list]
+            self.psf_list = list(self.gen_offset_psf(np.asarray(self.offset_list), 0))
             # self.bar_offset = baroff_orig
 
     def planet_spec(self, Av=0, **kwargs):
@@ -1664,10 +1722,7 @@ class obs_hci(nrc_hci):
             bvals = 1 - avals
 
             # Get PSF at middle of bar
-            vals = self.psf_center_offsets
-            arr = np.array(self.psf_center_over)
-            func = interp1d(vals, arr, axis=0, kind='linear')
-            psf_center = func(bar_offset)
+            psf_center = self.psf_center_bar(bar_offset)
 
             # Linearly combine PSFs
             fov_pix = self.psf_info['fov_pix']
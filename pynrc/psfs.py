@@ -12,9 +12,16 @@ import datetime, time
 import sys, platform
 import multiprocessing as mp
 import traceback
+import atexit, hashlib, pickle, shutil, tempfile
+from collections import OrderedDict
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
 
 import scipy
-from scipy.interpolate import griddata, RegularGridInterpolator, interp1d
+from scipy.interpolate import griddata, interp1d
 from numpy.polynomial import legendre
 
 from astropy.io import fits, ascii
@@ -28,8 +35,12 @@ from .logging_utils import setup_logging
 
 from .nrc_utils import read_filter, S, grism_res
 from .opds import opd_default, OPDFile_to_HDUList
+from .coeff_store import get_coeff_store, coeff_store_dir, hash_inputs, coeff_cache
+from .coeff_store import _set_readonly
+from .coeff_store import coeff_file_ext, read_bundle
+from .resources import get_scheduler, task_unit
 from .maths.image_manip import frebin, pad_or_cut_to_size
-from .maths.fast_poly import jl_poly_fit, jl_poly
+from .maths.fast_poly import jl_poly_fit, jl_poly, jl_poly_weighted_sum
 from .maths.coords import Tel2Sci_info, NIRCam_V2V3_limits, dist_image
 
 # Program bar
@@ -119,7 +130,8 @@ def nproc_use(fov_pix, oversample, nwavelengths, coron=False):
     for a multi-wavelength calculation. One really does not want
     to end up swapping to disk with huge arrays.
 
-    NOTE: Requires ``psutil`` package. Otherwise defaults to ``mp.cpu_count() / 2``
+    Worker counts come from :class:`~pynrc.resources.ResourceScheduler`,
+    which measures per-process memory usage on first use.
 
     Parameters
     -----------
@@ -134,82 +146,208 @@ def nproc_use(fov_pix, oversample, nwavelengths, coron=False):
         If so, the total RAM usage is different than for direct imaging.
     """
 
-    try:
-        import psutil
-    except ImportError:
-        nproc = int(mp.cpu_count() // 2)
-        if nproc < 1: nproc = 1
-
-        _log.info("No psutil package available, cannot estimate optimal nprocesses.")
-        _log.info("Returning nproc=ncpu/2={}.".format(nproc))
-        return nproc
-
-    mem = psutil.virtual_memory()
-    avail_GB = mem.available / 1024**3
-    # Leave 10% for other things
-    avail_GB *= 0.9
-
     fov_pix_over = fov_pix * oversample
 
     # For multiprocessing, memory accumulates into the main process
     # so we have to subtract the total from the available amount
     reserve_GB = nwavelengths * fov_pix_over**2 * 8 / 1024**3
-    # If not enough available memory, then just return nproc=1
-    if avail_GB < reserve_GB:
-        _log.warn('Not enough available memory ({} GB) to \
-                   to hold resulting PSF info ({} GB)!'.\
-                   format(avail_GB,reserve_GB))
-        return 1
-
-    avail_GB -= reserve_GB
 
-    # Memory formulas are based on fits to memory usage stats for:
+    # Size-dependent part of the per-process memory, based on fits to
+    # memory usage stats for:
     #   fov_arr = np.array([16,32,128,160,256,320,512,640,1024,2048])
     #   os_arr = np.array([1,2,4,8])
-    if coron:  # Coronagraphic Imaging (in MB)
-        mem_total = (oversample*1024*2.4)**2 * 16 / (1024**2) + 500
-        if fov_pix > 1024: mem_total *= 1.6
+    # Fixed overheads and scale factors are measured on each host.
+    if coron:  # Coronagraphic Imaging
+        unit_GB = (oversample*1024*2.4)**2 * 16 / 1024**3
+        if fov_pix > 1024: unit_GB *= 1.6
     else:  # Direct Imaging (also spectral imaging)
-        mem_total = 5*(fov_pix_over)**2 * 8 / (1024**2) + 300.
-
-    # Convert to GB
-    mem_total /= 1024
-
-    # How many processors to split into?
-    nproc = int(avail_GB / mem_total)
-    nproc = np.min([nproc, mp.cpu_count(), poppy.conf.n_processes])
+        unit_GB = task_unit('webbpsf', fov_pix_over)
 
+    sched = get_scheduler()
+    max_workers = poppy.conf.n_processes
     # Each PSF calculation will constantly use multiple processors
     # when not oversampled, so let's divide by 2 for some time
     # and memory savings on those large calculations
     if oversample==1:
-        nproc = np.ceil(nproc / 2)
+        max_workers = np.max([np.ceil(max_workers / 2), 1])
+    nproc = sched.nworkers('webbpsf', unit_GB, ntask=nwavelengths,
+                           reserve_GB=reserve_GB, max_workers=max_workers)
 
-    _log.debug('avail mem {}; mem tot: {}; nproc_init: {:.0f}'.\
-        format(avail_GB, mem_total, nproc))
+    # Multiprocessing can only swap up to 2GB of data from the child
+    # process to the master process. Return nproc=1 if too much data.
+    # Not an issue if results are returned through shared memory.
+    if shared_memory is None:
+        im_size = (fov_pix_over)**2 * 8 / (1024**3)
+        np_max = sched.chunksize(nwavelengths, nproc)
+        nproc = 1 if (im_size * np_max) >=2 else nproc
 
-    nproc = np.min([nproc, nwavelengths])
-    # Resource optimization:
-    # Split iterations evenly over processors to free up minimally used processors.
-    # For example, if there are 5 processes only doing 1 iteration, but a single
-    #	processor doing 2 iterations, those 5 processors (and their memory) will not
-    # 	get freed until the final processor is finished. So, to minimize the number
-    #	of idle resources, take the total iterations and divide by two (round up),
-    #	and that should be the final number of processors to use.
-    np_max = np.ceil(nwavelengths / nproc)
-    nproc = int(np.ceil(nwavelengths / np_max))
+    return int(nproc)
 
-    if nproc < 1: nproc = 1
 
-    # Multiprocessing can only swap up to 2GB of data from the child
-    # process to the master process. Return nproc=1 if too much data.
-    im_size = (fov_pix_over)**2 * 8 / (1024**3)
-    nproc = 1 if (im_size * np_max) >=2 else nproc
+###########################################################################
+#
+#    Persistent worker pool
+#
+###########################################################################
 
-    _log.debug('avail mem {}; mem tot: {}; nproc_fin: {:.0f}'.\
-        format(avail_GB, mem_total, nproc))
+# Pool is kept alive between coefficient builds so that process startup
+# and instrument construction are only paid once per session.
+_worker_pool = None
+_worker_pool_nproc = 0
 
-    return int(nproc)
+# Per-process cache of instruments deserialized in worker processes
+_worker_insts = OrderedDict()
+_worker_insts_max = 4
+
+def _init_worker():
+    """Initializer for each process in the persistent worker pool."""
+    # Workers are daemonic, so they cannot spawn their own pools
+    poppy.conf.use_multiprocessing = False
+    poppy.conf.n_processes = 1
+    _worker_insts.clear()
+
+def get_worker_pool(nproc):
+    """Persistent multiprocessing pool
+
+    Return a process pool with at least `nproc` workers. The same pool
+    is reused across calls to :func:`gen_psf_coeff`, :func:`wfed_coeff`,
+    and :func:`field_coeff_resid` and is only rebuilt if more workers
+    are requested than currently exist.
+
+    Parameters
+    ----------
+    nproc : int
+        Number of worker processes required.
+    """
+    global _worker_pool, _worker_pool_nproc
+
+    if (_worker_pool is not None) and (_worker_pool_nproc >= nproc):
+        return _worker_pool
+
+    close_worker_pool()
+    _log.debug('Starting worker pool with {} processes.'.format(nproc))
+    _worker_pool = mp.Pool(nproc, initializer=_init_worker)
+    _worker_pool_nproc = nproc
+    return _worker_pool
+
+def close_worker_pool(terminate=False):
+    """Shut down the persistent worker pool, if one is running.
+
+    Parameters
+    ----------
+    terminate : bool
+        Stop workers immediately rather than waiting for
+        outstanding tasks to complete.
+    """
+    global _worker_pool, _worker_pool_nproc
+
+    pool = _worker_pool
+    _worker_pool = None
+    _worker_pool_nproc = 0
+    if pool is None:
+        return
+
+    _log.debug('Closing multiprocess pool.')
+    if terminate:
+        pool.terminate()
+    else:
+        pool.close()
+    pool.join()
+
+atexit.register(close_worker_pool)
+
+def _pool_map(func, worker_args, nproc, progress=False):
+    """Ordered map over the persistent pool using at most `nproc` workers.
+
+    Tasks are grouped into at most `nproc` chunks so that the number of
+    simultaneous calculations (and hence memory usage) is bounded by
+    `nproc`, even if the pool itself holds more workers.
+    """
+    pool = get_worker_pool(nproc)
+    ntask = len(worker_args)
+    chunksize = get_scheduler().chunksize(ntask, nproc)
+    try:
+        res_iter = pool.imap(func, worker_args, chunksize=chunksize)
+        if progress:
+            res_iter = tqdm(res_iter, total=ntask)
+        res = list(res_iter)
+        if any(r is None for r in res):
+            raise RuntimeError('Returned None values. Issue with multiprocess or WebbPSF??')
+    except Exception as e:
+        _log.error('Caught an exception during multiprocess.')
+        _log.error('Closing multiprocess pool.')
+        close_worker_pool(terminate=True)
+        raise e
+
+    return res
+
+def _share_inst(inst):
+    """Serialize instrument once for all workers.
+
+    Returns a (key, filename) pair that is passed to workers
+    in place of the instrument object itself.
+    """
+    data = pickle.dumps(inst, protocol=pickle.HIGHEST_PROTOCOL)
+    key = hashlib.sha1(data).hexdigest()
+    fname = os.path.join(tempfile.gettempdir(), 'pynrc_inst_{}_{}.pkl'.format(os.getpid(), key[:16]))
+    if not os.path.exists(fname):
+        with open(fname + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(fname + '.tmp', fname)
+    return key, fname
+
+def _get_worker_inst(key, fname):
+    """Return instrument from worker cache, loading it on first use."""
+    try:
+        inst = _worker_insts.pop(key)
+    except KeyError:
+        with open(fname, 'rb') as f:
+            inst = pickle.load(f)
+    _worker_insts[key] = inst
+    while len(_worker_insts) > _worker_insts_max:
+        _worker_insts.popitem(last=False)
+    return inst
+
+def _wrap_coeff_for_pool(args):
+    """
+    Pool version of :func:`_wrap_coeff_for_mp`, where the instrument
+    is referenced by key and only built once per worker process.
+
+    If `shm_info` is set, the image is written directly into the parent's
+    shared-memory buffer at the given index and only the header is sent
+    back. Otherwise (or if the image shape is unexpected), the image data
+    is returned along with the header.
+
+    args => (inst_key,inst_file,w,fov_pix,oversample,shm_info)
+    shm_info => (shm_name,shape,dtype,index) or None
+
+    Returns (header, data) where data is None if stored in shared memory.
+    """
+    key, fname, w, fov_pix, oversample, shm_info = args
+    try:
+        inst = _get_worker_inst(key, fname)
+    except Exception:
+        print('Caught exception loading instrument in worker (w = {}):'.format(w))
+        traceback.print_exc()
+        return None
+
+    hdu = _wrap_coeff_for_mp((inst,w,fov_pix,oversample))
+    if hdu is None:
+        return None
+
+    if shm_info is not None:
+        shm_name, shape, dtype, ind = shm_info
+        if hdu.data.shape == tuple(shape[1:]):
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                buf = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                buf[ind] = hdu.data
+                del buf
+            finally:
+                shm.close()
+            return hdu.header, None
+
+    return hdu.header, hdu.data
 
 
 def _wrap_coeff_for_mp(args):
@@ -248,6 +386,216 @@ def _wrap_coeff_for_mp(args):
     return hdu_list[0]
 
 
+def _load_coeff_fits(fname):
+    """Read PSF coefficients and header from FITS file."""
+    hdul = fits.open(fname)
+    data = hdul[0].data
+    # Native byte order, preserving single or double precision
+    data = data.astype(data.dtype.newbyteorder('='))
+    header = hdul[0].header
+    hdul.close()
+    return data, header
+
+def _load_coeff_npz(fname):
+    """Read all arrays from an ``.npz`` coefficient file."""
+    with np.load(fname) as out:
+        res = tuple(out['arr_{}'.format(i)] for i in range(len(out.files)))
+    return res
+
+def _load_coeff_npy(fname):
+    """Read array from an ``.npy`` coefficient file."""
+    return np.load(fname)
+
+def _load_coeff_bundle(fname):
+    """Memory-map a ``.coeff`` bundle; returns (data, *aux, [header])."""
+    data, aux, header = read_bundle(fname, mmap_mode='r')
+    res = (data,) + aux
+    return res if header is None else res + (header,)
+
+def _load_coeff_file(fname):
+    """Load any type of coefficient file based on its extension."""
+    ext = os.path.splitext(fname)[1]
+    loader_dict = {'.fits': _load_coeff_fits, '.npz': _load_coeff_npz,
+                   '.npy': _load_coeff_npy, '.coeff': _load_coeff_bundle}
+    return coeff_cache.load(fname, loader_dict[ext])
+
+
+def _calc_mono_psfs(inst, waves, fov_pix, oversample, nproc=None, grism_pupil=None):
+    """Generate a set of monochromatic WebbPSF images
+
+    Parameters
+    ----------
+    inst : webbpsf.NIRCam
+        Fully configured instrument.
+    waves : ndarray
+        Wavelengths (um) at which to compute PSFs.
+    fov_pix : int
+        Size of the FoV in detector pixels.
+    oversample : int
+        Factor to oversample pixels (in one dimension).
+
+    Keyword Args
+    ------------
+    nproc : int or None
+        Number of processes. If None, then determined by :func:`nproc_use`.
+    grism_pupil : str or None
+        Name of grism pupil element, which stretches the PSF
+        in the dispersion direction.
+
+    Returns
+    -------
+    Image cube (nwave,ny,nx) and header of the first PSF.
+    """
+    npsf = len(waves)
+
+    # How many processors to split into?
+    if nproc is None:
+        nproc = nproc_use(fov_pix, oversample, npsf)
+    nproc = int(np.min([nproc, npsf]))
+    _log.debug('nprocessors: {}; npsf: {}'.format(nproc, npsf))
+
+    # Setup the multiprocessing pool and arguments to pass to each pool
+    if nproc > 1:
+        # Instrument is shipped to each worker once rather than with every wavelength
+        inst_key, inst_file = _share_inst(inst)
+        # Workers write images directly into a shared (npsf,ny,nx) buffer
+        shm = None
+        if shared_memory is not None:
+            npix = fov_pix * oversample
+            shape = (npsf, npix, npix)
+            shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape))*8)
+            shm_buf = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        worker_arguments = []
+        for i, wlen in enumerate(waves):
+            shm_info = None if shm is None else (shm.name, shape, 'float64', i)
+            worker_arguments.append((inst_key, inst_file, wlen, fov_pix, oversample, shm_info))
+        try:
+            res = _pool_map(_wrap_coeff_for_pool, worker_arguments, nproc)
+            head_temp = res[0][0]
+            images = [shm_buf[i].copy() if data is None else data for i, (_, data) in enumerate(res)]
+        finally:
+            os.remove(inst_file)
+            if shm is not None:
+                del shm_buf
+                shm.close()
+                shm.unlink()
+    else:
+        worker_arguments = [(inst, wlen, fov_pix, oversample) for wlen in waves]
+        # Pass arguments to the helper function
+        images = []
+        for i, wa in enumerate(worker_arguments):
+            hdu = _wrap_coeff_for_mp(wa)
+            if hdu is None:
+                raise RuntimeError('Returned None values. Issue with WebbPSF??')
+            if i==0:
+                head_temp = hdu.header
+            images.append(hdu.data)
+
+    # Take into account reduced beam factor for grism data
+    # Account for the circular pupil that does not allow all grism grooves to have their
+    # full length illuminated (Erickson & Rabanus 2000), effectively broadening the FWHM.
+    # It's actually a hexagonal pupil, so the factor is 1.07, not 1.15.
+    # We want to stretch the PSF in the dispersion direction
+    if grism_pupil is not None:
+        wfact = 1.07
+        scale = (1,wfact) if 'GRISM0' in grism_pupil else (wfact,1)
+        for i,im in enumerate(images):
+            im_scale = frebin(im, scale=scale)
+            images[i] = pad_or_cut_to_size(im_scale, im.shape)
+
+    # Turn results into an numpy array (npsf,ny,nx)
+    return np.array(images), head_temp
+
+
+def _adaptive_mono_psfs(inst, w1, w2, ndeg, psf_tol, npsf_max, fov_pix, oversample, 
+    nproc=None, grism_pupil=None, use_legendre=True):
+    """Error-driven wavelength sampling of monochromatic PSFs
+
+    Starts with a coarse, evenly spaced set of wavelengths, fits the
+    polynomial model, then compares the fit to PSFs computed halfway
+    between existing samples. Those held-out PSFs are added to the
+    sample set, and further wavelengths are only requested around
+    points where the maximum residual (relative to the PSF peak)
+    exceeds `psf_tol`.
+
+    Parameters
+    ----------
+    inst : webbpsf.NIRCam
+        Fully configured instrument.
+    w1, w2 : float
+        Wavelength range (um) of the fit.
+    ndeg : int
+        Polynomial degree for PSF fitting.
+    psf_tol : float
+        Maximum allowed residual relative to PSF peak.
+    npsf_max : int
+        Maximum number of monochromatic PSFs to generate.
+    fov_pix : int
+        Size of the FoV in detector pixels.
+    oversample : int
+        Factor to oversample pixels (in one dimension).
+
+    Keyword Args
+    ------------
+    nproc : int or None
+        Number of processes. If None, then determined by :func:`nproc_use`.
+    grism_pupil : str or None
+        Name of grism pupil element.
+    use_legendre : bool
+        Use Legendre polynomials for coefficient fitting.
+
+    Returns
+    -------
+    Wavelengths, image cube (nwave,ny,nx), header of first PSF, and
+    the maximum relative residual of the last set of held-out PSFs.
+    """
+    kw_calc = {'nproc': nproc, 'grism_pupil': grism_pupil}
+    lxmap = [w1,w2]
+
+    # Coarse starting grid; leave at least one round of validation
+    nstart = np.max([5, ndeg+2])
+    npsf_max = np.max([npsf_max, 2*nstart-1])
+    waves = np.linspace(w1, w2, nstart)
+    images, header = _calc_mono_psfs(inst, waves, fov_pix, oversample, **kw_calc)
+
+    # Test wavelengths lie halfway between existing samples
+    wtest = (waves[1:] + waves[:-1]) / 2
+    psf_err = np.inf
+    while len(wtest) > 0:
+        nleft = npsf_max - len(waves)
+        if nleft < len(wtest):
+            _log.warning('Reached maximum of {} PSFs before achieving psf_tol={}. Max error: {:.2e}'\
+                         .format(npsf_max, psf_tol, psf_err))
+            break
+
+        cf = jl_poly_fit(waves, images, deg=ndeg, use_legendre=use_legendre, lxmap=lxmap)
+        im_test, _ = _calc_mono_psfs(inst, wtest, fov_pix, oversample, **kw_calc)
+        im_fit = jl_poly(wtest, cf, use_legendre=use_legendre, lxmap=lxmap).reshape(im_test.shape)
+
+        # Maximum residual relative to each PSF's peak
+        ntest = len(wtest)
+        peak = np.abs(im_test).reshape([ntest,-1]).max(axis=1)
+        err = np.abs(im_fit - im_test).reshape([ntest,-1]).max(axis=1) / peak
+        psf_err = err.max()
+        _log.info('Adaptive PSF sampling: {} PSFs, max relative error {:.2e}'\
+                  .format(len(waves), psf_err))
+
+        # Held-out PSFs become part of the fitting set
+        waves = np.concatenate([waves, wtest])
+        images = np.concatenate([images, im_test])
+        isort = np.argsort(waves)
+        waves, images = (waves[isort], images[isort])
+
+        # Refine on either side of wavelengths that failed
+        wbad = wtest[err > psf_tol]
+        if len(wbad)==0:
+            break
+        ind = np.searchsorted(waves, wbad)
+        wtest = np.unique(np.concatenate([(waves[ind-1] + wbad) / 2, (waves[ind+1] + wbad) / 2]))
+
+    return waves, images, header, psf_err
+
+
 def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     fov_pix=11, oversample=None, npsf=None, ndeg=None, nproc=None, 
     offset_r=None, offset_theta=None, jitter=None, jitter_sigma=0.007,
@@ -255,7 +603,8 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     detector=None, detector_position=None, apname=None, bar_offset=None, 
     force=False, save=True, save_name=None, return_save_name=False, 
     quick=False, return_webbpsf=False, add_distortion=False, crop_psf=True, 
-    use_legendre=True, pynrc_mod=True, **kwargs):
+    use_legendre=True, use_fp32=False, psf_tol=None, support_tol=None, 
+    pynrc_mod=True, **kwargs):
     """Generate PSF coefficients
 
     Creates a set of coefficients that will generate a simulated PSF at any
@@ -355,6 +704,31 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         Crop distorted PSF to match undistorted pixel shape.
     use_legendre : bool
         Use Legendre polynomials for coefficient fitting.
+    use_fp32 : bool
+        Store and return coefficients in single precision (float32).
+        The polynomial fit itself is still performed in double precision.
+        This halves the memory and bandwidth of subsequent PSF evaluations,
+        at the cost of a relative error of order 1e-6 of the PSF peak.
+    psf_tol : float or None
+        If set, adaptively choose the monochromatic PSF wavelengths. Starting
+        from a coarse grid, additional WebbPSF calculations are only added
+        where held-out PSFs deviate from the polynomial fit by more than
+        `psf_tol` relative to the PSF peak (e.g., 1e-3). In this case, `npsf`
+        sets the maximum number of PSFs. The achieved error is stored in
+        the header keyword PSFERR.
+    support_tol : float or None
+        If set, only keep coefficients within a circular support region 
+        enclosing all pixels that exceed `support_tol` times the PSF peak
+        at any wavelength (e.g., 1e-7). Coefficients outside are set to 0,
+        and the region is stored in the header keywords SUPPX0, SUPPY0, 
+        and SUPPRAD (see :func:`coeff_support`). :func:`gen_image_coeff`
+        then only evaluates pixels within this region.
+
+    Note
+    ----
+    Returned coefficients are read-only, since loaded coefficients are 
+    shared (through :data:`~pynrc.coeff_store.coeff_cache` or a memory map)
+    by all callers in the process. Copy them before modifying in place.
     """
 
     from .version import __version__
@@ -501,9 +875,15 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     if wfe_drift>0:
         otemp = '{}-{:.0f}nm'.format(otemp,wfe_drift)
 
+    # Hash of all inputs that affect the resulting coefficients
+    coeff_key = hash_inputs(bp.wave, bp.throughput, ptemp, mtemp, module, fov_pix, oversample, 
+        npsf, ndeg, rtemp, ttemp, bar_offset, jitter, jitter_sigma, tel_pupil, opd, wfe_drift,
+        include_si_wfe, inst.detector, inst.detector_position, apname, quick, use_legendre,
+        use_fp32, psf_tol, support_tol, pynrc_mod, webbpsf.__version__, poppy.__version__)
+
     if save_name is None:
         # Name to save array of oversampled coefficients
-        save_dir = conf.PYNRC_PATH + 'psf_coeffs/'
+        save_dir = coeff_store_dir()
         # Create directory if it doesn't already exist
         if not os.path.isdir(save_dir):
             os.makedirs(save_dir)
@@ -527,8 +907,13 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
 
         if use_legendre:
             fname = fname + '_legendre'
-                                      
-        fname = fname + '.fits'
+
+        if use_fp32:
+            fname = fname + '_fp32'
+
+        # Append truncated input hash
+        fname = fname + '_' + coeff_key[:12]
+        fname = fname + coeff_file_ext()
         save_name = save_dir + fname
 
     if return_save_name:
@@ -538,11 +923,10 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     if os.path.exists(save_name) and (not force) and (not return_webbpsf):
         #return np.load(save_name)
         # return fits.getdata(save_name)
-        hdul = fits.open(save_name)
-        data = hdul[0].data.astype(np.float)
-        header = hdul[0].header
-        hdul.close()
-        return data, header
+        # Use in-memory copy if file was previously loaded
+        data, header = _load_coeff_file(save_name)
+        get_coeff_store(os.path.dirname(save_name)).touch(save_name)
+        return _set_readonly(data), header.copy()
 
     if return_webbpsf:
         _log.info('Generating and returning WebbPSF HDUList')
@@ -678,42 +1062,19 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         return hdu_list
 
 
-    # How many processors to split into?
-    if nproc is None:
-        nproc = nproc_use(fov_pix, oversample, npsf)
-    _log.debug('nprocessors: {}; npsf: {}'.format(nproc, npsf))
-
     setup_logging('WARN', verbose=False)
     t0 = time.time()
-    # Setup the multiprocessing pool and arguments to pass to each pool
-    worker_arguments = [(inst, wlen, fov_pix, oversample) for wlen in waves]
-    if nproc > 1:
-        pool = mp.Pool(nproc)
-        # Pass arguments to the helper function
-
-        try:
-            hdu_arr = pool.map(_wrap_coeff_for_mp, worker_arguments)
-            if hdu_arr[0] is None:
-                raise RuntimeError('Returned None values. Issue with multiprocess or WebbPSF??')
-
-        except Exception as e:
-            _log.error('Caught an exception during multiprocess.')
-            _log.error('Closing multiprocess pool.')
-            pool.terminate()
-            pool.close()
-            raise e
-
-        else:
-            _log.debug('Closing multiprocess pool.')
-            pool.close()
+    grism_pupil = pupil if grism_obs else None
+    if psf_tol is None:
+        images, head_temp = _calc_mono_psfs(inst, waves, fov_pix, oversample, 
+                                            nproc=nproc, grism_pupil=grism_pupil)
+        psf_err = None
     else:
-        # Pass arguments to the helper function
-        hdu_arr = []
-        for wa in worker_arguments:
-            hdu = _wrap_coeff_for_mp(wa)
-            if hdu is None:
-                raise RuntimeError('Returned None values. Issue with WebbPSF??')
-            hdu_arr.append(hdu)
+        # Requested npsf (or the default sampling) becomes the maximum
+        res = _adaptive_mono_psfs(inst, w1, w2, ndeg, psf_tol, npsf, fov_pix, oversample, 
+                                  nproc=nproc, grism_pupil=grism_pupil, use_legendre=use_legendre)
+        waves, images, head_temp, psf_err = res
+        npsf = len(waves)
     t1 = time.time()
 
     # Reset to original log levels
@@ -721,32 +1082,15 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     time_string = 'Took {:.2f} seconds to generate WebbPSF images'.format(t1-t0)
     _log.info(time_string)
 
-    # Extract image data from HDU array
-    images = []
-    for hdu in hdu_arr:
-        images.append(hdu.data)
-
-    # Take into account reduced beam factor for grism data
-    # Account for the circular pupil that does not allow all grism grooves to have their
-    # full length illuminated (Erickson & Rabanus 2000), effectively broadening the FWHM.
-    # It's actually a hexagonal pupil, so the factor is 1.07, not 1.15.
-    # We want to stretch the PSF in the dispersion direction
-    if grism_obs:
-        wfact = 1.07
-        scale = (1,wfact) if 'GRISM0' in pupil else (wfact,1)
-        for i,im in enumerate(images):
-            im_scale = frebin(im, scale=scale)
-            images[i] = pad_or_cut_to_size(im_scale, im.shape)
-
-    # Turn results into an numpy array (npsf,ny,nx)
-    images = np.array(images)
-
     # Simultaneous polynomial fits to all pixels using linear least squares
     coeff_all = jl_poly_fit(waves, images, deg=ndeg, use_legendre=use_legendre, lxmap=[w1,w2])
+    if support_tol is not None:
+        supp_dx, supp_dy, supp_rad = _support_region(images, support_tol)
+    if use_fp32:
+        coeff_all = coeff_all.astype(np.float32)
 
     hdu = fits.PrimaryHDU(coeff_all)
     hdr = hdu.header
-    head_temp = hdu_arr[0].header
 
     hdr['DESCR']    = ('PSF Coeffecients', 'File Description')
     hdr['NWAVES']   = (npsf, 'Number of wavelengths used in calculation')
@@ -776,6 +1120,22 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     hdr['WAVE1']  = (w1, 'First wavelength in calc')
     hdr['WAVE2']  = (w2, 'Last of wavelength in calc')
     hdr['LEGNDR'] = (use_legendre, 'Legendre polynomial fit?')
+    hdr['FP32']   = (use_fp32, 'Single precision coefficients?')
+    if psf_tol is None:
+        hdr['PSFTOL'] = ('None', 'Adaptive wavelength sampling tolerance')
+    else:
+        hdr['PSFTOL'] = (psf_tol, 'Adaptive wavelength sampling tolerance')
+        hdr['PSFERR'] = (float(psf_err), 'Max rel. residual of held-out PSFs')
+    if support_tol is None:
+        hdr['SUPPTOL'] = ('None', 'Coefficient support threshold')
+    else:
+        hdr['SUPPTOL'] = (support_tol, 'Coefficient support threshold')
+        hdr['SUPPX0']  = (float(supp_dx), 'Support center x offset (oversampled pix)')
+        hdr['SUPPY0']  = (float(supp_dy), 'Support center y offset (oversampled pix)')
+        hdr['SUPPRAD'] = (float(supp_rad), 'Support radius (oversampled pix)')
+        supp_mask = coeff_support(hdr, coeff_all.shape)
+        if supp_mask is not None:
+            coeff_all[:,~supp_mask] = 0
     if tel_pupil is None:
         hdr['TELPUP'] = ('None', 'Telescope pupil')
     elif isinstance(tel_pupil, fits.HDUList):
@@ -806,7 +1166,10 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     hdr['FORCE']    = (force, "Forced calculations?")
     hdr['SAVE']     = (save, "Save file?")
     hdr['FILENAME'] = (os.path.basename(save_name), "File save name")
+    hdr['COEFHASH'] = (coeff_key, "Hash of coefficient inputs")
     hdr['PYNRCVER'] = (__version__, "pyNRC version")
+    hdr['WPSFVER']  = (webbpsf.__version__, "WebbPSF version")
+    hdr['POPPYVER'] = (poppy.__version__, "POPPY version")
 
     hdr.insert('DATAVERS', '', after=True)
     hdr.insert('DATAVERS', ('','psf_coeff() Keyword Values'), after=True)
@@ -816,9 +1179,17 @@ def gen_psf_coeff(filter_or_bp, pupil=None, mask=None, module='A',
 
     if save:
         #np.save(save_name, coeff_all)
-        hdu.writeto(save_name, overwrite=True)
+        prov = {'filter': filter, 'pupil': ptemp, 'mask': mtemp, 'module': module,
+                'fov_pix': fov_pix, 'oversample': oversample, 'opd': opd_name, 
+                'wfe_drift': wfe_drift, 'include_si_wfe': include_si_wfe,
+                'webbpsf': webbpsf.__version__, 'poppy': poppy.__version__}
+        store = get_coeff_store(os.path.dirname(save_name))
+        if save_name.endswith('.coeff'):
+            store.save_bundle(save_name, coeff_all, header=hdr, key=coeff_key, provenance=prov)
+        else:
+            store.save_fits(save_name, hdu, key=coeff_key, provenance=prov)
 
-    return coeff_all, hdr
+    return _set_readonly(coeff_all), hdr
 
 def gen_webbpsf_psf(filter_or_bp, pupil=None, mask=None, module='A', 
                     fov_pix=11, oversample=None, tel_pupil=None, opd=None,
@@ -884,16 +1255,53 @@ def gen_webbpsf_siwfe(filter_or_bp, coords, pynrc_mod=True, **kwargs):
     return gen_webbpsf_psf(filter, pynrc_mod=pynrc_mod, **kwargs)
 
 
+def _checkpoint_dir(save_name):
+    """Directory holding per-point results of an in-progress residual build."""
+    return os.path.splitext(save_name)[0] + '.partial'
+
+def _save_checkpoint(fname, data):
+    """Atomically save a single checkpointed coefficient set."""
+    dirname = os.path.dirname(fname)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # Another process may have just created it
+            if not os.path.isdir(dirname): raise
+    tmp = os.path.join(dirname, '.{}.{}.tmp.npy'.format(os.path.basename(fname)[:-4], os.getpid()))
+    np.save(tmp, data)
+    os.replace(tmp, fname)
+
+def _load_checkpoints(ckpt_files):
+    """Load any existing checkpoints; missing or unreadable ones are None."""
+    out = []
+    for fname in ckpt_files:
+        cf = None
+        if (fname is not None) and os.path.exists(fname):
+            try:
+                cf = np.load(fname)
+            except (IOError, ValueError):
+                _log.warning('Ignoring unreadable checkpoint {}'.format(fname))
+        out.append(cf)
+    return out
+
 def _wrap_wfed_coeff_for_mp(arg):
-    args, kwargs = arg
+    args, kwargs, ckpt = arg
 
     wfe = kwargs['wfe_drift']
     print('WFE Drift: {} nm'.format(wfe))
 
     cf, _ = gen_psf_coeff(*args, **kwargs)
+    # Persist as soon as each drift value completes
+    if ckpt is not None:
+        _save_checkpoint(ckpt, cf)
     return cf
 
-def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None, **kwargs):
+# WFE drift values (nm) used to fit drift coefficients if not otherwise specified
+_wfe_list_default = [0,1,2,5,10,20,40]
+
+def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None, 
+    wfe_list=None, **kwargs):
     """PSF Coefficient Mod for WFE Drift
 
     This function finds a relationship between PSF coefficients
@@ -914,7 +1322,8 @@ def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None
         PSF already exists. (default: False)
     save : bool
         Save the resulting WFE drift coefficents to a file?
-        (default: True)
+        (default: True) Intermediate results are checkpointed while the
+        build runs so that an interrupted calculation resumes where it left off.
     save_name : str, None
         Full path name of save file (.npy) to save/load.
         If None, then a name is automatically generated,
@@ -923,6 +1332,18 @@ def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None
         Number of processors to split over. There are checks to 
         make sure you're not requesting more processors than the 
         current machine has available.
+    wfe_list : array-like or None
+        WFE drift values (nm) at which to compute coefficients for
+        the polynomial fit. Default is [0,1,2,5,10,20,40]; a value of 0
+        is always included. The list is saved with the result. If a saved
+        result exists but lacks some of the requested values, only the
+        missing drift values are computed, and the fit is redone over
+        the combined set of drift values.
+
+    Note
+    ----
+    Returned arrays are read-only and may be shared with other callers
+    (see :func:`gen_psf_coeff`). Copy them before modifying in place.
 
     Example
     -------
@@ -961,26 +1382,38 @@ def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None
 
     # Final filename to save coeff
     if save_name is None:
-        # Name to save array of oversampled coefficients
-        save_dir = conf.PYNRC_PATH + 'psf_coeffs/'
-        # Create directory if it doesn't already exist
-        if not os.path.isdir(save_dir):
-            os.makedirs(save_dir)
-
         # Final filename to save coeff
+        # Inherits the input hash of the undrifted coefficients
         save_name = gen_psf_coeff(bp, return_save_name=True, **kwargs)
-        save_name = os.path.splitext(save_name)[0] + '_wfedrift.npz'
+        save_name = os.path.splitext(save_name)[0] + '_wfedrift' + coeff_file_ext('wfedrift')
+
+    # Residuals are computed in double precision to avoid cancellation errors
+    use_fp32 = kwargs.get('use_fp32', False)
+    kwargs['use_fp32'] = False
+    store = get_coeff_store(os.path.dirname(save_name))
 
     # Load file if it already exists
     if (not force) and os.path.exists(save_name):
-        out = np.load(save_name)
-        return out['arr_0'], out['arr_1']
+        out = _load_coeff_file(save_name)
+        store.touch(save_name)
+        # Files without a saved drift list were generated with the default values
+        wfe_saved = out[2] if (len(out)>2 and out[2] is not None) else np.array(_wfe_list_default)
+        if (wfe_list is None) or np.all(np.isin(wfe_list, wfe_saved)):
+            return _set_readonly((out[0], out[1]))
+
+        # Extend existing set of drift values
+        wfe_list = np.union1d(wfe_saved, wfe_list)
+        _log.warn('Extending WFE drift coefficients to {} nm.'.format(wfe_list.tolist()))
 
     _log.warn('Generating WFE Drift coefficients. This may take some time...')
     # _log.warn('{}'.format(save_name))
 
     # Cycle through WFE drifts for fitting
-    wfe_list = np.array([0,1,2,5,10,20,40])
+    # Residuals are relative to wfe_drift=0, which must be first.
+    wfe_list = _wfe_list_default if wfe_list is None else wfe_list
+    wfe_list = np.unique(np.append(np.asarray(wfe_list, dtype=float), 0))
+    if wfe_list[0] < 0:
+        raise ValueError("wfe_list values must not be negative.")
     npos = len(wfe_list)
 
     # Split over multiple processors?
@@ -1006,49 +1439,42 @@ def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None
     # Double check we're not requesting too many processors
     nsplit = nsplit_max if nsplit > nsplit_max else nsplit
 
+    # Each drift value is checkpointed as it completes so that
+    # an interrupted build only needs to compute the missing values
+    if force:
+        shutil.rmtree(_checkpoint_dir(save_name), ignore_errors=True)
+    ckpt_dir = _checkpoint_dir(save_name)
+    ckpt_files = [os.path.join(ckpt_dir, 'wfe{:.3f}.npy'.format(wfe)) if save else None 
+                  for wfe in wfe_list]
+    cf_wfe = _load_checkpoints(ckpt_files)
+    ind_todo = [i for i, cf in enumerate(cf_wfe) if cf is None]
+    if len(ind_todo) < npos:
+        _log.info('Resuming WFE drift build; {} of {} already computed.'.format(npos-len(ind_todo), npos))
+
     # Create worker arguments with kwargs as an argument input
     worker_args = []
     args = [bp]
-    for wfe in wfe_list:
+    for i in ind_todo:
         kw = kwargs.copy()
-        kw['wfe_drift'] = wfe
-        worker_args.append((args, kw))
-
-    if nsplit>1:
-        # If splitting, then cannot split in subprocess for each PSF (ie., across wavelengths)
-        poppy_nproc_prev = poppy.conf.n_processes
-        poppy.conf.n_processes = 1
-
-        cf_wfe = []
-        # pool = mp.Pool(nsplit)
-        try:
-            # cf_wfe = pool.map(_wrap_wfed_coeff_for_mp, worker_args)
-            with mp.Pool(nsplit) as pool:
-                for res in tqdm(pool.imap_unordered(_wrap_wfed_coeff_for_mp, worker_args), total=npos):
-                    cf_wfe.append(res)
-                pool.close()
-
-            if cf_wfe[0] is None:
-                raise RuntimeError('Returned None values. Issue with multiprocess or WebbPSF??')
-        except Exception as e:
-            _log.error('Caught an exception during multiprocess.')
-            _log.error('Closing multiprocess pool.')
-            pool.terminate()
-            pool.close()
-            poppy.conf.n_processes = poppy_nproc_prev
-            raise e
-        else:
-            _log.debug('Closing multiprocess pool.')
-            # pool.close()
-
-        poppy.conf.n_processes = poppy_nproc_prev
+        kw['wfe_drift'] = wfe_list[i]
+        worker_args.append((args, kw, ckpt_files[i]))
+
+    if len(worker_args)==0:
+        res = []
+    elif nsplit>1:
+        # Pool workers compute each PSF on a single processor (ie., not across wavelengths).
+        # Results must stay in order of wfe_list.
+        for _, kw, _ in worker_args:
+            kw['nproc'] = 1
+        res = _pool_map(_wrap_wfed_coeff_for_mp, worker_args, nsplit, progress=True)
     else:
         # No multiprocessor
-        cf_wfe = []
+        res = []
         for wa in tqdm(worker_args):
             cf = _wrap_wfed_coeff_for_mp(wa)
-            cf_wfe.append(cf)
-        # cf_wfe = [_wrap_wfed_coeff_for_mp(wa) for wa in worker_args]
+            res.append(cf)
+    for i, cf in zip(ind_todo, res):
+        cf_wfe[i] = cf
 
     # Get residuals
     cf_wfe = np.array(cf_wfe) - cf_wfe[0]
@@ -1059,15 +1485,25 @@ def wfed_coeff(filter_or_bp, force=False, save=True, save_name=None, nsplit=None
     lxmap = np.array([np.min(wfe_list), np.max(wfe_list)])
     cf_fit = jl_poly_fit(wfe_list, cf_wfe, deg=4, use_legendre=True, lxmap=lxmap)
     cf_fit = cf_fit.reshape([-1, cf_shape[0], cf_shape[1], cf_shape[2]])
+    if use_fp32:
+        cf_fit = cf_fit.astype(np.float32)
 
     if save:
-        np.savez(save_name, cf_fit, lxmap)
+        prov = {'filter': filter, 'product': 'wfedrift', 'wfe_list': wfe_list.tolist()}
+        if save_name.endswith('.coeff'):
+            store.save_bundle(save_name, cf_fit, aux=[lxmap, wfe_list], provenance=prov)
+        else:
+            store.save_npz(save_name, cf_fit, lxmap, wfe_list, provenance=prov)
+        # Keep the coefficient set for each drift value so the drift
+        # grid can later be extended. Tracked by the store for eviction.
+        store.register(os.path.basename(ckpt_dir), 
+                       provenance={'filter': filter, 'product': 'wfedrift_samples'})
     _log.info('Done.')
 
-    return cf_fit, lxmap
+    return _set_readonly((cf_fit, lxmap))
 
 def _wrap_field_coeff_for_mp(arg):
-    args, kwargs = arg
+    args, kwargs, ckpt = arg
 
     apname  = kwargs['apname']
     det     = kwargs['detector']
@@ -1078,6 +1514,9 @@ def _wrap_field_coeff_for_mp(arg):
         .format(det, apname, v2/60, v3/60, det_pos[0], det_pos[1]))
 
     cf, _ = gen_psf_coeff(*args, **kwargs)
+    # Persist as soon as each field point completes
+    if ckpt is not None:
+        _save_checkpoint(ckpt, cf)
     return cf
 
 def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=None, 
@@ -1097,7 +1536,8 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
         PSF already exists. (default: False)
     save : bool
         Save the resulting WFE drift coefficents to a file?
-        (default: True)
+        (default: True) Intermediate results are checkpointed while the
+        build runs so that an interrupted calculation resumes where it left off.
     save_name : str, None
         Full path name of save file (.npy) to save/load.
         If None, then a name is automatically generated,
@@ -1111,6 +1551,11 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
         along with the V2/V3 coordinates (cf_resid, v2_all, v3_all).
 
 
+    Note
+    ----
+    Returned arrays are read-only and may be shared with other callers
+    (see :func:`gen_psf_coeff`). Copy them before modifying in place.
+
     Example
     -------
     Generate PSF coefficient, field position modifications, then
@@ -1192,20 +1637,21 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
 
     # Final filename to save coeff
     if save_name is None:
-        # Name to save array of oversampled coefficients
-        save_dir = conf.PYNRC_PATH + 'psf_coeffs/'
-        # Create directory if it doesn't already exist
-        if not os.path.isdir(save_dir):
-            os.makedirs(save_dir)
-
         # Final filename to save coeff
+        # Inherits the input hash of the nominal coefficients
         save_name = gen_psf_coeff(bp, return_save_name=True, **kwargs)
-        save_name = os.path.splitext(save_name)[0] + '_cffields.npz'
+        save_name = os.path.splitext(save_name)[0] + '_cffields' + coeff_file_ext('cffields')
+
+    # Residuals are computed in double precision to avoid cancellation errors
+    use_fp32 = kwargs.get('use_fp32', False)
+    kwargs['use_fp32'] = False
+    store = get_coeff_store(os.path.dirname(save_name))
 
     # Load file if it already exists
     if (not force) and os.path.exists(save_name):
-        out = np.load(save_name)
-        return out['arr_0'], out['arr_1'], out['arr_2']
+        out = _load_coeff_file(save_name)
+        store.touch(save_name)
+        return _set_readonly((out[0], out[1], out[2]))
 
     _log.warn('Generating field-dependent coefficients. This may take some time...')
 
@@ -1232,12 +1678,24 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
     # Double check we're not requesting too many processors
     nsplit = nsplit_max if nsplit > nsplit_max else nsplit
 
+    # Each field point is checkpointed as it completes so that
+    # an interrupted build only needs to compute the missing points
+    if force:
+        shutil.rmtree(_checkpoint_dir(save_name), ignore_errors=True)
+    ckpt_dir = _checkpoint_dir(save_name)
+    ckpt_files = [os.path.join(ckpt_dir, 'v2{:+.4f}_v3{:+.4f}.npy'.format(v2, v3)) if save else None 
+                  for (v2, v3) in zip(v2_all, v3_all)]
+    cf_fields = _load_checkpoints(ckpt_files)
+    ind_todo = [i for i, cf in enumerate(cf_fields) if cf is None]
+    if len(ind_todo) < npos:
+        _log.info('Resuming field build; {} of {} already computed.'.format(npos-len(ind_todo), npos))
+
     # Create worker arguments with kwargs as an input dict
     worker_args = []
     args = [filter]
-    for (v2, v3) in zip(v2_all, v3_all):
+    for i in ind_todo:
         # Get the detector and pixel position
-        coords = (v2*60, v3*60) # in arcsec
+        coords = (v2_all[i]*60, v3_all[i]*60) # in arcsec
         det, det_pos, apname = Tel2Sci_info(channel, coords, pupil=pupil, output="sci", return_apname=True)
 
         kw = kwargs.copy()
@@ -1245,47 +1703,29 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
         kw['detector'] = det
         kw['detector_position'] = det_pos
         kw['coords'] = coords
-        worker_args.append((args, kw))
+        worker_args.append((args, kw, ckpt_files[i]))
 
     # Multiprocessing?
-    if nsplit > 1:
-        # If splitting, then cannot split in subprocess for each PSF (ie., across wavelengths)
-        poppy_nproc_prev = poppy.conf.n_processes
-        poppy.conf.n_processes = 1
-
-        cf_fields = []
-        ntot = len(worker_args)
-        # pool = mp.Pool(nsplit)
-        try:
-            with mp.Pool(nsplit) as pool:
-                for res in tqdm(pool.imap_unordered(_wrap_field_coeff_for_mp, worker_args), total=ntot):
-                    cf_fields.append(res)
-                pool.close()
-
-            # cf_fields = pool.map(_wrap_field_coeff_for_mp, worker_args)
-            if cf_fields[0] is None:
-                raise RuntimeError('Returned None values. Issue with multiprocess or WebbPSF??')
-        except Exception as e:
-            _log.error('Caught an exception during multiprocess.')
-            _log.error('Closing multiprocess pool.')
-            pool.terminate()
-            pool.close()
-            poppy.conf.n_processes = poppy_nproc_prev
-            raise e
-        else:
-            _log.debug('Closing multiprocess pool.')
-            # pool.close()
-
-        poppy.conf.n_processes = poppy_nproc_prev
+    if len(worker_args)==0:
+        res = []
+    elif nsplit > 1:
+        # Pool workers compute each PSF on a single processor (ie., not across wavelengths).
+        # Results must stay in order of v2_all/v3_all.
+        for _, kw, _ in worker_args:
+            kw['nproc'] = 1
+        res = _pool_map(_wrap_field_coeff_for_mp, worker_args, nsplit, progress=True)
     else:  # No multiprocessor
-        cf_fields = []
+        res = []
         for wa in tqdm(worker_args):
             cf = _wrap_field_coeff_for_mp(wa)
-            cf_fields.append(cf)
-        # cf_fields = [_wrap_field_coeff_for_mp(wa) for wa in worker_args]
+            res.append(cf)
+    for i, cf in zip(ind_todo, res):
+        cf_fields[i] = cf
 
     # Get residuals
     cf_fields_resid = np.array(cf_fields) - coeff0
+    if use_fp32:
+        cf_fields_resid = cf_fields_resid.astype(np.float32)
 
     if return_raw:
         return cf_fields_resid, v2_all, v3_all
@@ -1298,10 +1738,15 @@ def field_coeff_resid(filter_or_bp, coeff0, force=False, save=True, save_name=No
     # Interpolate onto an evenly space grid
     res = make_coeff_resid_grid(v2_all, v3_all, cf_fields_resid, v2grid, v3grid)
     if save: 
-        np.savez(save_name, *res)
+        prov = {'filter': filter, 'product': 'cffields', 'nv23': nv23}
+        if save_name.endswith('.coeff'):
+            store.save_bundle(save_name, res[0], aux=res[1:], provenance=prov)
+        else:
+            store.save_npz(save_name, *res, provenance=prov)
+        shutil.rmtree(ckpt_dir, ignore_errors=True)
 
     _log.warn('Done.')
-    return res
+    return _set_readonly(tuple(res))
 
 def make_coeff_resid_grid(xin, yin, cf_resid, xgrid, ygrid):
 
@@ -1312,7 +1757,7 @@ def make_coeff_resid_grid(xin, yin, cf_resid, xgrid, ygrid):
     _log.warn("Interpolating coefficient residuals onto regular grid...")
 
     sh = cf_resid.shape
-    cf_resid_grid = np.zeros([ny,nx,sh[1],sh[2],sh[3]])
+    cf_resid_grid = np.zeros([ny,nx,sh[1],sh[2],sh[3]], dtype=cf_resid.dtype)
 
     # Cycle through each coefficient to interpolate onto V2/V3 grid
     for i in range(sh[1]):
@@ -1322,11 +1767,128 @@ def make_coeff_resid_grid(xin, yin, cf_resid, xgrid, ygrid):
 
 
 
+class FieldCoeffInterp(object):
+    """Reusable interpolator for PSF coefficient residuals
+
+    Bilinear interpolation on a regular V2/V3 grid of coefficient 
+    residuals, equivalent to a linear `RegularGridInterpolator` with
+    extrapolation. For each set of query positions, the indices of the 
+    four surrounding grid points (the stencil) and their weights are
+    computed once and cached, so repeated calls at the same positions
+    only perform the sparse contraction over the coefficient grid.
+
+    Parameters
+    ----------
+    v2grid : ndarray
+        Increasing V2 values of the residual grid.
+    v3grid : ndarray
+        Increasing V3 values of the residual grid.
+
+    Keyword Args
+    ------------
+    max_cache : int
+        Number of sets of query positions to keep stencils for.
+    """
+
+    def __init__(self, v2grid, v3grid, max_cache=256):
+        self.v2grid = np.asarray(v2grid, dtype=float)
+        self.v3grid = np.asarray(v3grid, dtype=float)
+        self.max_cache = max_cache
+        self._stencils = OrderedDict()
+
+    @property
+    def ngrid(self):
+        """Total number of V2/V3 grid points."""
+        return len(self.v3grid) * len(self.v2grid)
+
+    @staticmethod
+    def _axis_index(grid, x):
+        """Lower grid index of each cell and fractional position within."""
+        ind = np.clip(np.searchsorted(grid, x) - 1, 0, len(grid) - 2)
+        frac = (x - grid[ind]) / (grid[ind+1] - grid[ind])
+        return ind, frac
+
+    def stencil(self, v2_new, v3_new):
+        """Grid indices and weights of the query positions
+
+        Returns
+        -------
+        Two arrays of shape (npts, 4) holding the flattened (V3, V2) 
+        grid indices and associated weights of each position.
+        """
+        v2 = np.ravel(np.asarray(v2_new, dtype=float))
+        v3 = np.ravel(np.asarray(v3_new, dtype=float))
+        key = (v2.tobytes(), v3.tobytes())
+        try:
+            res = self._stencils.pop(key)
+        except KeyError:
+            iy, ty = self._axis_index(self.v3grid, v3)
+            ix, tx = self._axis_index(self.v2grid, v2)
+            nx = len(self.v2grid)
+            ind = np.array([iy*nx + ix, iy*nx + ix+1, (iy+1)*nx + ix, (iy+1)*nx + ix+1]).T
+            wts = np.array([(1-ty)*(1-tx), (1-ty)*tx, ty*(1-tx), ty*tx]).T
+            res = (ind, wts)
+
+        self._stencils[key] = res
+        while len(self._stencils) > self.max_cache:
+            self._stencils.popitem(last=False)
+        return res
+
+    def weights(self, v2_new, v3_new):
+        """Dense weights of shape (npts, nV3*nV2) for each grid point."""
+        ind, wts = self.stencil(v2_new, v3_new)
+        npts = ind.shape[0]
+        out = np.zeros([npts, self.ngrid])
+        np.add.at(out, (np.arange(npts)[:,np.newaxis], ind), wts)
+        return out
+
+    def __call__(self, cf_fields, v2_new, v3_new):
+        """Interpolate coefficient residuals
+
+        Parameters
+        ----------
+        cf_fields : ndarray
+            Coefficient residuals at grid points with shape (nV3, nV2, ...).
+        v2_new : ndarray
+            New V2 point(s) to interpolate on.
+        v3_new : ndarray
+            New V3 point(s) to interpolate on.
+
+        Returns
+        -------
+        ndarray
+            Residuals of shape (npts, ...). The first axis is removed 
+            if there is only a single point.
+        """
+        ind, wts = self.stencil(v2_new, v3_new)
+        cf = cf_fields.reshape((self.ngrid,) + cf_fields.shape[2:])
+
+        # Gather the four grid points surrounding each position and sum
+        res = np.einsum('pk,pk...->p...', wts.astype(cf.dtype, copy=False), cf[ind])
+        return res[0] if res.shape[0]==1 else res
+
+_field_interps = OrderedDict()
+def get_field_interp(v2grid, v3grid):
+    """Shared :class:`FieldCoeffInterp` instance for a given V2/V3 grid."""
+    v2grid = np.asarray(v2grid, dtype=float)
+    v3grid = np.asarray(v3grid, dtype=float)
+    key = (v2grid.tobytes(), v3grid.tobytes())
+    try:
+        interp = _field_interps.pop(key)
+    except KeyError:
+        interp = FieldCoeffInterp(v2grid, v3grid)
+    _field_interps[key] = interp
+    while len(_field_interps) > 8:
+        _field_interps.popitem(last=False)
+    return interp
+
 def field_coeff_func(v2grid, v3grid, cf_fields, v2_new, v3_new):
     """Interpolation function for PSF coefficient residuals
 
-    Uses RegularGridInterpolator to quickly determine new coefficient
-    residulas at specified points.
+    Bilinear interpolation to quickly determine new coefficient
+    residuals at specified points. Uses a shared :class:`FieldCoeffInterp`
+    so that repeated calls at the same positions reuse the 
+    precomputed interpolation stencils.
 
     Parameters
     ----------
@@ -1343,15 +1905,173 @@ def field_coeff_func(v2grid, v3grid, cf_fields, v2_new, v3_new):
         New V3 point(s) to interpolate on. Same units as v3grid.
     """
 
-    func = RegularGridInterpolator((v3grid, v2grid), cf_fields, method='linear', 
-                                   bounds_error=False, fill_value=None)
+    return get_field_interp(v2grid, v3grid)(cf_fields, v2_new, v3_new)
 
-    pts = np.array([v3_new,v2_new]).transpose()
-    
-    # If only 1 point, remove first axes
-    res = func(pts)
-    res = res.squeeze() if res.shape[0]==1 else res
-    return res
+
+def _support_region(images, support_tol):
+    """Circular region enclosing all significant PSF pixels
+
+    Pixels are significant if they exceed `support_tol` times the PSF
+    peak at any wavelength. Returns the center offset (dx, dy) from the
+    array center and radius, all in (oversampled) pixels.
+    """
+    im_max = np.abs(images).max(axis=0)
+    flag = im_max > support_tol * im_max.max()
+
+    ny, nx = flag.shape
+    yy, xx = np.nonzero(flag)
+    # Center of bounding box, relative to array center
+    xc = (xx.min() + xx.max()) / 2
+    yc = (yy.min() + yy.max()) / 2
+    rad = np.sqrt((xx - xc)**2 + (yy - yc)**2).max() + 1
+    return xc - (nx-1)/2, yc - (ny-1)/2, rad
+
+_support_masks = OrderedDict()
+def coeff_support(coeff_hdr, shape):
+    """Support mask of PSF coefficients
+
+    Boolean mask of the pixels in which coefficients generated with
+    `support_tol` (see :func:`gen_psf_coeff`) are non-zero. The region is 
+    defined relative to the array center, so also applies to cropped or
+    padded versions of the coefficients.
+
+    Parameters
+    ----------
+    coeff_hdr : FITS header
+        Header of the PSF coefficients.
+    shape : tuple
+        Image shape (ny, nx).
+
+    Returns
+    -------
+    Boolean mask of given shape, or None if coefficients are not trimmed
+    or the support covers the full image.
+    """
+    try:
+        key = (tuple(shape[-2:]), coeff_hdr['SUPPX0'], coeff_hdr['SUPPY0'], coeff_hdr['SUPPRAD'])
+    except KeyError:
+        return None
+
+    try:
+        mask = _support_masks.pop(key)
+    except KeyError:
+        (ny, nx), dx, dy, rad = key
+        yy, xx = np.indices((ny, nx))
+        rsq = (xx - (nx-1)/2 - dx)**2 + (yy - (ny-1)/2 - dy)**2
+        mask = rsq <= rad**2
+        if mask.all(): 
+            mask = None
+        else:
+            mask.flags.writeable = False
+    _support_masks[key] = mask
+    while len(_support_masks) > 16:
+        _support_masks.popitem(last=False)
+    return mask
+
+
+def coeff_lowrank(coeff0, resid_list, tol=1e-4):
+    """Low-rank representation of PSF coefficient residuals
+
+    Projects PSF coefficient planes onto a truncated spatial eigenbasis.
+    The basis exactly spans the nominal coefficient planes `coeff0`,
+    then is augmented by the principal components of the residual
+    products (e.g., WFE drift, field-dependence, wedge offsets) after
+    removing their overlap with the nominal planes. All products are
+    then reduced to amplitudes on this common basis, so linear
+    operations on the coefficients can be performed in the reduced
+    space and the images reconstructed only once at the end.
+
+    Parameters
+    ----------
+    coeff0 : ndarray
+        Nominal PSF coefficients of shape (ncoeff, ny, nx).
+    resid_list : list of ndarray
+        Coefficient residual products, each with shape (..., ny', nx').
+        Undersized residuals are zero-padded to (ny, nx).
+
+    Keyword Args
+    ------------
+    tol : float
+        Relative Frobenius norm of discarded residual structure. Each
+        residual product is normalized to unit norm before determining 
+        the principal components so that all are equally represented.
+
+    Returns
+    -------
+    basis : ndarray
+        Orthonormal spatial basis of shape (nbasis, ny, nx).
+    amp0 : ndarray
+        Amplitudes of `coeff0` with shape (ncoeff, nbasis).
+    amp_list : list of ndarray
+        Amplitudes of each residual product with shape (..., nbasis).
+    """
+
+    ny, nx = coeff0.shape[-2:]
+    npix = ny * nx
+    dtype = coeff0.dtype
+
+    # Orthonormal vectors spanning the nominal coefficient planes
+    q0, _ = np.linalg.qr(coeff0.reshape([-1,npix]).astype(np.float64).T)
+    q0 = q0.T
+
+    resid_pad = []
+    planes = []
+    for cf in resid_list:
+        if cf.shape[-2:] != (ny, nx):
+            cf_shape = cf.shape
+            cf = np.array([pad_or_cut_to_size(im, (ny,nx)) for im in cf.reshape((-1,) + cf_shape[-2:])])
+            cf = cf.reshape(cf_shape[:-2] + (ny,nx))
+        resid_pad.append(cf)
+
+        # Remove components already described by nominal planes
+        p = cf.reshape([-1,npix]).astype(np.float64)
+        p = p - np.dot(np.dot(p, q0.T), q0)
+        norm = np.linalg.norm(p)
+        if norm > 0:
+            planes.append(p / norm)
+
+    if len(planes) > 0:
+        _, sval, vt = np.linalg.svd(np.concatenate(planes), full_matrices=False)
+        # Energy left over if truncating at each index
+        resid_energy = np.cumsum((sval**2)[::-1])[::-1]
+        nkeep = np.sum(resid_energy > (tol**2) * resid_energy[0])
+        basis = np.concatenate([q0, vt[:nkeep]])
+    else:
+        basis = q0
+
+    _log.info('Low-rank PSF coefficients: {} basis vectors for {} pixels'.format(basis.shape[0], npix))
+
+    def project(cf):
+        amp = np.dot(cf.reshape([-1,npix]), basis.T)
+        return amp.reshape(cf.shape[:-2] + (-1,)).astype(dtype)
+
+    amp0 = project(coeff0)
+    amp_list = [project(cf) for cf in resid_pad]
+    basis = basis.reshape([-1,ny,nx]).astype(dtype)
+
+    return basis, amp0, amp_list
+
+
+def field_coeff_weights(v2grid, v3grid, v2_new, v3_new):
+    """Interpolation weights for PSF coefficient residuals
+
+    Linear interpolation weights of each new point with respect to all 
+    V2/V3 grid points, such that
+
+    >>> wts = field_coeff_weights(v2grid, v3grid, v2_new, v3_new)
+    >>> cf_new = np.tensordot(wts, cf_fields.reshape((-1,)+cf_fields.shape[2:]), axes=1)
+
+    matches :func:`field_coeff_func`. Since the weights are independent
+    of the coefficient values, they can be applied after any other
+    linear operation, such as the spectral contraction in :func:`gen_image_coeff`.
+
+    Returns
+    -------
+    ndarray
+        Weights of shape (npts, nV3*nV2).
+    """
+
+    return get_field_interp(v2grid, v3grid).weights(v2_new, v3_new)
 
 
 def wedge_coeff(filter, pupil, mask, force=False, save=True, save_name=None, **kwargs):
@@ -1375,6 +2095,11 @@ def wedge_coeff(filter, pupil, mask, force=False, save=True, save_name=None, **k
         matching the :func:`gen_psf_coeff` function.
 
 
+    Note
+    ----
+    Returned arrays are read-only and may be shared with other callers
+    (see :func:`gen_psf_coeff`). Copy them before modifying in place.
+
     Example
     -------
     Generate PSF coefficient at bar_offset=0, generate position modifications,
@@ -1411,19 +2136,21 @@ def wedge_coeff(filter, pupil, mask, force=False, save=True, save_name=None, **k
 
     # Final filename to save coeff
     if save_name is None:
-        # Name to save array of oversampled coefficients
-        save_dir = conf.PYNRC_PATH + 'psf_coeffs/'
-        # Create directory if it doesn't already exist
-        if not os.path.isdir(save_dir):
-            os.makedirs(save_dir)
-
         # Final filename to save coeff
+        # Inherits the input hash of the nominal coefficients
         save_name = gen_psf_coeff(filter, return_save_name=True, **kwargs)
-        save_name = os.path.splitext(save_name)[0] + '_wedge.npy'
+        save_name = os.path.splitext(save_name)[0] + '_wedge' + coeff_file_ext('wedge')
+
+    # Residuals are computed in double precision to avoid cancellation errors
+    use_fp32 = kwargs.get('use_fp32', False)
+    kwargs['use_fp32'] = False
+    store = get_coeff_store(os.path.dirname(save_name))
 
     # Load file if it already exists
     if (not force) and os.path.exists(save_name):
-        return np.load(save_name)
+        store.touch(save_name)
+        out = _load_coeff_file(save_name)
+        return _set_readonly(out[0] if isinstance(out, tuple) else out)
 
     _log.warn('Generating wedge field-dependent coefficients. This may take some time...')
 
@@ -1452,12 +2179,19 @@ def wedge_coeff(filter, pupil, mask, force=False, save=True, save_name=None, **k
     cf_offset = cf_offset.reshape([nvals, -1])
     cf_fit = jl_poly_fit(values, cf_offset, 4)
     cf_fit = cf_fit.reshape([-1, cf.shape[0], cf.shape[1], cf.shape[2]])
+    if use_fp32:
+        cf_fit = cf_fit.astype(np.float32)
 
     if save:
-        np.save(save_name, cf_fit)
+        prov = {'filter': filter, 'pupil': pupil, 'mask': mask, 'product': 'wedge',
+                'bar_offsets': values.tolist()}
+        if save_name.endswith('.coeff'):
+            store.save_bundle(save_name, cf_fit, provenance=prov)
+        else:
+            store.save_npy(save_name, cf_fit, provenance=prov)
 
     _log.warn('Done.')
-    return cf_fit
+    return _set_readonly(cf_fit)
 
 
 def gen_image_from_coeff(coeff, coeff_hdr, **kwargs):
@@ -1481,10 +2215,48 @@ def gen_image_from_coeff(coeff, coeff_hdr, **kwargs):
 
 
 
+def _binflux_array(bp, waveset, sp_flux, sp_wave=None):
+    """Binned count rates for an array of spectra
+
+    Array equivalent of ``S.Observation(sp, bp, binset=waveset).binflux``
+    (after converting to counts) for many spectra at once. Fluxes are
+    linearly interpolated onto `waveset` rather than integrated within
+    each bin, which is equivalent for spectra that are smooth on the
+    scale of the bin widths.
+
+    Parameters
+    ----------
+    bp : :mod:`pysynphot.obsbandpass`
+        Bandpass throughput.
+    waveset : ndarray
+        Bin centers in Angstrom.
+    sp_flux : ndarray
+        Spectral flux densities in photlam of shape (nspec, nwave).
+    sp_wave : ndarray or None
+        Wavelengths (Angstrom) of `sp_flux` columns. 
+        If None, then assumes ``bp.wave``.
+    """
+    from pysynphot.binning import calculate_bin_edges
+
+    sp_flux = np.atleast_2d(sp_flux)
+    sp_wave = bp.wave if sp_wave is None else np.asarray(sp_wave)
+    if sp_flux.shape[1] != sp_wave.size:
+        raise ValueError('sp_flux has {} wavelength elements, but {} were expected.'\
+                         .format(sp_flux.shape[1], sp_wave.size))
+
+    func = interp1d(sp_wave, sp_flux, axis=1, bounds_error=False, fill_value=0)
+    flux = func(waveset)
+
+    # Photons/sec within each bin
+    dw = np.diff(calculate_bin_edges(waveset))
+    thru = bp(waveset)
+    return flux * (thru * dw * S.refs.PRIMARY_AREA)
+
+
 def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
-    coeff=None, coeff_hdr=None, sp_norm=None, nwaves=None,
-    fov_pix=11, oversample=4, return_oversample=False, use_sp_waveset=False,
-    **kwargs):
+    coeff=None, coeff_hdr=None, sp_norm=None, sp_flux=None, sp_wave=None, 
+    nwaves=None, fov_pix=11, oversample=4, return_oversample=False, 
+    use_sp_waveset=False, stack_weights=None, coeff_basis=None, **kwargs):
     """Generate PSF
 
     Create an image (direct, coronagraphic, grism, or DHS) based on a set of
@@ -1512,12 +2284,35 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         The default is normalized to produce 1 count/sec within that bandpass,
         assuming the telescope collecting area. Coronagraphic PSFs will further
         decrease this flux.
+    sp_flux : ndarray
+        Alternative to `sp_norm` for generating many PSFs at once. An array of
+        shape (nspec, nwave) of spectral flux densities in photlam, where
+        all PSFs are evaluated with a single matrix product. Imaging results
+        are returned as (nspec, ny, nx) arrays rather than lists.
+    sp_wave : ndarray
+        Wavelengths (Angstrom) corresponding to `sp_flux`. If not set,
+        then assumes the bandpass wavelengths ``bp.wave``.
     coeff : ndarray
         A cube of polynomial coefficients for generating PSFs. This is
         generally oversampled with a shape (fov_pix*oversamp, fov_pix*oversamp, deg).
         If not set, this will be calculated using the :func:`gen_psf_coeff` function.
+        For imaging, a stack of coefficient cubes (nstack, deg+1, ny, nx) may be
+        supplied to evaluate multiple PSFs (e.g., at different field points) at 
+        once. Results are then returned as arrays with a (nstack,) or 
+        (nspec, nstack) leading shape.
+    stack_weights : ndarray
+        Only used for stacked coefficients. A matrix of shape (nout, nstack) that
+        linearly combines the stacked (unclipped) images into `nout` final images.
+        Used to apply field-dependent interpolation weights after evaluation.
+    coeff_basis : ndarray
+        Spatial basis of shape (nbasis, ny, nx) from :func:`coeff_lowrank`.
+        If set, the last axis of `coeff` holds amplitudes on this basis rather
+        than pixels, and the images are only reconstructed after the spectral
+        (and stack) contractions.
     coeff_hdr : FITS header
         Header information saved while generating coefficients.
+        If it defines a support region (see :func:`coeff_support`), then
+        only pixels within that region are evaluated.
     nwaves : int
         Option to specify the number of evenly spaced wavelength bins to
         generate and sum over to make final PSF. Useful for wide band filters
@@ -1555,6 +2350,12 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     if is_dhs:
         raise NotImplementedError('DHS has yet to be fully included')
 
+    # Coefficient cube dimensions (deg+1,ny,nx) or (deg+1,nbasis)
+    ncf_dim = 3 if coeff_basis is None else 2
+    is_stack = (coeff is not None) and (len(coeff.shape)==ncf_dim+1)
+    if is_stack and is_grism:
+        raise NotImplementedError('Stacked coefficients are only supported for imaging.')
+
     t0 = time.time()
     # Get filter throughput and create bandpass
     if isinstance(filter_or_bp, six.string_types):
@@ -1576,6 +2377,12 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         coeff, coeff_hdr = gen_psf_coeff(bp, pupil=pupil, mask=mask, module=module, 
             fov_pix=fov_pix, oversample=oversample, **kwargs)
 
+    # Dispersed modes need each monochromatic PSF, so work in pixel space
+    if (coeff_basis is not None) and is_grism:
+        coeff = np.tensordot(coeff, coeff_basis, axes=1)
+        coeff_basis = None
+    nx_coeff = coeff.shape[-1] if coeff_basis is None else coeff_basis.shape[-1]
+
     t1 = time.time()
     waveset = np.copy(bp.wave)
     if nwaves is not None:
@@ -1586,11 +2393,11 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         # ever single wavelength in the bandpass.
         # Do NOT do this for dispersed modes.
         binsize = 1
-        if coeff.shape[-1]>2000:
+        if nx_coeff>2000:
             binsize = 7
-        elif coeff.shape[-1]>1000:
+        elif nx_coeff>1000:
             binsize = 5
-        elif coeff.shape[-1]>700:
+        elif nx_coeff>700:
             binsize = 3
 
         if binsize>1:
@@ -1607,8 +2414,17 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     # print('nwaves: {}'.format(len(wgood)))
 
     t2 = time.time()
+    if sp_flux is not None:
+        # Array of spectra; skip pysynphot observations altogether
+        if use_sp_waveset:
+            raise AttributeError("use_sp_waveset=True is not supported with `sp_flux`.")
+        if sp_norm is not None:
+            raise AttributeError("Only one of `sp_norm` or `sp_flux` may be set.")
+        binflux = _binflux_array(bp, waveset, sp_flux, sp_wave=sp_wave)
+        nspec = binflux.shape[0]
+        t3 = time.time()
     # Flat spectrum with equal photon flux in each spectal bin
-    if sp_norm is None:
+    elif sp_norm is None:
         sp_flat = S.ArraySpectrum(waveset, 0*waveset + 10.)
         sp_flat.name = 'Flat spectrum in flam'
 
@@ -1616,14 +2432,17 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         # produces a response of one count per second in that bandpass
         sp_norm = sp_flat.renorm(bp.unit_response(), 'flam', bp)
 
-    # Make sp_norm a list of spectral objects if it already isn't
-    if not isinstance(sp_norm, list): 
-        sp_norm = [sp_norm]
-    nspec = len(sp_norm)
+    if sp_flux is None:
+        # Make sp_norm a list of spectral objects if it already isn't
+        if not isinstance(sp_norm, list): 
+            sp_norm = [sp_norm]
+        nspec = len(sp_norm)
+        t3 = time.time()
 
-    t3 = time.time()
     # Set up an observation of the spectrum using the specified bandpass
-    if use_sp_waveset:
+    if sp_flux is not None:
+        pass
+    elif use_sp_waveset:
         if nspec>1:
             raise AttributeError("Only 1 spectrum allowed when use_sp_waveset=True.")
         # Modify waveset if use_sp_waveset=True
@@ -1642,28 +2461,69 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
         # Use the bandpass wavelength set to bin the fluxes
         obs_list = [S.Observation(sp, bp, binset=waveset) for sp in sp_norm]
 
-    # Convert to count rate
-    for obs in obs_list: 
-        obs.convert('counts')
+    if sp_flux is None:
+        # Convert to count rate
+        for obs in obs_list: 
+            obs.convert('counts')
+        binflux = np.array([obs.binflux for obs in obs_list])
 
     t4 = time.time()
-    # Create a PSF for each wgood wavelength
     use_legendre = True if coeff_hdr['LEGNDR'] else False
     lxmap = [coeff_hdr['WAVE1'], coeff_hdr['WAVE2']]
-    psf_fit = jl_poly(wgood, coeff, dim_reorder=False, use_legendre=use_legendre, lxmap=lxmap)
-    # Just in case weird coeff gives negative values
-    # psf_fit[psf_fit<=0] = np.min(psf_fit[psf_fit>0]) / 10
-
-    t5 = time.time()
-    # Multiply each monochromatic PSFs by the binned e/sec at each wavelength
-    # Array broadcasting: [nx,ny,nwave] x [1,1,nwave]
-    # Do this for each spectrum/observation
-    if nspec==1:
-        psf_fit *= obs_list[0].binflux.reshape([-1,1,1])
-        psf_list = [psf_fit]
+    # Only evaluate pixels within the support region of trimmed coefficients
+    im_shape = coeff.shape[-2:] if coeff_basis is None else coeff_basis.shape[-2:]
+    support = coeff_support(coeff_hdr, im_shape)
+    if is_grism:
+        # Dispersed modes require each monochromatic PSF individually
+        # Create a PSF for each wgood wavelength
+        psf_fit = jl_poly(wgood, coeff, dim_reorder=False, use_legendre=use_legendre, 
+                          lxmap=lxmap, support=support)
+        # Just in case weird coeff gives negative values
+        # psf_fit[psf_fit<=0] = np.min(psf_fit[psf_fit>0]) / 10
+
+        t5 = time.time()
+        # Multiply each monochromatic PSFs by the binned e/sec at each wavelength
+        # Array broadcasting: [nx,ny,nwave] x [1,1,nwave]
+        # Do this for each spectrum/observation
+        if nspec==1:
+            psf_fit *= binflux[0].reshape([-1,1,1])
+            psf_list = [psf_fit]
+        else:
+            psf_list = [psf_fit*bf.reshape([-1,1,1]) for bf in binflux]
+            del psf_fit
     else:
-        psf_list = [psf_fit*obs.binflux.reshape([-1,1,1]) for obs in obs_list]
-        del psf_fit
+        # Imaging only needs the wavelength-integrated PSF. Contract the binned
+        # e/sec with the polynomial basis first, then sum over coefficient planes.
+        # Avoids creating the (nwave,ny,nx) monochromatic PSF cube.
+        # All spectra are evaluated with a single (nspec,ndeg+1)x(ndeg+1,npix) product.
+        t5 = time.time()
+        if is_stack:
+            # Move stack axis behind coefficient axis: (deg+1,nstack,ny,nx)
+            cf = np.moveaxis(coeff, 0, 1)
+            psf_list = jl_poly_weighted_sum(wgood, cf, binflux, use_legendre=use_legendre, lxmap=lxmap,
+                                            support=None if coeff_basis is not None else support)
+            nstack = psf_list.shape[1]
+            cf_shape = psf_list.shape[2:]
+            if stack_weights is not None:
+                # Linear combinations of stacked images: (nspec,nout,npix)
+                psf_list = np.matmul(stack_weights, psf_list.reshape([nspec,nstack,-1]))
+            nout = psf_list.shape[1]
+            psf_list = psf_list.reshape((-1,) + cf_shape)
+        else:
+            psf_list = jl_poly_weighted_sum(wgood, coeff, binflux, use_legendre=use_legendre, lxmap=lxmap,
+                                            support=None if coeff_basis is not None else support)
+
+        # Reconstruct images from basis amplitudes
+        if (coeff_basis is not None) and (support is not None):
+            ind = np.flatnonzero(support)
+            basis = coeff_basis.reshape([coeff_basis.shape[0],-1])[:,ind]
+            psf_sup = np.tensordot(psf_list, basis, axes=1)
+            psf_list = np.zeros(psf_sup.shape[:-1] + (support.size,), dtype=psf_sup.dtype)
+            psf_list[...,ind] = psf_sup
+            psf_list = psf_list.reshape(psf_sup.shape[:-1] + support.shape)
+            del psf_sup
+        elif coeff_basis is not None:
+            psf_list = np.tensordot(psf_list, coeff_basis, axes=1)
 
     # The number of pixels to span spatially
     fov_pix = int(fov_pix)
@@ -1750,20 +2610,33 @@ def gen_image_coeff(filter_or_bp, pupil=None, mask=None, module='A',
     # Imaging
     else:
         # Create source image slopes (no noise)
-        data_list = []
-        data_list_over = []
-        for psf_fit in psf_list:
-            data_over = psf_fit.sum(axis=0)
-            data_over[data_over<=__epsilon] = data_over[data_over>__epsilon].min() / 10
-            data_list_over.append(data_over)
-            data_list.append(poppy.utils.krebin(data_over, (fov_pix,fov_pix)))
-
-        if nspec == 1: 
-            data_list = data_list[0]
-            data_list_over = data_list_over[0]
+        # Replace values near 0 with 1/10 the minimum positive value of each image
+        data_over = psf_list
+        vmin = np.where(data_over>__epsilon, data_over, np.inf).min(axis=(1,2))
+        data_over = np.where(data_over>__epsilon, data_over, vmin.reshape([-1,1,1]) / 10)
+
+        # Rebin all oversampled images to detector pixels (sum, as in krebin)
+        ny_over, nx_over = data_over.shape[-2:]
+        nim = data_over.shape[0]
+        sh = (nim, fov_pix, ny_over//fov_pix, fov_pix, nx_over//fov_pix)
+        data = data_over.reshape(sh).sum(axis=(2,4))
+
+        if is_stack:
+            # Keep spectra dimension only if multiple spectra
+            sh_out = (nout,) if (nspec==1) and (sp_flux is None) else (nspec, nout)
+            data_list = data.reshape(sh_out + data.shape[-2:])
+            data_list_over = data_over.reshape(sh_out + data_over.shape[-2:])
+        elif sp_flux is not None:
+            data_list, data_list_over = data, data_over
+        elif nspec == 1: 
+            data_list = data[0]
+            data_list_over = data_over[0]
+        else:
+            data_list = list(data)
+            data_list_over = list(data_over)
 
         t7 = time.time()
-        _log.debug('jl_poly: {:.2f} sec; binflux: {:.2f} sec; PSF sum: {:.2f} sec'.format(t5-t4, t6-t5, t7-t6))
+        _log.debug('binflux: {:.2f} sec; PSF sum: {:.2f} sec; rebin: {:.2f} sec'.format(t5-t4, t6-t5, t7-t6))
         if return_oversample:
             return data_list, data_list_over
         else:
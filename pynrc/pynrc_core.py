@@ -13,6 +13,12 @@ from .opds import *
 from .psfs import *
 from .detops import *
 from .detops import _check_list # hidden function
+from .nrc_utils import _mag_scale
+from .psfs import _pool_map
+from .resources import get_scheduler, task_unit
+from .coeff_store import hash_inputs
+
+from collections import OrderedDict
 
 import pysiaf
 
@@ -431,6 +437,23 @@ class NIRCam(object):
         Only perform a fit over the filter bandpass with a lower default polynomial degree fit.
     use_legendre : bool
         Fit with Legendre polynomials, an orthonormal basis set.
+    use_fp32 : bool
+        Store PSF coefficients in single precision.
+    psf_tol : float
+        Tolerance for adaptive wavelength sampling of PSF coefficients.
+    support_tol : float
+        Threshold relative to PSF peak for trimming coefficient support.
+    lowrank_tol : float
+        Truncation tolerance for low-rank coefficient residuals.
+    psf_cache_size : float
+        Memory budget (GB) for memoizing :meth:`gen_psf` results. Default 0 (off).
+    lazy : bool
+        Defer loading the SIAF and generating PSF coefficients (including WFE drift,
+        field, and wedge modifications) until they are first needed, e.g. by 
+        :attr:`psf_coeff` or :meth:`gen_psf`. Timing and detector properties such as
+        :attr:`multiaccum_times` and :attr:`well_level` never trigger the PSF
+        calculations. Use :meth:`prefetch` to generate everything up front.
+        Default=False.
     
     Examples
     --------
@@ -449,11 +472,24 @@ class NIRCam(object):
     # Variable indicating whether or not to warn about even/odd pixel
     _fov_pix_warn = True
 
+    # Attributes that can be deferred in lazy mode, grouped by the method 
+    # that generates them. Order sets the sequence used by prefetch().
+    _lazy_loaders = (
+        ('_load_siaf', ('siaf_nrc',)),
+        ('_load_psf_coeff', ('_psf_coeff', '_psf_coeff_hdr', '_psf_coeff_bg', '_psf_coeff_bg_hdr',
+                             '_psf_coeff_mod', '_psf_coeff_bg_mod', '_psf_coeff_mod_wedge')),
+    )
+
     def __init__(self, filter='F210M', pupil=None, mask=None, module='A', ND_acq=False,
         apname=None, **kwargs):
-                          
-        self.siaf_nrc = pysiaf.Siaf('NIRCam')
-        self.siaf_nrc.generate_toc()
+
+        # Lazy mode defers SIAF and PSF coefficient generation until first access
+        self._lazy = kwargs.get('lazy', False)
+        self._lazy_pending = set()
+        if self._lazy:
+            self._lazy_defer('_load_siaf')
+        else:
+            self._load_siaf()
         
         # Available Filters
         # Note: Certain narrowband filters reside in the pupil wheel and cannot be paired
@@ -497,18 +533,12 @@ class NIRCam(object):
         self._fovmax_wfedrift = 256
         self._fovmax_wfefield = 128
 
-        self._psf_coeff_mod = {
-            'wfe_drift': None, 'wfe_drift_lxmap': None,
-            'si_field': None, 'si_field_v2grid': None, 'si_field_v3grid': None,
-            'wedge': None, #'wedge_lxmap': None
-        } 
-        self._psf_coeff_bg_mod = {
-            'wfe_drift': None, 'wfe_drift_lxmap': None,
-            'si_field': None, 'si_field_v2grid': None, 'si_field_v3grid': None
-        } 
-
-        # Bar wedge coefficient init
-        self._psf_coeff_mod_wedge = None
+        # Memoized gen_psf() results (disabled by default)
+        self._psf_cache = OrderedDict()
+        self._psf_cache_nbytes = 0
+        self._psf_cache_state = 0
+        self._psf_cache_hits = self._psf_cache_misses = 0
+        self._psf_cache_size = kwargs.get('psf_cache_size', 0)
 
         # self._bar_wfe_val holds bar offset value for drifted PSF to be used for
         # generating a series of offset values such as in nrc_hci class.
@@ -570,6 +600,62 @@ class NIRCam(object):
         else:
             self.update_from_SIAF(apname, pupil=pupil, **kwargs)
 
+    def __getattr__(self, name):
+        # Only called if normal attribute lookup fails, which is the case
+        # for attributes deferred in lazy mode that have not yet been generated.
+        pending = self.__dict__.get('_lazy_pending', ())
+        for loader, attrs in type(self)._lazy_loaders:
+            if (name in attrs) and (loader in pending):
+                self._lazy_load(loader)
+                return getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def _lazy_defer(self, loader):
+        """Drop attributes generated by `loader` until they are next accessed."""
+        for name, attrs in type(self)._lazy_loaders:
+            if name==loader:
+                for attr in attrs:
+                    self.__dict__.pop(attr, None)
+        self._lazy_pending.add(loader)
+
+    def _lazy_load(self, loader):
+        """Run a deferred `loader`, keeping it pending if it fails."""
+        self._lazy_pending.discard(loader)
+        try:
+            getattr(self, loader)()
+        except Exception:
+            self._lazy_pending.add(loader)
+            raise
+
+    def prefetch(self):
+        """Generate everything deferred in lazy mode.
+        
+        Loads the SIAF and generates any pending PSF coefficients
+        (and, for subclasses, derived products such as cached PSFs). 
+        Useful to warm up an instance before timing-critical work or 
+        before sharing it among processes. Does nothing if no 
+        calculations are pending.
+        """
+        for loader, _ in type(self)._lazy_loaders:
+            if loader in self._lazy_pending:
+                self._lazy_load(loader)
+
+    @property
+    def lazy(self):
+        """Defer SIAF and PSF coefficient generation until first use?"""
+        return self._lazy
+    @lazy.setter
+    def lazy(self, value):
+        """Turning off lazy mode generates all pending products."""
+        self._lazy = bool(value)
+        if not self._lazy:
+            self.prefetch()
+
+    def _load_siaf(self):
+        """Load NIRCam SIAF apertures."""
+        self.siaf_nrc = pysiaf.Siaf('NIRCam')
+        self.siaf_nrc.generate_toc()
+
 
 
     # Allowed values for filters, coronagraphic masks, and pupils
@@ -694,6 +780,7 @@ class NIRCam(object):
         return self._bandpass
     def _update_bp(self):
         """Update bandpass based on filter, pupil, and module, etc."""
+        self.psf_cache_clear()
         self._bandpass = read_filter(self._filter, self._pupil, self._mask, 
                                      self.module, self.ND_acq,
                                      ice_scale=self._ice_scale, nvr_scale=self._nvr_scale,
@@ -1348,7 +1435,8 @@ class NIRCam(object):
         offset_r=None, offset_theta=None, tel_pupil=None, opd=None,
         include_si_wfe=None, jitter=None, jitter_sigma=None,
         bar_offset=None, save=None, force=False, use_legendre=None,
-        quick=None, nproc=None, **kwargs):
+        use_fp32=None, psf_tol=None, support_tol=None, lowrank_tol=None, quick=None, 
+        nproc=None, **kwargs):
         """Create new PSF coefficients.
         
         Generates a set of PSF coefficients from a sequence of WebbPSF images.
@@ -1399,8 +1487,31 @@ class NIRCam(object):
             polynomial degree fit. Default is True for narroband, False otherwise.
         use_legendre : bool
             Fit with Legendre polynomials, an orthonormal basis set.
+        use_fp32 : bool
+            Store PSF coefficients (and WFE drift/field/wedge residuals) in
+            single precision. Halves memory and speeds up :meth:`gen_psf`
+            with a relative PSF error of order 1e-6. Default=False.
+        psf_tol : float or None
+            Adaptively sample the monochromatic PSF wavelengths until the
+            polynomial fit reproduces held-out PSFs to within `psf_tol`
+            relative to the PSF peak (e.g., 1e-3). Default=None (fixed sampling).
+        support_tol : float or None
+            Only store and evaluate PSF coefficients within a circular region
+            enclosing all pixels brighter than `support_tol` relative to the
+            PSF peak (e.g., 1e-7). Useful for large, oversampled coronagraphic
+            PSFs. Residual modifications (WFE drift, field) outside this region
+            are ignored. Default=None (full FoV).
+        lowrank_tol : float or None
+            If set, the WFE drift, field-dependent, and wedge coefficient
+            residuals are projected onto a truncated spatial basis (see
+            :func:`~pynrc.psfs.coeff_lowrank`) with relative truncation error
+            `lowrank_tol` (e.g., 1e-4). :meth:`gen_psf` then evaluates in the
+            reduced space. Default=None (dense coefficients).
         """
 
+        # Previously generated PSFs are no longer valid
+        self.psf_cache_clear()
+
         if oversample is None: 
             # Check if oversample has already been saved
             try: oversample = self._psf_info['oversample']
@@ -1458,6 +1569,19 @@ class NIRCam(object):
         if use_legendre is None:
             try: use_legendre = self._psf_info['use_legendre']
             except (AttributeError, KeyError): use_legendre = True
+        if use_fp32 is None:
+            try: use_fp32 = self._psf_info['use_fp32']
+            except (AttributeError, KeyError): use_fp32 = False
+        if psf_tol is None:
+            try: psf_tol = self._psf_info['psf_tol']
+            except (AttributeError, KeyError): psf_tol = None
+        if support_tol is None:
+            try: support_tol = self._psf_info['support_tol']
+            except (AttributeError, KeyError): support_tol = None
+        if lowrank_tol is None:
+            try: lowrank_tol = self._psf_lowrank_tol
+            except AttributeError: lowrank_tol = None
+        self._psf_lowrank_tol = lowrank_tol
         if jitter is None:
             try: jitter = self._psf_info['jitter']
             except (AttributeError, KeyError): jitter = 'gaussian'
@@ -1485,7 +1609,54 @@ class NIRCam(object):
         self._psf_info={'fov_pix':fov_pix, 'oversample':oversample, 'quick':quick, 'nproc':nproc,
             'offset_r':offset_r, 'offset_theta':offset_theta, 
             'tel_pupil':tel_pupil, 'save':save, 'force':force, 'use_legendre':use_legendre,
-            'include_si_wfe':include_si_wfe, 'opd':opd, 'jitter':jitter, 'jitter_sigma':jitter_sigma}
+            'use_fp32':use_fp32, 'psf_tol':psf_tol, 'support_tol':support_tol, 
+            'include_si_wfe':include_si_wfe, 'opd':opd, 
+            'jitter':jitter, 'jitter_sigma':jitter_sigma}
+
+        # If there is a coronagraphic spot or bar, then we may need to
+        # generate another background PSF for sensitivity information.
+        # It's easiest just to ALWAYS do a small footprint without the
+        # coronagraphic mask and save the PSF coefficients. 
+        # WARNING: This assumes throughput of the coronagraphic substrate
+        if self._mask is not None:
+            self._psf_info_bg = {'fov_pix':self._fov_pix_bg, 'oversample':oversample, 
+                'offset_r':0, 'offset_theta':0, 'bar_offset': 0, 'tel_pupil':tel_pupil, 
+                'opd':opd, 'jitter':jitter, 'jitter_sigma':jitter_sigma, 'use_legendre':use_legendre, 
+                'use_fp32':use_fp32, 'psf_tol':psf_tol, 'support_tol':support_tol, 
+                'include_si_wfe':include_si_wfe, 
+                'save':save, 'force':force}
+        else:
+            # Background info is the same as main foreground PSF
+            self._psf_info_bg = self._psf_info
+
+        if self._lazy:
+            # Coefficients are generated on first access
+            self._lazy_defer('_load_psf_coeff')
+        else:
+            self._load_psf_coeff()
+
+    def _load_psf_coeff(self):
+        """Generate PSF coefficients and their modifications.
+
+        Creates the nominal coefficients along with the WFE drift, 
+        field-dependent, and bar wedge residuals (as enabled) for the 
+        settings stored in :attr:`psf_info` and :attr:`psf_info_bg`.
+        """
+        fov_pix = self._psf_info['fov_pix']
+        oversample = self._psf_info['oversample']
+
+        self._psf_coeff_mod = {
+            'wfe_drift': None, 'wfe_drift_lxmap': None,
+            'si_field': None, 'si_field_v2grid': None, 'si_field_v3grid': None,
+            'wedge': None, #'wedge_lxmap': None
+            'basis': None, 'coeff': None,
+        } 
+        self._psf_coeff_bg_mod = {
+            'wfe_drift': None, 'wfe_drift_lxmap': None,
+            'si_field': None, 'si_field_v2grid': None, 'si_field_v3grid': None,
+            'basis': None, 'coeff': None,
+        } 
+
         self._psf_coeff, self._psf_coeff_hdr = gen_psf_coeff(self.bandpass, self.pupil, self.mask, self.module, 
             **self._psf_info)
 
@@ -1552,16 +1723,8 @@ class NIRCam(object):
             self._psf_coeff_mod_wedge = None
 
 
-        # If there is a coronagraphic spot or bar, then we may need to
-        # generate another background PSF for sensitivity information.
-        # It's easiest just to ALWAYS do a small footprint without the
-        # coronagraphic mask and save the PSF coefficients. 
-        # WARNING: This assumes throughput of the coronagraphic substrate
+        # Background PSF without the coronagraphic mask
         if self._mask is not None:
-            self._psf_info_bg = {'fov_pix':self._fov_pix_bg, 'oversample':oversample, 
-                'offset_r':0, 'offset_theta':0, 'bar_offset': 0, 'tel_pupil':tel_pupil, 
-                'opd':opd, 'jitter':jitter, 'jitter_sigma':jitter_sigma, 'use_legendre':use_legendre, 
-                'include_si_wfe':include_si_wfe, 'save':save, 'force':force}
             self._psf_coeff_bg, self._psf_coeff_bg_hdr = gen_psf_coeff(self.bandpass, self.pupil, None, self.module, 
                 **self._psf_info_bg)
 
@@ -1614,12 +1777,48 @@ class NIRCam(object):
                 self._psf_coeff_bg_mod['si_field_v3grid'] = None 
 
         else:
-            # Background info is the same as main foreground PSF
-            self._psf_info_bg  = self._psf_info
+            # Background PSF is the same as main foreground PSF
             self._psf_coeff_bg = self._psf_coeff
             self._psf_coeff_bg_hdr = self._psf_coeff_hdr
             self._psf_coeff_bg_mod = self._psf_coeff_mod
 
+        # Optional low-rank representation of the coefficient residuals
+        self._update_psf_lowrank()
+
+    def _update_psf_lowrank(self):
+        """Project coefficient residuals onto a truncated spatial basis.
+
+        The nominal coefficients and all residual products (drift, field,
+        and wedge) are expressed as amplitudes on a common basis, stored
+        in the `basis` and `coeff` keys of the coefficient modification 
+        dictionaries. The dense nominal coefficients are left untouched.
+        """
+        tol = self._psf_lowrank_tol
+
+        mod_list = [(self._psf_coeff, self._psf_coeff_mod)]
+        if self._psf_coeff_bg_mod is not self._psf_coeff_mod:
+            mod_list.append((self._psf_coeff_bg, self._psf_coeff_bg_mod))
+
+        for i, (coeff, mod) in enumerate(mod_list):
+            mod['basis'] = mod['coeff'] = None
+            keys = [k for k in ['wfe_drift', 'si_field'] if mod[k] is not None]
+            # Wedge offsets only apply to the foreground PSF
+            wedge = self._psf_coeff_mod_wedge if i==0 else None
+            if (tol is None) or ((len(keys)==0) and (wedge is None)):
+                continue
+
+            resid_list = [mod[k] for k in keys]
+            if wedge is not None:
+                resid_list.append(wedge)
+            basis, amp0, amp_list = coeff_lowrank(coeff, resid_list, tol=tol)
+
+            mod['basis'] = basis
+            mod['coeff'] = amp0
+            for k, amp in zip(keys, amp_list):
+                mod[k] = amp
+            if wedge is not None:
+                self._psf_coeff_mod_wedge = amp_list[-1]
+
 
     def sat_limits(self, sp=None, bp_lim=None, units='vegamag', well_frac=0.8,
         ngroup=None, trim_psf=33, verbose=False, **kwargs):
@@ -1763,6 +1962,10 @@ class NIRCam(object):
         ap_spec : int, float
             Instead of dw_bin, specify the spectral extraction aperture in pixels.
             Takes priority over dw_bin. Value will get rounded up to nearest int.
+        ngroup, nf, nd2, nint : int or ndarray
+            Ramp settings to use instead of the current MULTIACCUM settings.
+            With ``forwardSNR=True``, these may be arrays to evaluate the SNR
+            of many readout configurations at once.
         """	
 
         quiet = False if verbose else True
@@ -1779,6 +1982,9 @@ class NIRCam(object):
 
 
         kw1 = self.multiaccum.to_dict()
+        for k in ('ngroup', 'nf', 'nd2', 'nint'):
+            if k in kwargs:
+                kw1[k] = kwargs.pop(k)
         kw2 = self._psf_info_bg
         kw3 = {'rn':rn, 'ktc':ktc, 'idark':idark, 'p_excess':p_excess}
         kwargs = merge_dicts(kwargs,kw1,kw2,kw3)
@@ -2086,9 +2292,59 @@ class NIRCam(object):
             return psf
 
 
+    @property
+    def psf_cache_size(self):
+        """Memory budget (GB) for memoized :meth:`gen_psf` results. 0 disables."""
+        return self._psf_cache_size
+    @psf_cache_size.setter
+    def psf_cache_size(self, value):
+        """Memory budget (GB) for memoized :meth:`gen_psf` results. 0 disables."""
+        self._psf_cache_size = 0 if value is None else value
+        if self._psf_cache_size <= 0:
+            self.psf_cache_clear()
+        else:
+            self._psf_cache_evict()
+
+    @property
+    def psf_cache_stats(self):
+        """Dictionary of :meth:`gen_psf` cache statistics."""
+        return {'hits': self._psf_cache_hits, 'misses': self._psf_cache_misses,
+                'nentries': len(self._psf_cache), 'nbytes': self._psf_cache_nbytes,
+                'max_size': self._psf_cache_size}
+
+    def psf_cache_clear(self):
+        """Remove all memoized :meth:`gen_psf` results.
+
+        Called automatically whenever the bandpass, detectors, or PSF
+        coefficients are updated.
+        """
+        self._psf_cache.clear()
+        self._psf_cache_nbytes = 0
+        self._psf_cache_state += 1
+
+    def _psf_cache_evict(self):
+        max_bytes = self._psf_cache_size * 1024**3
+        while (self._psf_cache_nbytes > max_bytes) and (len(self._psf_cache) > 0):
+            _, (_, nbytes) = self._psf_cache.popitem(last=False)
+            self._psf_cache_nbytes -= nbytes
+
+    def _psf_cache_key(self, sp, state):
+        """Hash of instrument state, spectrum, and :meth:`gen_psf` arguments.
+
+        Returns None if any input cannot be reliably hashed by content,
+        in which case the result is not cached.
+        """
+        sp_obj = _spec_hash_obj(sp)
+        if (sp_obj is _nocache) or (not _hashable_obj(state)):
+            return None
+        inst_state = (self._psf_cache_state, self._filter, self._pupil, self._mask, 
+                      self._module, self._ND_acq, self._det_info, 
+                      self._wfe_drift, self._wfe_field)
+        return hash_inputs(inst_state, sp_obj, state)
+
     def gen_psf(self, sp=None, return_oversample=False, use_bg_psf=False, 
                 wfe_drift=None, coord_vals=None, coord_frame='tel', 
-                bar_offset=None, return_hdul=False, **kwargs):
+                bar_offset=None, return_hdul=False, return_stack=False, **kwargs):
         """PSF image
         
         Create a PSF image from instrument settings. The image is noiseless and
@@ -2103,13 +2359,16 @@ class NIRCam(object):
 
         Parameters
         ----------
-        sp : :mod:`pysynphot.spectrum`
+        sp : :mod:`pysynphot.spectrum`, list, or ndarray
             If not specified, the default is flat in phot lam 
             (equal number of photons per spectral bin).
             The default is normalized to produce 1 count/sec within that bandpass,
             assuming the telescope collecting area and instrument bandpass. 
             Coronagraphic PSFs will further decrease this due to the smaller pupil
-            size and coronagraphic spot. 
+            size and coronagraphic spot. Many PSFs can be generated at once by
+            passing an (nspec, nwave) array of flux densities (photlam) sampled at
+            the wavelengths given by the `sp_wave` keyword (default: ``bandpass.wave``).
+            Imaging results are then returned as (nspec, ny, nx) arrays.
         return_oversample : bool
             If True, then also returns the oversampled version of the PSF
         use_bg_psf : bool
@@ -2134,10 +2393,59 @@ class NIRCam(object):
             If both set to None, then decide location based on selected filter. 
             A positive value will move the source to the right when viewing 
             V2 to the left and V3 up.
+            An array of offsets generates the family of PSFs along the bar in a 
+            single batched contraction, returned as (noff, ny, nx) arrays.
+            Array offsets are only supported for a single field point; combining
+            them with multiple `coord_vals` raises a NotImplementedError.
         return_hdul : bool
             TODO: Return PSFs in an HDUList rather than set of arrays
+        return_stack : bool
+            If multiple field points are specified in `coord_vals`, return
+            the imaging PSFs as a stacked (nfield, ny, nx) array rather 
+            than a list. All field points are evaluated in a single batched
+            contraction either way (except for grism observations).
+
+        Results are memoized if :attr:`psf_cache_size` is set (see 
+        :meth:`psf_cache_clear`). Cached PSFs are returned as copies.
         """
 
+        state = (return_oversample, use_bg_psf, wfe_drift, coord_vals, coord_frame,
+                 bar_offset, return_hdul, return_stack, kwargs)
+        key = self._psf_cache_key(sp, state) if self._psf_cache_size > 0 else None
+        if key is not None:
+            try:
+                res = self._psf_cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._psf_cache[key] = res
+                self._psf_cache_hits += 1
+                return _copy_result(res[0])
+
+        res = self._gen_psf(sp=sp, return_oversample=return_oversample, use_bg_psf=use_bg_psf,
+                            wfe_drift=wfe_drift, coord_vals=coord_vals, coord_frame=coord_frame,
+                            bar_offset=bar_offset, return_hdul=return_hdul, 
+                            return_stack=return_stack, **kwargs)
+
+        if key is not None:
+            self._psf_cache_misses += 1
+            nbytes = _result_nbytes(res)
+            if nbytes <= self._psf_cache_size * 1024**3:
+                self._psf_cache[key] = (_copy_result(res), nbytes)
+                self._psf_cache_nbytes += nbytes
+                self._psf_cache_evict()
+        return res
+
+    def _gen_psf(self, sp=None, return_oversample=False, use_bg_psf=False, 
+                 wfe_drift=None, coord_vals=None, coord_frame='tel', 
+                 bar_offset=None, return_hdul=False, return_stack=False, **kwargs):
+        """Uncached PSF image generation; see :meth:`gen_psf`."""
+
+        # Array of spectra are evaluated in a single batch
+        if isinstance(sp, np.ndarray):
+            kwargs['sp_flux'] = sp
+            sp = None
+
         if use_bg_psf:
             psf_coeff_hdr = self._psf_coeff_bg_hdr
             psf_coeff     = self._psf_coeff_bg
@@ -2147,6 +2455,12 @@ class NIRCam(object):
             psf_coeff     = self._psf_coeff
             psf_info      = self._psf_info
 
+        # Low-rank coefficients are evaluated as amplitudes on a spatial basis
+        coeff_basis = self._psf_coeff_bg_mod['basis'] if use_bg_psf else self._psf_coeff_mod['basis']
+        if coeff_basis is not None:
+            psf_coeff = self._psf_coeff_bg_mod['coeff'] if use_bg_psf else self._psf_coeff_mod['coeff']
+            kwargs['coeff_basis'] = coeff_basis
+
         # Coeff modification variable
         psf_coeff_mod = 0 
 
@@ -2177,6 +2491,7 @@ class NIRCam(object):
 
         # Modify PSF coefficients based on field-dependent
         nfield = 1
+        field_resid = None
         if (coord_vals is not None) and (self.wfe_field==False):
             _log.warning("coord_vals keyword is set, but `self.wfe_field` is False. Toggle `self.wfe_field=True` to use this feature.")
             _log.warning("`gen_psf` will continue with default PSF.")
@@ -2219,10 +2534,25 @@ class NIRCam(object):
                     _log.warning("`gen_psf` will continue with default PSF.")
 
                 # PSF Modifications
-                if (v2 is not None):
+                if (v2 is not None) and (np.size(v2)>1) and ('GRISM' not in self.pupil):
+                    # Many field points for imaging. Rather than building coefficients
+                    # for every field point, evaluate the nominal PSF and each V2/V3 
+                    # grid residual once, then apply the linear interpolation weights.
+                    nfield = np.size(v2)
+                    field_wts = field_coeff_weights(v2grid, v3grid, v2, v3)
+                    # Only grid points within the interpolation stencils contribute
+                    igrid = np.where(np.any(field_wts!=0, axis=0))[0]
+                    field_wts = field_wts[:,igrid]
+                    field_resid = cf_fit.reshape((-1,) + cf_fit.shape[2:])[igrid]
+                    if not np.allclose(psf_coeff.shape, field_resid.shape[1:]):
+                        new_shape = psf_coeff.shape[1:]
+                        field_resid = np.array([pad_or_cut_to_size(cf, new_shape) for cf in field_resid])
+                    field_resid = field_resid.astype(psf_coeff.dtype, copy=False)
+                elif (v2 is not None):
                     # print(v2,v3)
                     nfield = np.size(v2)
                     cf_mod = field_coeff_func(v2grid, v3grid, cf_fit, v2, v3)
+                    cf_mod = cf_mod.astype(psf_coeff.dtype, copy=False)
                     # Pad cf_mod array with 0s if undersized
                     psf_cf_dim = len(psf_coeff.shape)
                     if not np.allclose(psf_coeff.shape, cf_mod.shape[-psf_cf_dim:]):
@@ -2244,7 +2574,16 @@ class NIRCam(object):
                 bar_offset = r_bar # arcsec
 
             # Interpolate coefficient offset if not 0
-            if bar_offset != 0:
+            if np.ndim(bar_offset) > 0:
+                # Family of bar offsets evaluated as a coefficient stack
+                if field_resid is not None:
+                    raise NotImplementedError('Multiple bar offsets and field points are not supported together.')
+                cf_fit = self._psf_coeff_mod_wedge
+                cf_fit = cf_fit.reshape([cf_fit.shape[0], -1])
+                cf_mod = jl_poly(np.asarray(bar_offset, dtype='float').ravel(), cf_fit)
+                cf_mod = cf_mod.reshape((-1,) + psf_coeff.shape)
+                psf_coeff_mod = psf_coeff_mod + cf_mod
+            elif bar_offset != 0:
                 cf_fit = self._psf_coeff_mod_wedge
                 cf_fit = cf_fit.reshape([cf_fit.shape[0], -1])
                 cf_mod = jl_poly(np.array([bar_offset]), cf_fit)
@@ -2255,7 +2594,30 @@ class NIRCam(object):
         del psf_coeff_mod
 
         # if multiple field points were present, we want to return PSF for each
-        if nfield>1:
+        if field_resid is not None:
+            # Stack of nominal coefficients and grid residuals evaluated together
+            coeff_stack = np.concatenate([psf_coeff[np.newaxis], field_resid])
+            stack_wts = np.concatenate([np.ones([nfield,1]), field_wts], axis=1)
+            res = gen_image_coeff(self.bandpass, sp_norm=sp,
+                                  pupil=self.pupil, mask=self.mask, module=self.module,
+                                  coeff=coeff_stack, coeff_hdr=psf_coeff_hdr, stack_weights=stack_wts,
+                                  fov_pix=psf_info['fov_pix'], oversample=psf_info['oversample'],
+                                  return_oversample=return_oversample, **kwargs)
+            if return_stack:
+                return res
+
+            # Convert to list of PSFs for each field point
+            res = res if return_oversample else (res,)
+            nfield_ax = res[0].ndim - 3  # Axis of field points
+            res = [list(np.moveaxis(r, nfield_ax, 0)) for r in res]
+            if (nfield_ax==1) and (kwargs.get('sp_flux') is None):
+                # List of spectra for each field point
+                res = [[list(psfs) for psfs in r] for r in res]
+            if return_oversample:
+                return list(zip(*res))
+            else:
+                return res[0]
+        elif nfield>1:
             psf_all = []
             for ii in range(nfield):
                 coeff = psf_coeff[ii]
@@ -2453,7 +2815,8 @@ class NIRCam(object):
         else:
             pool = mp.Pool(nproc)
             try:
-                res = pool.map(gen_fits, worker_arguments)
+                chunksize = get_scheduler().chunksize(len(worker_arguments), nproc)
+                res = pool.map(gen_fits, worker_arguments, chunksize=chunksize)
             except Exception as e:
                 print('Caught an exception during multiprocess:')
                 raise e
@@ -2565,8 +2928,8 @@ class NIRCam(object):
 
         def parse_snr(snr, grism_obs, ind_snr):
             if grism_obs:
-                res = snr['snr']
-                return np.median(res)
+                res = np.asarray(snr['snr'])
+                return np.median(res, axis=0)
             else:
                 return snr[ind_snr]['snr']            
 
@@ -2576,8 +2939,6 @@ class NIRCam(object):
         dhs_obs   = (pupil is not None) and ('DHS'   in pupil)
         coron_obs = (pupil is not None) and ('LYOT'  in pupil)
 
-        det_params_orig = self.det_info.copy()
-
         if dhs_obs:
             raise NotImplementedError('DHS has yet to be fully included.')
         if grism_obs and is_extended:
@@ -2632,149 +2993,56 @@ class NIRCam(object):
     
         patterns.sort()
 
-        rows = []
-        if tacq_max is not None:
-            snr_goal_list = []
-            # Cycle through each readout pattern
-            for read_mode in patterns:
-                if verbose: print(read_mode)
-
-                # Maximum allowed groups for given readout pattern
-                _,_,ngroup_max = pattern_settings.get(read_mode)
-                if ng_max is not None:
-                    ngroup_max = ng_max
-                nng = ngroup_max - ng_min + 1
-                if nng>30:
-                    _log.warning('Cycling through {} NGRPs. This may take a while!'\
-                        .format(nng))
-                for ng in range(ng_min,ngroup_max+1):
-                    self.update_detectors(read_mode=read_mode, ngroup=ng, nint=1)
-                    mtimes = self.multiaccum_times
-
-                    # Get saturation level of observation
-                    # Total time spent integrating minus the reset frame
-                    int_time = mtimes['t_int']
-
-                    well_frac = pix_count_rate * int_time / self.well_level
-                    # If above well_frac_max, then this setting is invalid
-                    # Also, all subsequent values of ng will be too high
-                    # so just break out of for loop.
-                    if well_frac > well_frac_max:
-                        #continue
-                        break
-            
-                    # Approximate integrations needed to obtain required t_acq
-                    nint1 = int(((1-tacq_frac)*tacq_max) / mtimes['t_acq'])
-                    nint2 = int(((1+tacq_frac)*tacq_max) / mtimes['t_acq'] + 0.5)
-            
-                    nint1 = np.max([nint1,nint_min])
-                    nint2 = np.min([nint2,nint_max])
-            
-                    nint_all = np.arange(nint1, nint2+1)
-                    
-                    narr = len(nint_all)
-                    # Sometimes there are a lot of nint values to check
-                    # Let's pair down to <5 per ng
-                    if narr>5:
-                        i1 = int(narr/2-2)
-                        i2 = i1 + 5
-                        nint_all = nint_all[i1:i2]
-                
-            
-                    #print(len(nint_all))
-                    for nint in nint_all:
-                        if nint > nint_max: break
-                        self.update_detectors(nint=nint)
-                        mtimes = self.multiaccum_times
-                        sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, **kwargs)
-                        snr = parse_snr(sen, grism_obs, ind_snr)
-                
-                        rows.append((read_mode, ng, nint, mtimes['t_int'], mtimes['t_exp'], \
-                            mtimes['t_acq'], snr, well_frac))
-
-        elif snr_goal is not None:
-            for i,read_mode in enumerate(patterns):
-                if verbose: print(read_mode)
-
-                # Maximum allowed groups for given readout pattern
-                _,_,ngroup_max = pattern_settings.get(read_mode)
-                if ng_max is not None:
-                    ngroup_max = ng_max #np.min([ng_max,ngroup_max])
-                nng = ngroup_max - ng_min + 1
-                if nng>20:
-                    _log.warning('Cycling through {} NGRPs. This may take a while!'\
-                        .format(nng))
-                        
-                ng_saved = False
-                for ng in range(ng_min,ngroup_max+1):
-                    self.update_detectors(read_mode=read_mode, ngroup=ng, nint=1)
-                    mtimes = self.multiaccum_times
-
-                    # Get saturation level of observation
-                    int_time = mtimes['t_int']
-                    well_frac = pix_count_rate * int_time / self.well_level
-                    # If above well_frac_max, then this setting is invalid
-                    if well_frac > well_frac_max:
-                        continue
-
-                    # Get SNR (assumes no saturation)
-                    sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, **kwargs)
-                    snr = parse_snr(sen, grism_obs, ind_snr)
-
-                    # Approximate integrations needed to get to required SNR
-                    nint = int((snr_goal / snr)**2)
-                    nint = np.max([nint_min,nint])
-                    if nint>nint_max:
-                        continue
-    
-                    # Find NINT with SNR > 0.95 snr_goal
-                    self.update_detectors(nint=nint)
-                    mtimes = self.multiaccum_times
-                    sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, **kwargs)
-                    snr = parse_snr(sen, grism_obs, ind_snr)
-                    while (snr<((1-snr_frac)*snr_goal)) and (nint<=nint_max):
-                        nint += 1
-                        self.update_detectors(nint=nint)
-                        mtimes = self.multiaccum_times
-                        sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, **kwargs)
-                        snr = parse_snr(sen, grism_obs, ind_snr)
-                
-                    # Skip if NINT
-                    if (nint > nint_max):# or :
-                        continue
-                        
-                    # We want to make sure that at least one NINT setting is saved
-                    # if the resulting SNR is higher than our stated goal.
-                    if (snr > ((1+snr_frac)*snr_goal)) and ng_saved:
-                        continue
-
-                    rows.append((read_mode, ng, nint, mtimes['t_int'], mtimes['t_exp'], \
-                        mtimes['t_acq'], snr, well_frac))
-                    ng_saved = True
-                    
-    
-                    # Increment NINT until SNR > 1.05 snr_goal
-                    # Add each NINT to table output
-                    while (snr < ((1+snr_frac)*snr_goal)) and (nint<=nint_max):
-                        nint += 1
-                        if (nint > nint_max): break # double-check
-                        self.update_detectors(nint=nint)
-                        sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, **kwargs)
-                        snr = parse_snr(sen, grism_obs, ind_snr)
-                        mtimes = self.multiaccum_times
-                        rows.append((read_mode, ng, nint, mtimes['t_int'], mtimes['t_exp'], \
-                            mtimes['t_acq'], snr, well_frac))
-                
-        # Return to detector mode to original parameters
-        self.update_detectors(**det_params_orig)
+        # All (pattern, ngroup) candidates, ordered by pattern then ngroup
+        cand = []
+        for read_mode in patterns:
+            # Maximum allowed groups for given readout pattern
+            nf, nd2, ngroup_max = pattern_settings.get(read_mode)
+            if ng_max is not None:
+                ngroup_max = ng_max
+            cand += [(read_mode, ng, nf, nd2) for ng in range(ng_min, ngroup_max+1)]
 
         names = ('Pattern', 'NGRP', 'NINT', 't_int', 't_exp', 't_acq', 'SNR', 'Well')
-        if len(rows)==0:
+        if len(cand)==0:
             _log.warning('No ramp settings allowed within constraints! Reduce constraints.')
             return Table(names=names)
+        patt_arr, ng_arr, nf_arr, nd2_arr = [np.array(v) for v in zip(*cand)]
+
+        # Get saturation level of observation
+        # If above well_frac_max, then this setting is invalid
+        det = self.Detectors[0]
+        timing = ramp_timing.from_arrays(det, read_mode=patt_arr, ngroup=ng_arr, nint=1)
+        t_acq1 = timing.t_acq
+        well_arr = pix_count_rate * timing.t_int / self.well_level
+        igood = well_arr <= well_frac_max
+        patt_arr, ng_arr, nf_arr, nd2_arr, well_arr, t_acq1 = \
+            [v[igood] for v in (patt_arr, ng_arr, nf_arr, nd2_arr, well_arr, t_acq1)]
+
+        # SNR of a single integration for all settings in one pass (assumes
+        # no saturation). SNR of NINT integrations is then SNR1 * sqrt(NINT).
+        if igood.any():
+            sen = self.sensitivity(sp=sp, forwardSNR=True, image=image, ngroup=ng_arr,
+                                   nf=nf_arr, nd2=nd2_arr, nint=1, **kwargs)
+            snr1 = np.atleast_1d(parse_snr(sen, grism_obs, ind_snr))
+        else:
+            snr1 = np.zeros(0)
+
+        # NINT values to test for each candidate
+        icand, nint_arr = _nint_select(snr1, t_acq1, patt_arr, snr_goal=snr_goal, 
+            snr_frac=snr_frac, tacq_max=tacq_max, tacq_frac=tacq_frac, 
+            nint_min=nint_min, nint_max=nint_max)
+
+        if len(icand)==0:
+            _log.warning('No ramp settings allowed within constraints! Reduce constraints.')
+            return Table(names=names)
+
+        timing = ramp_timing.from_arrays(det, read_mode=patt_arr[icand], 
+                                         ngroup=ng_arr[icand], nint=nint_arr)
+        snr_arr = snr1[icand] * np.sqrt(nint_arr)
 
         # Place rows into a AstroPy Table
-        t_all = Table(rows=rows, names=names)
+        t_all = Table([patt_arr[icand], ng_arr[icand], nint_arr, timing.t_int, timing.t_exp, 
+                       timing.t_acq, snr_arr, well_arr[icand]], names=names)
         t_all['Pattern'].format = '<10'
         t_all['t_int'].format = '9.2f'
         t_all['t_exp'].format = '9.2f'
@@ -2809,6 +3077,298 @@ class NIRCam(object):
         return t_all
 
 
+def sensitivity_table(configs, sp=None, sp_sat=None, bp_lim=None, nsig=10, units='nJy',
+    sat_units='vegamag', well_frac=0.8, zfact=None, nproc=None, verbose=False, **kwargs):
+    """Sensitivity and saturation limits for many instrument configurations.
+
+    Computes the point source and surface brightness sensitivities and 
+    saturation limits for a list of filter, pupil, mask, and readout 
+    configurations, returned together as a single AstroPy Table. 
+
+    Work is shared wherever possible: the zodiacal spectrum is computed
+    once for all configurations, and configurations that only differ in 
+    their readout settings share a single :class:`NIRCam` instance (one 
+    bandpass, PSF coefficient, and image calculation), with all of their
+    readouts evaluated in one vectorized pass. Saturation limits for
+    different integration times are scaled from a single calculation.
+    Each optical configuration is computed in its own worker process,
+    after any PSF coefficients have been generated in the calling process
+    so that products shared between configurations are only built once.
+
+    Parameters
+    ----------
+    configs : list
+        List of configurations. Each is either a tuple of 
+        (filter, pupil, mask, readout), where readout is a readout pattern
+        name or a dictionary of MULTIACCUM settings ('read_mode', 'ngroup', 
+        'nint'), or a dictionary of :class:`NIRCam` keywords including
+        'filter', 'pupil', 'mask', 'module', and the readout settings.
+        Settings not specified take the :class:`NIRCam` default values.
+    sp : :mod:`pysynphot.spectrum`
+        Spectrum to determine sensitivities (default: flat in photlam).
+    sp_sat : :mod:`pysynphot.spectrum`
+        Spectrum to determine saturation limits (default: G2V star).
+    bp_lim : :mod:`pysynphot.obsbandpass`
+        Bandpass to report saturation limits. Defaults to the bandpass 
+        of each configuration.
+    nsig : int, float
+        Desired nsigma sensitivity.
+    units : str
+        Output units of sensitivities.
+    sat_units : str
+        Output units of saturation limits.
+    well_frac : float
+        Fraction of full well to consider 'saturated'.
+    zfact : float
+        Factor to scale Zodiacal spectrum (default 2.5).
+    nproc : int, None
+        Number of processes. Defaults to the number of optical 
+        configurations up to the number of CPUs.
+    verbose : bool
+        Print the resulting table.
+
+    Keyword Args
+    ------------
+    ra, dec, thisday
+        Passed to :func:`zodi_spec` to use `jwst_backgrounds`.
+    rad_EE, dw_bin, ap_spec, ideal_Poisson
+        Passed to :meth:`NIRCam.sensitivity`.
+
+    Notes
+    -----
+    For grism observations, the sensitivity is the median over wavelength
+    and the saturation limit that of the most restrictive wavelength.
+    Surface brightness values are not computed for grisms.
+
+    Example
+    -------
+    >>> configs = [('F200W', None, None, 'MEDIUM8'), 
+    >>>            ('F444W', None, None, {'read_mode':'DEEP8', 'ngroup':10}),
+    >>>            {'filter':'F335M', 'pupil':'CIRCLYOT', 'mask':'MASK335R', 'ngroup':5}]
+    >>> tbl = pynrc.sensitivity_table(configs, sp_sat=pynrc.stellar_spectrum('A0V'))
+    """
+
+    # Zodiacal light spectrum shared by all configurations
+    kw_zodi = dict((k, kwargs.pop(k)) for k in ('ra', 'dec', 'thisday') if k in kwargs)
+    sp_zodi = zodi_spec(zfact=zfact, **kw_zodi)
+
+    # Group configurations that only differ by readout
+    groups = _group_configs(configs)
+
+    ntask = len(groups)
+    if nproc is None:
+        nproc = int(np.min([mp.cpu_count(), ntask]))
+    nproc = int(np.max([np.min([nproc, ntask]), 1]))
+
+    if nproc>1:
+        # Different configurations can share PSF coefficient products 
+        # (e.g., the background PSF of two masks with the same filter).
+        # Generate (or load) these once in this process, where they can 
+        # also be calculated in parallel, so the workers only read them.
+        for inst_kw, _, _ in groups.values():
+            NIRCam(lazy=True, **inst_kw)._load_psf_coeff()
+
+    # Workers cannot spawn their own pools for PSF coefficients
+    worker_args = []
+    for inst_kw, _, ramp_list in groups.values():
+        inst_kw = merge_dicts(inst_kw, {'nproc':1}) if nproc>1 else inst_kw
+        worker_args.append((inst_kw, ramp_list, sp, sp_sat, bp_lim, nsig, units, 
+                            sat_units, well_frac, merge_dicts(kwargs, {'sp_zodi':sp_zodi})))
+
+    if nproc>1:
+        res = _pool_map(_wrap_limits_for_pool, worker_args, nproc)
+    else:
+        res = [_wrap_limits_for_pool(wa) for wa in worker_args]
+
+    # Place rows back in the order of the input configurations
+    rows = [None] * len(configs)
+    for (_, ind_list, _), group_rows in zip(groups.values(), res):
+        for i, row in zip(ind_list, group_rows):
+            rows[i] = row
+
+    names = ('Filter', 'Pupil', 'Mask', 'Module', 'Pattern', 'NGRP', 'NINT', 
+             't_int', 't_acq', 'Sens', 'Sens_ext', 'SatLim', 'SatLim_ext')
+    tbl = Table(rows=rows, names=names)
+    for k in ['t_int', 't_acq']:
+        tbl[k].format = '9.2f'
+    for k in ['Sens', 'Sens_ext', 'SatLim', 'SatLim_ext']:
+        tbl[k].format = '10.3f'
+    tbl['Sens'].description = '{}-sigma point source sensitivity ({})'.format(nsig, units)
+    tbl['Sens_ext'].description = '{}-sigma surface brightness sensitivity ({}/arcsec^2)'\
+        .format(nsig, units)
+    tbl['SatLim'].description = 'Point source saturation limit ({})'.format(sat_units)
+    tbl['SatLim_ext'].description = 'Surface brightness saturation limit ({}/arcsec^2)'\
+        .format(sat_units)
+    tbl.meta.update({'nsig':nsig, 'units':units, 'sat_units':sat_units, 'well_frac':well_frac})
+
+    if verbose: print(tbl)
+
+    return tbl
+
+def _group_configs(configs):
+    """Group :func:`sensitivity_table` configurations by optical settings.
+
+    Returns an ordered dictionary of (inst_kw, ind_list, ramp_list) tuples,
+    holding the :class:`NIRCam` keywords shared by the group, the indices of
+    its configurations in `configs`, and their readout settings.
+    """
+    groups = OrderedDict()
+    for i, config in enumerate(configs):
+        if isinstance(config, dict):
+            inst_kw = dict(config)
+        else:
+            filter, pupil, mask, readout = (list(config) + [None]*4)[0:4]
+            inst_kw = {'filter':filter, 'pupil':pupil, 'mask':mask}
+            if isinstance(readout, dict):
+                inst_kw.update(readout)
+            elif readout is not None:
+                inst_kw['read_mode'] = readout
+        ramp_kw = dict((k, inst_kw.pop(k)) for k in ('read_mode', 'ngroup', 'nint') if k in inst_kw)
+        key = repr(sorted(inst_kw.items()))
+        if key not in groups:
+            groups[key] = (inst_kw, [], [])
+        groups[key][1].append(i)
+        groups[key][2].append(ramp_kw)
+    return groups
+
+def _wrap_limits_for_pool(args):
+    """Sensitivity and saturation limits of one optical configuration.
+
+    All readouts of the configuration share a single :class:`NIRCam`
+    instance. Returns a table row for each readout.
+    """
+    inst_kw, ramp_list, sp, sp_sat, bp_lim, nsig, units, sat_units, well_frac, kwargs = args
+
+    try:
+        nrc = NIRCam(lazy=True, **inst_kw)
+        det = nrc.Detectors[0]
+
+        # Timings of all readouts at once
+        timing = det.timing
+        ramp_kw = dict((k, [ramp.get(k, getattr(timing, k)) for ramp in ramp_list]) 
+                       for k in ('read_mode', 'ngroup', 'nint'))
+        ta = ramp_timing.from_arrays(det, **ramp_kw)
+
+        grism_obs = 'GRISM' in nrc.pupil
+        nan = np.zeros(len(ramp_list)) + np.nan
+
+        # Sensitivities for all readouts in a single pass
+        sen = nrc.sensitivity(sp=sp, nsig=nsig, units=units, ngroup=ta.ngroup, nf=ta.nf, 
+                              nd2=ta.nd2, nint=ta.nint, **kwargs)
+        if grism_obs:
+            sens = np.median(np.asarray(sen['sensitivity']), axis=0)
+            sens_ext = nan
+        else:
+            sens, sens_ext = sen[0]['sensitivity'], sen[1]['sensitivity']
+
+        # Saturation limits at the default integration time, then scaled 
+        # to each readout, since saturation flux goes as 1/t_int.
+        satlim = nrc.sat_limits(sp=sp_sat, bp_lim=bp_lim, units=sat_units, well_frac=well_frac)
+        dmag = 2.5 * np.log10(ta.t_int / timing.t_int)
+        if grism_obs:
+            # Most restrictive wavelength (faintest)
+            vals = np.asarray(satlim['satmag'])
+            sat = vals.max() if 'mag' in sat_units.lower() else vals.min()
+            sat, sat_ext = _mag_scale(sat, dmag, sat_units), nan
+        else:
+            sat = _mag_scale(satlim[0]['satlim'], dmag, sat_units)
+            sat_ext = _mag_scale(satlim[1]['satlim'], dmag, sat_units)
+    except Exception as e:
+        print('Caught exception in worker thread:')
+        traceback.print_exc()
+        print()
+        raise e
+
+    rows = []
+    for i in range(len(ramp_list)):
+        rows.append((nrc.filter, nrc.pupil, str(nrc.mask), nrc.module, ta.read_mode[i], 
+                     ta.ngroup[i], ta.nint[i], ta.t_int[i], ta.t_acq[i], 
+                     sens[i], sens_ext[i], sat[i], sat_ext[i]))
+    return rows
+
+
+def _nint_select(snr1, t_acq1, patterns, snr_goal=None, snr_frac=0.02, tacq_max=None, 
+    tacq_frac=0.1, nint_min=1, nint_max=5000):
+    """NINT values to consider for each ramp candidate in :meth:`NIRCam.ramp_optimize`
+
+    Parameters
+    ----------
+    snr1 : ndarray
+        SNR of a single integration for each candidate. The SNR of
+        NINT integrations is assumed to be ``snr1 * sqrt(NINT)``.
+    t_acq1 : ndarray
+        Acquisition time of a single integration for each candidate.
+    patterns : ndarray
+        Readout pattern of each candidate. Candidates of a pattern are
+        expected in order of increasing NGROUP.
+    snr_goal, snr_frac, tacq_max, tacq_frac, nint_min, nint_max
+        See :meth:`NIRCam.ramp_optimize`.
+
+    Returns
+    -------
+    tuple
+        Index of the candidate and NINT value of each output row.
+    """
+    snr1 = np.asarray(snr1, dtype='float')
+    t_acq1 = np.asarray(t_acq1, dtype='float')
+    patterns = np.asarray(patterns)
+
+    def nint_reach(snr_min, nint):
+        """Smallest NINT >= nint where SNR is at least snr_min"""
+        with np.errstate(divide='ignore'):
+            n = np.ceil(np.minimum((snr_min / snr1)**2, nint_max+1))
+        # Guard against round-off at the boundary
+        n = np.where(snr1*np.sqrt(n-1) >= snr_min, n-1, n)
+        n = np.where(snr1*np.sqrt(n) < snr_min, n+1, n)
+        return np.maximum(n.astype(int), nint)
+
+    if tacq_max is not None:
+        # Approximate integrations needed to obtain required t_acq
+        nint1 = (((1-tacq_frac)*tacq_max) / t_acq1).astype(int)
+        nint2 = (((1+tacq_frac)*tacq_max) / t_acq1 + 0.5).astype(int)
+        nint1 = np.maximum(nint1, nint_min)
+        nint2 = np.minimum(nint2, nint_max)
+
+        # Sometimes there are a lot of nint values to check
+        # Let's pair down to <5 per ng
+        narr = nint2 - nint1 + 1
+        nint1 = np.where(narr>5, nint1 + (narr/2-2).astype(int), nint1)
+        nint2 = np.where(narr>5, nint1 + 4, nint2)
+
+    elif snr_goal is not None:
+        # Approximate integrations needed to get to required SNR
+        with np.errstate(divide='ignore'):
+            nint = np.minimum((snr_goal / snr1)**2, nint_max+1).astype(int)
+        nint = np.maximum(nint_min, nint)
+
+        # Find NINT with SNR > (1-snr_frac) snr_goal
+        nint1 = nint_reach((1-snr_frac)*snr_goal, nint)
+        ivalid = nint1 <= nint_max
+
+        # We want to make sure that at least one NINT setting is saved
+        # per pattern if the resulting SNR is higher than our stated goal.
+        ifirst = np.zeros(ivalid.size, dtype=bool)
+        ind_valid = np.where(ivalid)[0]
+        _, ind = np.unique(patterns[ind_valid], return_index=True)
+        ifirst[ind_valid[ind]] = True
+        snr_over = snr1*np.sqrt(nint1) > (1+snr_frac)*snr_goal
+        ivalid &= (~snr_over | ifirst)
+
+        # Add each NINT until SNR > (1+snr_frac) snr_goal
+        nint2 = np.minimum(nint_reach((1+snr_frac)*snr_goal, nint1), nint_max)
+        nint2 = np.where(ivalid, nint2, nint1-1)
+
+    else:
+        raise ValueError('Must set either snr_goal or tacq_max.')
+
+    # Expand each candidate into its range of NINT values
+    ncount = np.maximum(nint2 - nint1 + 1, 0)
+    icand = np.repeat(np.arange(ncount.size), ncount)
+    nint_arr = nint1[icand] + np.arange(icand.size) - np.repeat(np.cumsum(ncount)-ncount, ncount)
+
+    return icand, nint_arr
+
+
 def table_filter(t, topn=None, **kwargs):
     """Filter and sort table.
     
@@ -2916,24 +3476,14 @@ def nproc_use_ng(det):
     simultaneous slope_to_ramp() calculations. We attempt to estimate how many 
     calculations can happen in parallel without swapping to disk.
 
-    NOTE: Requires psutil package. Otherwise defaults to mp.cpu_count() / 2
+    Worker counts come from :class:`~pynrc.resources.ResourceScheduler`,
+    which measures per-process memory usage on first use.
 
     Parameters
     -----------
     det : :class:`DetectorOps`
         Input detector class
     """
-    import multiprocessing as mp
-    try:
-        import psutil
-    except ImportError:
-        nproc = int(mp.cpu_count() // 2)
-        if nproc < 1: nproc = 1
-
-        _log.info("No psutil package available, cannot estimate optimal nprocesses.")
-        _log.info("Returning nproc=ncpu/2={}.".format(nproc))
-        return nproc
-
     ma      = det.multiaccum
     nd1     = ma.nd1
     nd2     = ma.nd2
@@ -2948,30 +3498,59 @@ def nproc_use_ng(det):
     # Pad nsteps to a power of 2, which is much faster
     nstep2 = int(2**np.ceil(np.log2(nstep)))
 
-    # Memory formulas are based on fits to memory usage
-    # In GBytes
-    cf = np.array([1.48561822e-15, 7.02203657e-08, 2.52022191e-01])
-    mem_total = np.polynomial.polynomial.polyval(nstep2, cf[::-1])
-
-    # Available memory
-    mem = psutil.virtual_memory()
-    avail_GB = mem.available / (1024**3) - 1.0 # Leave 1 GB
-
-    # How many processors to split into?
-    nproc = avail_GB // mem_total
-    nproc = np.min([nproc, mp.cpu_count(), poppy.conf.n_processes])
-    if nint is not None:
-        nproc = np.min([nproc, nint])
-        # Resource optimization:
-        # Split iterations evenly over processors to free up minimally used processors.
-        # For example, if there are 5 processors only doing 1 iteration and a single
-        #   processor doing 2 iterations, those 5 processors (and their memory) will not
-        #   get freed until the final processor is finished. So, to minimize the number
-        #   of idle resources, take the total iterations and divide by two (round up),
-        #   and that should be the final number of processors to use.
-        np_max = np.ceil(nint / nproc)
-        nproc = int(np.ceil(nint / np_max))
-
-    if nproc < 1: nproc = 1
-
-    return int(nproc)
+    # Memory formulas are based on fits to memory usage.
+    # Scale factors and fixed overheads are measured on each host.
+    unit_GB = task_unit('ngnrc', nstep2)
+
+    # Leave 1 GB
+    return get_scheduler().nworkers('ngnrc', unit_GB, ntask=nint, reserve_GB=1.0,
+                                    max_workers=poppy.conf.n_processes)
+
+
+###########################################################################
+#
+#    gen_psf() result cache helpers
+#
+###########################################################################
+
+_nocache = object()
+
+def _hashable_obj(obj):
+    """Can `obj` be hashed by content with :func:`~pynrc.coeff_store.hash_inputs`?"""
+    if (obj is None) or isinstance(obj, (bool, int, float, str, bytes, np.generic, np.ndarray)):
+        return True
+    elif isinstance(obj, (list, tuple)):
+        return all(_hashable_obj(o) for o in obj)
+    elif isinstance(obj, dict):
+        return all(_hashable_obj(o) for o in obj.values())
+    return False
+
+def _spec_hash_obj(sp):
+    """Content representation of spectra for hashing, or `_nocache`."""
+    if (sp is None) or isinstance(sp, np.ndarray):
+        return sp
+    elif isinstance(sp, (list, tuple)):
+        res = [_spec_hash_obj(s) for s in sp]
+        return _nocache if any(r is _nocache for r in res) else res
+    try:
+        return ('spec', sp.wave, sp.flux, str(sp.waveunits), str(sp.fluxunits))
+    except Exception:
+        return _nocache
+
+def _result_nbytes(res):
+    """Total bytes of arrays within (nested) results."""
+    if isinstance(res, np.ndarray):
+        return res.nbytes
+    elif isinstance(res, (list, tuple)):
+        return int(np.sum([_result_nbytes(r) for r in res]))
+    return 0
+
+def _copy_result(res):
+    """Copy arrays within (nested) results so cached values are never modified."""
+    if isinstance(res, np.ndarray):
+        return res.copy()
+    elif isinstance(res, list):
+        return [_copy_result(r) for r in res]
+    elif isinstance(res, tuple):
+        return tuple(_copy_result(r) for r in res)
+    return res
@@ -25,6 +25,7 @@ from tqdm.auto import trange, tqdm
 import pynrc
 from pynrc.maths import robust
 from pynrc.nrc_utils import pad_or_cut_to_size, jl_poly_fit, jl_poly
+from pynrc.maths.fast_poly import fit_plan
 from pynrc.nrc_utils import hist_indices
 from pynrc.detops import create_detops
 from pynrc.reduce.ref_pixels import reffix_hxrg, channel_smooth_savgol, channel_averaging
@@ -2241,6 +2242,9 @@ def gen_super_dark(allfiles, super_bias=None, DMS=False, **kwargs):
     # chsize = det.chsize
 
     tarr = np.arange(1, nz+1) * det.time_group
+    # Every ramp is fit at the same times, so factor design matrices once
+    plan_lin  = fit_plan(tarr[1:], deg=1)
+    plan_quad = fit_plan(tarr[1:], deg=2)
 
     # Active and reference pixel masks
     lower, upper, left, right = det.ref_info
@@ -2283,7 +2287,7 @@ def gen_super_dark(allfiles, super_bias=None, DMS=False, **kwargs):
             # Fit everything with linear first
             deg = 1
             cf_all = np.zeros([3,ny,nx])
-            cf_all[:2] = jl_poly_fit(tarr[1:], data[1:,:,:], deg=deg)
+            cf_all[:2] = jl_poly_fit(tarr[1:], data[1:,:,:], plan=plan_lin)
             yfit = jl_poly(tarr, cf_all)
             dof = data.shape[0] - deg
             # Get reduced chi-sqr metric
@@ -2293,7 +2297,7 @@ def gen_super_dark(allfiles, super_bias=None, DMS=False, **kwargs):
             chi_cutoff = 2
             ibad = (chired_poly > chi_cutoff) & (~mask_ref)
             deg = 2
-            cf_all[:,ibad] = jl_poly_fit(tarr[1:], data[1:,ibad], deg=deg)
+            cf_all[:,ibad] = jl_poly_fit(tarr[1:], data[1:,ibad], plan=plan_quad)
             yfit[:,ibad] = jl_poly(tarr, cf_all[:,ibad])
             dof = data.shape[0] - deg
             # Get reduced chi-sqr metric for poorly fit data
@@ -0,0 +1,338 @@
+"""Resource scheduler for multiprocessing calculations
+
+Decides how many worker processes (and how large a chunk of tasks per
+worker) can be run in parallel without swapping to disk. Each type of
+task (WebbPSF monochromatic PSFs, FFT convolutions, ramp simulations)
+has a simple model of its peak memory and runtime:
+
+    mem_GB  = base_GB + mem_scale * unit_GB
+    time_s  = base_s  + time_scale * unit_GB
+
+where ``unit_GB`` is a size measure supplied by the caller (typically the
+size of the arrays involved), and the four coefficients are calibrated
+on first use by running two small probe tasks in a fresh process and
+measuring their peak memory and runtime. Calibrations are saved per host
+in ``conf.PYNRC_PATH + 'resource_calibration.json'`` so each machine is
+only probed once. If calibration is disabled (``conf.calibrate_resources``),
+fails, or is requested from a daemonic process (e.g., a pool worker), 
+default coefficients derived from earlier benchmarks are used. Failed
+calibrations are not saved, and are retried in the next session.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os, sys, json, time, socket, traceback
+import multiprocessing as mp
+
+import numpy as np
+
+import logging
+_log = logging.getLogger('pynrc')
+
+from . import conf
+
+_calib_name = 'resource_calibration.json'
+
+
+def memory_GB():
+    """Available and total system memory (GB)
+
+    Uses ``psutil`` if installed, otherwise ``/proc/meminfo`` or
+    ``os.sysconf``. Returns (None, None) if memory cannot be determined.
+    """
+    try:
+        import psutil
+        mem = psutil.virtual_memory()
+        return mem.available / 1024**3, mem.total / 1024**3
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/meminfo') as f:
+            info = dict(line.split(':', 1) for line in f)
+        avail = float(info['MemAvailable'].split()[0]) / 1024**2
+        total = float(info['MemTotal'].split()[0]) / 1024**2
+        return avail, total
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+
+    try:
+        page = os.sysconf('SC_PAGE_SIZE')
+        avail = os.sysconf('SC_AVPHYS_PAGES') * page / 1024**3
+        total = os.sysconf('SC_PHYS_PAGES') * page / 1024**3
+        return avail, total
+    except (AttributeError, ValueError, OSError):
+        return None, None
+
+
+def _peak_rss_GB():
+    """Peak resident memory of the current process (GB)."""
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    scale = 1024**3 if sys.platform=='darwin' else 1024**2
+    return rss / scale
+
+
+###########################################################################
+#
+#    Probe tasks
+#
+###########################################################################
+
+def _probe_webbpsf(npix_over):
+    """Monochromatic WebbPSF calculation with given oversampled size."""
+    from .psfs import webbpsf_NIRCam_mod
+    oversample = 4
+    inst = webbpsf_NIRCam_mod()
+    inst.filter = 'F210M'
+    inst.calc_psf(fov_pixels=int(npix_over/oversample), oversample=oversample,
+                  monochromatic=2.1e-6, add_distortion=False, crop_psf=True)
+
+def _probe_convolve(npix):
+    """FFT convolution of an image with given size."""
+    from astropy.convolution import convolve_fft
+    from scipy import fftpack
+    im = np.random.rand(npix, npix)
+    psf = np.random.rand(65, 65)
+    convolve_fft(im, psf / psf.sum(), fftn=fftpack.fftn, ifftn=fftpack.ifftn, allow_huge=True)
+
+def _probe_ngnrc(nstep):
+    """1/f noise generation of given length."""
+    from .simul.ngNRC import pink_noise
+    pink_noise(int(nstep))
+
+def _unit_webbpsf(npix_over):
+    return 5 * npix_over**2 * 8 / 1024**3
+
+def _unit_convolve(npix):
+    return 300 * npix**2 * 8 / 1024**3
+
+def _unit_ngnrc(nstep):
+    return 1.48561822e-15 * nstep**2 + 7.02203657e-08 * nstep
+
+# Each task: unit function, (small, large) probe sizes, probe function,
+# and default coefficients from benchmarks of earlier pyNRC versions.
+_tasks = {
+    'webbpsf':  {'unit': _unit_webbpsf, 'probe': _probe_webbpsf, 'sizes': (128, 512),
+                 'default': {'base_GB': 0.3, 'mem_scale': 1.0, 'base_s': 1.0, 'time_scale': 100.}},
+    'convolve': {'unit': _unit_convolve, 'probe': _probe_convolve, 'sizes': (256, 1024),
+                 'default': {'base_GB': 0.0, 'mem_scale': 1.0, 'base_s': 0.1, 'time_scale': 10.}},
+    'ngnrc':    {'unit': _unit_ngnrc, 'probe': _probe_ngnrc, 'sizes': (2**18, 2**22),
+                 'default': {'base_GB': 0.25, 'mem_scale': 1.0, 'base_s': 1.0, 'time_scale': 10.}},
+}
+
+def task_unit(task, size):
+    """Size measure (GB) of a task used by the resource models."""
+    return _tasks[task]['unit'](size)
+
+def _probe_child(task, queue):
+    """Run probe tasks in a fresh process and report memory and runtime."""
+    try:
+        info = _tasks[task]
+        res = []
+        for size in info['sizes']:
+            t0 = time.time()
+            info['probe'](size)
+            res.append((info['unit'](size), _peak_rss_GB(), time.time() - t0))
+        queue.put(res)
+    except Exception:
+        traceback.print_exc()
+        queue.put(None)
+
+
+###########################################################################
+#
+#    Scheduler
+#
+###########################################################################
+
+class ResourceScheduler(object):
+    """Worker counts and chunk sizes from calibrated task models
+
+    Parameters
+    ----------
+    calib_file : str or None
+        JSON file holding per-host calibrations. Defaults to
+        ``conf.PYNRC_PATH + 'resource_calibration.json'``.
+    """
+
+    def __init__(self, calib_file=None):
+        self._calib_file = calib_file
+        self._calib = {}
+        self.host = socket.gethostname()
+
+    @property
+    def calib_file(self):
+        """Path to file with saved calibrations."""
+        if self._calib_file is None:
+            return os.path.join(conf.PYNRC_PATH, _calib_name)
+        return self._calib_file
+
+    def _read_file(self):
+        try:
+            with open(self.calib_file) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_file(self, task, calib):
+        """Merge calibration for this host into the shared file."""
+        data = self._read_file()
+        data.setdefault(self.host, {})[task] = calib
+        tmp = '{}.{}.{}.tmp'.format(self.calib_file, self.host, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.calib_file)
+        except (IOError, OSError) as e:
+            _log.debug('Could not save resource calibration: {}'.format(e))
+
+    def calibrate(self, task, timeout=600):
+        """Measure memory and runtime coefficients of a task
+
+        Two probe tasks of different size are run in a newly spawned
+        process. The difference in peak memory and runtime between them
+        determines the scale factors, and the remainder the fixed costs
+        (including the memory of the process itself).
+
+        Parameters
+        ----------
+        task : str
+            One of 'webbpsf', 'convolve', or 'ngnrc'.
+        timeout : float
+            Maximum time (sec) to wait for the probes.
+        """
+        from .version import __version__
+
+        info = _tasks[task]
+        calib = dict(info['default'])
+        calib.update({'probed': False, 'date': time.time(), 'pynrc': __version__,
+                      'ncpu': mp.cpu_count(), 'mem_total_GB': memory_GB()[1]})
+
+        _log.info("Calibrating resource usage of '{}' tasks on {}...".format(task, self.host))
+        proc = None
+        try:
+            ctx = mp.get_context('spawn')
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_probe_child, args=(task, queue))
+            proc.start()
+            res = queue.get(timeout=timeout)
+        except Exception as e:
+            _log.warning("Resource calibration of '{}' failed ({}); using defaults.".format(task, e))
+            res = None
+        finally:
+            if proc is not None:
+                if res is None:
+                    proc.terminate()
+                proc.join()
+
+        if res is not None:
+            (u1, m1, t1), (u2, m2, t2) = res
+            mem_scale  = np.max([(m2 - m1) / (u2 - u1), 0.1])
+            time_scale = np.max([(t2 - t1) / (u2 - u1), 0])
+            calib.update({
+                'mem_scale': float(mem_scale), 'base_GB': float(np.max([m1 - mem_scale*u1, 0])),
+                'time_scale': float(time_scale), 'base_s': float(np.max([t1 - time_scale*u1, 0])),
+                'probed': True,
+            })
+
+        # Only successful probes are saved, so failures are retried next session
+        self._calib[task] = calib
+        if calib['probed']:
+            self._write_file(task, calib)
+        return calib
+
+    def calibration(self, task):
+        """Coefficients of a task model, calibrating on first use."""
+        try:
+            return self._calib[task]
+        except KeyError:
+            pass
+
+        calib = self._read_file().get(self.host, {}).get(task)
+        if (calib is None) or (not calib.get('probed', True)):
+            # Daemonic processes (e.g., pool workers) cannot spawn probes
+            if conf.calibrate_resources and (not mp.current_process().daemon):
+                calib = self.calibrate(task)
+            else:
+                calib = dict(_tasks[task]['default'])
+        self._calib[task] = calib
+        return calib
+
+    def task_memory(self, task, unit_GB):
+        """Estimated peak memory (GB) of a single worker."""
+        calib = self.calibration(task)
+        return calib['base_GB'] + calib['mem_scale'] * unit_GB
+
+    def task_time(self, task, unit_GB):
+        """Estimated runtime (sec) of a single task."""
+        calib = self.calibration(task)
+        return calib['base_s'] + calib['time_scale'] * unit_GB
+
+    def nworkers(self, task, unit_GB, ntask=None, reserve_GB=0, max_workers=None,
+                 mem_frac=0.9):
+        """Number of worker processes to use
+
+        Parameters
+        ----------
+        task : str
+            Type of task ('webbpsf', 'convolve', or 'ngnrc').
+        unit_GB : float
+            Size measure of each task (see :func:`task_unit`).
+        ntask : int or None
+            Number of tasks to perform. Sets maximum number of workers.
+        reserve_GB : float
+            Memory (GB) needed by the parent process to hold the results.
+        max_workers : int or None
+            Maximum number of workers. Defaults to number of CPUs.
+        mem_frac : float
+            Fraction of available memory that may be used.
+        """
+        ncpu = mp.cpu_count()
+        max_workers = ncpu if max_workers is None else int(np.min([max_workers, ncpu]))
+
+        avail_GB, _ = memory_GB()
+        if avail_GB is None:
+            nproc = np.max([ncpu // 2, 1])
+            _log.info("Cannot determine available memory. Using nproc=ncpu/2={}.".format(nproc))
+        else:
+            avail_GB = avail_GB * mem_frac - reserve_GB
+            if avail_GB <= 0:
+                _log.warning('Not enough available memory to hold resulting data ({:.1f} GB)!'
+                             .format(reserve_GB))
+                return 1
+            nproc = int(avail_GB // self.task_memory(task, unit_GB))
+
+        nproc = int(np.min([nproc, max_workers]))
+        if ntask is not None:
+            nproc = int(np.min([nproc, ntask]))
+            # Parallel overhead is not worth it for very short calculations
+            if ntask * self.task_time(task, unit_GB) < 1:
+                nproc = 1
+            # Balance tasks evenly across workers
+            nproc = int(np.ceil(ntask / self.chunksize(ntask, np.max([nproc, 1]))))
+
+        _log.debug("'{}' tasks: mem/task {:.2f} GB; nproc={}".\
+            format(task, self.task_memory(task, unit_GB), nproc))
+
+        return int(np.max([nproc, 1]))
+
+    @staticmethod
+    def chunksize(ntask, nworkers):
+        """Number of tasks per worker so that all workers finish together.
+
+        For example, with 12 tasks and 8 workers, 6 workers completing
+        2 tasks each finish at the same time as 8 workers would, while
+        freeing up 2 workers and their memory.
+        """
+        return int(np.ceil(ntask / np.max([nworkers, 1])))
+
+
+_scheduler = None
+def get_scheduler():
+    """Shared :class:`ResourceScheduler` instance."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ResourceScheduler()
+    return _scheduler